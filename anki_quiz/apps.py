@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AnkiQuizConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'anki_quiz'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -1,7 +1,55 @@
-from django.contrib.auth.hashers import PBKDF2PasswordHasher
+import hashlib
+import hmac
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, check_password
 
 class CustomPBKDF2Hasher(PBKDF2PasswordHasher):
     algorithm = "pbkdf2_sha256_custom"
-    iterations = 50000
 
-# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
\ No newline at end of file
+    @property
+    def iterations(self):
+        # settings.PBKDF2_ITERATIONS (see `manage.py tune_hashers`), hashes with another
+        # count are re-hashed on the next successful login
+        from django.conf import settings
+        return getattr(settings, 'PBKDF2_ITERATIONS', 50000)
+
+# https://docs.djangoproject.com/en/5.1/topics/auth/passwords/
+
+class TokenHasher:
+    """
+    Hashes session token secrets, not passwords.
+    Token secrets are 256-bit random values, so a keyed HMAC-SHA256 with a server pepper
+    is as strong as PBKDF2 here and costs microseconds instead of tens of milliseconds.
+    Intentionally not listed in PASSWORD_HASHERS, passwords keep using PBKDF2.
+    """
+    algorithm = "hmac_sha256"
+
+    def __init__(self, pepper=None):
+        if pepper is None:
+            from django.conf import settings
+            pepper = getattr(settings, 'TOKEN_HASH_PEPPER', None) or settings.SECRET_KEY
+        self.pepper = pepper.encode() if isinstance(pepper, str) else pepper
+
+    def encode(self, secret):
+        digest = hmac.new(self.pepper, secret.encode(), hashlib.sha256).hexdigest()
+        return f"{self.algorithm}${digest}"
+
+    def verify(self, secret, encoded):
+        if not encoded:
+            return False
+        if encoded.startswith(self.algorithm + "$"):
+            return hmac.compare_digest(self.encode(secret), encoded)
+        # Tokens issued before TokenHasher were stored with make_password
+        return check_password(secret, encoded)
+
+    def must_update(self, encoded):
+        return not encoded.startswith(self.algorithm + "$")
+
+
+_token_hasher = None
+
+
+def get_token_hasher():
+    global _token_hasher
+    if _token_hasher is None:
+        _token_hasher = TokenHasher()
+    return _token_hasher
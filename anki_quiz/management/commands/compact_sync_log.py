@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services.sync_services import compact_changes
+
+
+class Command(BaseCommand):
+    help = "Deletes sync log entries superseded by a newer change of the same object."
+
+    def handle(self, *args, **options):
+        deleted = compact_changes()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} superseded changes"))
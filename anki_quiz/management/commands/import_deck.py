@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from anki_quiz.models import CustomUser
+from services.import_services import FORMATS, DeckImportError, detect_format, import_deck
+
+
+class Command(BaseCommand):
+    help = "Imports a CSV/TSV/Anki .apkg deck as a new set of the given user."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Email of the owner.')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--title')
+        parser.add_argument('--term-lang')
+        parser.add_argument('--definition-lang')
+        parser.add_argument('--batch-size', type=int, default=settings.IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            user = CustomUser.objects.get(email=options['user'])
+        except CustomUser.DoesNotExist:
+            raise CommandError(f"User {options['user']} not found")
+
+        def progress(cards, elapsed):
+            rate = cards / elapsed if elapsed else 0
+            self.stdout.write(f"\r{cards} cards, {rate:.0f} cards/s", ending='')
+            self.stdout.flush()
+
+        with open(options['path'], 'rb') as fileobj:
+            fmt = options['format'] or detect_format(options['path'], fileobj.read(2))
+            fileobj.seek(0)
+            try:
+                card_set, stats = import_deck(
+                    user, fileobj, fmt, title=options['title'], term_lang=options['term_lang'],
+                    definition_lang=options['definition_lang'], batch_size=options['batch_size'],
+                    progress=progress,
+                )
+            except DeckImportError as e:
+                raise CommandError(str(e))
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"Set {card_set['id']} \"{card_set['title']}\": {stats['cards']} cards "
+            f"({stats['skipped']} skipped) in {stats['seconds']}s, {stats['cards_per_second']} cards/s"
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from services.search_services import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the full-text search index of public sets and their cards."
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} public sets"))
@@ -0,0 +1,98 @@
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.module_loading import import_string
+
+
+# Hashers worth comparing even if they are not configured yet
+OPTIONAL_HASHERS = [
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the configured password hashers (plus scrypt/argon2 where available) "
+        "and recommends PBKDF2_ITERATIONS for a target login latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target-ms', type=float, default=100.0,
+                            help='Latency budget of a single password hash, in milliseconds.')
+        parser.add_argument('--rounds', type=int, default=5,
+                            help='Hashes per hasher, the median is reported.')
+        parser.add_argument('--write', action='store_true',
+                            help='Write the recommended PBKDF2_ITERATIONS into the .env file.')
+        parser.add_argument('--env-file', default=str(Path(settings.BASE_DIR) / '.env'),
+                            help='File updated by --write, defaults to the .env loaded by the settings.')
+
+    def handle(self, *args, **options):
+        target = options['target_ms']
+        rounds = options['rounds']
+        if target <= 0 or rounds <= 0:
+            raise CommandError('--target-ms and --rounds must be positive')
+
+        hashers = list(get_hashers())
+        configured = {hasher.algorithm for hasher in hashers}
+        for path in OPTIONAL_HASHERS:
+            hasher = import_string(path)()
+            if hasher.algorithm in configured:
+                continue
+            try:
+                hasher.encode('benchmark', hasher.salt())
+            except (ValueError, ImportError):
+                self.stdout.write(f"{hasher.algorithm}: not available ({path})")
+                continue
+            hashers.append(hasher)
+
+        self.stdout.write(f"{'algorithm':<24}{'work factor':>20}{'median ms':>12}")
+        recommended = None
+        for hasher in hashers:
+            elapsed = self._measure(hasher, rounds)
+            self.stdout.write(f"{hasher.algorithm:<24}{self._work_factor(hasher):>20}{elapsed:>12.1f}")
+            if hasher.algorithm == 'pbkdf2_sha256_custom':
+                # PBKDF2 cost is linear in the iteration count
+                recommended = max(10_000, round(hasher.iterations * target / elapsed, -3))
+
+        if recommended is None:
+            self.stdout.write('CustomPBKDF2Hasher is not configured, nothing to recommend')
+            return
+
+        self.stdout.write(
+            f"\nRecommended PBKDF2_ITERATIONS for {target:.0f} ms: {int(recommended)} "
+            f"(current {settings.PBKDF2_ITERATIONS})"
+        )
+        if options['write']:
+            self._write_env(Path(options['env_file']), int(recommended))
+            self.stdout.write(self.style.SUCCESS(
+                f"Written to {options['env_file']}, existing hashes are upgraded on the next login"
+            ))
+
+    @staticmethod
+    def _measure(hasher, rounds):
+        salt = hasher.salt()
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            hasher.encode('benchmark-password', salt)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return timings[len(timings) // 2]
+
+    @staticmethod
+    def _work_factor(hasher):
+        for attr in ('iterations', 'work_factor', 'time_cost'):
+            if hasattr(hasher, attr):
+                return f"{attr}={getattr(hasher, attr)}"
+        return '-'
+
+    @staticmethod
+    def _write_env(path, iterations):
+        lines = path.read_text().splitlines() if path.exists() else []
+        lines = [line for line in lines if not line.startswith('PBKDF2_ITERATIONS=')]
+        lines.append(f'PBKDF2_ITERATIONS={iterations}')
+        path.write_text('\n'.join(lines) + '\n')
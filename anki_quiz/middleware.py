@@ -1,8 +1,4 @@
 from django.http import JsonResponse
-from asgiref.sync import sync_to_async
-from django.utils import timezone
-from django.contrib.auth.hashers import check_password
-from .models import CustomUser
 from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 import asyncio
 import re
@@ -54,26 +50,42 @@ class AsyncTokenAuthMiddleware:
         return await response if asyncio.iscoroutine(response) else response
 
     async def _get_user_by_token(self, raw_token):
-        """Асинхронный метод поиска пользователя по токену"""
-        # Выносим импорты сюда, чтобы избежать циклических зависимостей
-        from django.utils import timezone
-        from django.contrib.auth.hashers import check_password
-        from .models import CustomUser
-        
-        # Используем sync_to_async для выполнения синхронного ORM-запроса
-        return await sync_to_async(self._sync_get_user_by_token, thread_sensitive=False)(raw_token)
-
-    def _sync_get_user_by_token(self, raw_token):
-        """Синхронная реализация поиска пользователя"""
-        # return CustomUser.objects.filter(
-        #     token_expires__gt=timezone.now(),
-        #     token=raw_token  # Предполагаем, что token хранится в открытом виде
-        # ).first()
-        for user in CustomUser.objects.filter(token_expires__gt=timezone.now()):
-            if check_password(raw_token, user.token):
-                return user
-        return None
+        """Поиск пользователя по token_id (один хэш) с кэшем уже проверенных токенов"""
+        # Импорт здесь, чтобы избежать циклических зависимостей
+        from services.auth_services import aget_user_by_token
+        from services.metrics_services import timed
+
+        with timed('auth'):
+            return await aget_user_by_token(raw_token)
+
+
+class RequestMetricsMiddleware:
+    """
+    Per-request wall/auth/DB/serialization time of the Django stack (services.metrics_services),
+    exported together with the FastAPI metrics at /api/metrics/. Should be the first middleware.
+    """
+    async_capable = True
+    sync_capable = False
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
+    async def __call__(self, request):
+        from services.metrics_services import finish_request, start_request
+
+        token = start_request()
+        status = 500
+        try:
+            response = self.get_response(request)
+            response = await response if asyncio.iscoroutine(response) else response
+            status = response.status_code
+            return response
+        finally:
+            match = request.resolver_match
+            route = '/' + match.route if match is not None else 'unmatched'
+            finish_request(token, 'django', request.method, route, status, request.path)
 
 
 # import asyncio
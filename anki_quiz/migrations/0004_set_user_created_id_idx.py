@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 15:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0003_set_definition_lang_set_term_lang'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='set',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='set_user_created_id_idx'),
+        ),
+    ]
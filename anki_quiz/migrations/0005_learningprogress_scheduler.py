@@ -0,0 +1,38 @@
+# Generated by Django 5.2 on 2026-10-17 15:49
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0004_set_user_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='learningprogress',
+            name='due_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='learningprogress',
+            name='ease',
+            field=models.FloatField(default=2.5),
+        ),
+        migrations.AddField(
+            model_name='learningprogress',
+            name='interval',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='learningprogress',
+            name='repetitions',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='learningprogress',
+            index=models.Index(fields=['user', 'due_at'], name='progress_user_due_idx'),
+        ),
+    ]
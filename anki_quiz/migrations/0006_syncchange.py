@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-17 15:50
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_change_log(apps, schema_editor):
+    """Logs every existing set, card and progress row, so a sync from token 0 is a full sync."""
+    Set = apps.get_model('anki_quiz', 'Set')
+    Card = apps.get_model('anki_quiz', 'Card')
+    LearningProgress = apps.get_model('anki_quiz', 'LearningProgress')
+    SyncChange = apps.get_model('anki_quiz', 'SyncChange')
+
+    sources = [
+        ('set', Set.objects.values_list('user_id', 'id')),
+        ('card', Card.objects.values_list('set__user_id', 'id')),
+        ('progress', LearningProgress.objects.values_list('user_id', 'card_id')),
+    ]
+    for kind, rows in sources:
+        batch = []
+        for user_id, object_id in rows.order_by('id').iterator(chunk_size=5000):
+            batch.append(SyncChange(user_id=user_id, kind=kind, object_id=object_id))
+            if len(batch) >= 5000:
+                SyncChange.objects.bulk_create(batch)
+                batch = []
+        SyncChange.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0005_learningprogress_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('set', 'Set'), ('card', 'Card'), ('progress', 'Learning progress')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'id'], name='syncchange_user_id_idx'), models.Index(fields=['user', 'kind', 'object_id'], name='syncchange_object_idx')],
+            },
+        ),
+        migrations.RunPython(seed_change_log, migrations.RunPython.noop),
+    ]
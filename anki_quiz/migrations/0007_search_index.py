@@ -0,0 +1,68 @@
+# Generated by Django 5.2 on 2026-10-17 16:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def add_tsvector(apps, schema_editor):
+    """PostgreSQL only: generated tsvector column in the document's text search configuration + GIN index."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    # to_tsvector(text::regconfig, ...) is not immutable because of the cast, the wrapper
+    # declares it so (configurations are never renamed here), which generated columns require
+    schema_editor.execute("""
+        CREATE OR REPLACE FUNCTION anki_search_vector(config text, body text) RETURNS tsvector
+            LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT to_tsvector(config::regconfig, body) $$
+    """)
+    schema_editor.execute("""
+        ALTER TABLE anki_quiz_searchdocument
+            ADD COLUMN vector tsvector GENERATED ALWAYS AS (anki_search_vector(language, text)) STORED
+    """)
+    schema_editor.execute("CREATE INDEX searchdoc_vector_gin ON anki_quiz_searchdocument USING gin (vector)")
+
+
+def drop_tsvector(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS searchdoc_vector_gin")
+    schema_editor.execute("ALTER TABLE anki_quiz_searchdocument DROP COLUMN IF EXISTS vector")
+    schema_editor.execute("DROP FUNCTION IF EXISTS anki_search_vector(text, text)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0006_syncchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('title', 'Title'), ('description', 'Description'), ('term', 'Term'), ('definition', 'Definition')], max_length=16)),
+                ('language', models.CharField(default='simple', max_length=32)),
+                ('text', models.TextField()),
+                ('card', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='anki_quiz.card')),
+                ('set', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='anki_quiz.set')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('count', models.PositiveSmallIntegerField(default=1)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='postings', to='anki_quiz.searchdocument')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='searchdocument',
+            index=models.Index(fields=['set', 'card'], name='searchdoc_set_card_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='searchposting',
+            index=models.Index(fields=['term', 'document'], name='searchposting_term_idx'),
+        ),
+        migrations.RunPython(add_tsvector, drop_tsvector),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 16:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='questions',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2 on 2026-10-17 17:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def number_changes(apps, schema_editor):
+    """Existing entries keep their id as seq, so tokens issued before stay valid."""
+    SyncChange = apps.get_model('anki_quiz', 'SyncChange')
+    SyncSequence = apps.get_model('anki_quiz', 'SyncSequence')
+    SyncChange.objects.update(seq=models.F('id'))
+    SyncSequence.objects.bulk_create(
+        [
+            SyncSequence(user_id=row['user_id'], value=row['last'])
+            for row in SyncChange.objects.values('user_id').annotate(last=Max('id')).order_by()
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('anki_quiz', '0010_notification_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncSequence',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='sync_sequence', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='syncchange',
+            name='seq',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(number_changes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='syncchange',
+            name='seq',
+            field=models.BigIntegerField(),
+        ),
+        migrations.RemoveIndex(
+            model_name='syncchange',
+            name='syncchange_user_id_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='syncchange',
+            constraint=models.UniqueConstraint(fields=('user', 'seq'), name='syncchange_user_seq_uniq'),
+        ),
+    ]
@@ -3,8 +3,18 @@ from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.contrib.auth.hashers import make_password
+from .hashers import get_token_hasher
+import hashlib
 import secrets
 
+# token_hex() не содержит "l", так что token_id мигрированных legacy-токенов не совпадает с новыми
+LEGACY_TOKEN_ID_PREFIX = 'l'
+
+
+def legacy_token_id(raw_token):
+    # token_id мигрированного legacy-токена выводится из самого токена: raw_token находится по индексу, без перебора
+    return LEGACY_TOKEN_ID_PREFIX + hashlib.sha256(raw_token.encode()).hexdigest()[:16]
+
 
 class CustomUser(AbstractUser):
     google_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
@@ -38,13 +48,32 @@ class CustomUser(AbstractUser):
         token_id = secrets.token_hex(8)  # 16 символов
         token_secret = secrets.token_urlsafe(32)
         full_token = f"{token_id}:{token_secret}"
-        token_hash = make_password(token_secret)
+        token_hash = get_token_hasher().encode(token_secret)
         self.token_expires = timezone.now() + timedelta(days=2)
         self.token_id = token_id
         self.token = token_hash
         self.save()
         return full_token, token_id, token_hash
 
+    async def async_generate_token_pair(self):
+        token_id = secrets.token_hex(8)
+        token_secret = secrets.token_urlsafe(32)
+        full_token = f"{token_id}:{token_secret}"
+        token_hash = get_token_hasher().encode(token_secret)
+        self.token_expires = timezone.now() + timedelta(days=2)
+        self.token_id = token_id
+        self.token = token_hash
+        await self.asave()
+        return full_token, token_id, token_hash
+
+    def migrate_legacy_token(self, raw_token):
+        # Старые токены (generate_token) не имеют token_id. Хэш токена остаётся прежним,
+        # поэтому достаточно выдать token_id: "token_id:raw_token" становится валидной парой.
+        # Префикс отмечает мигрированный токен: клиент может и дальше присылать raw_token до истечения срока
+        self.token_id = legacy_token_id(raw_token)
+        self.save(update_fields=['token_id'])
+        return self.token_id
+
     def generate_token(self):
         raw_token = secrets.token_hex(32)
         self.token = make_password(raw_token)
@@ -105,6 +134,12 @@ class Set(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     is_public = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of get-sets: WHERE user = ? AND (created_at, id) < cursor
+            models.Index(fields=['user', 'created_at', 'id'], name='set_user_created_id_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -127,9 +162,18 @@ class LearningProgress(models.Model):
     card = models.ForeignKey(Card, on_delete=models.CASCADE, related_name="learning_progress")
     level = models.IntegerField(default=0)  # Уровень от 0 до 5
     last_reviewed = models.DateTimeField(default=timezone.now)
+    # Состояние планировщика SM-2 (services/review_services.py)
+    due_at = models.DateTimeField(default=timezone.now)
+    ease = models.FloatField(default=2.5)
+    interval = models.FloatField(default=0)  # дни
+    repetitions = models.IntegerField(default=0)
 
     class Meta:
         unique_together = ("user", "card")
+        indexes = [
+            # Очередь повторения: WHERE user = ? AND due_at <= now ORDER BY due_at
+            models.Index(fields=['user', 'due_at'], name='progress_user_due_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.card.term} (Level {self.level})"
@@ -164,6 +208,9 @@ class Quiz(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     title = models.CharField(max_length=100)
     created_at = models.DateTimeField(default=timezone.now)
+    # Вопросы генерируются один раз (services/quiz_services.py):
+    # [{"card": id, "term": ..., "options": [{"card": id, "definition": ...}], "answer": индекс}]
+    questions = models.JSONField(default=list, blank=True)
 
     def __str__(self):
         return self.title
@@ -173,14 +220,55 @@ class Quiz(models.Model):
 class QuizResult(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name="results")
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="quiz_results")
+    # Комната, в которой пройден квиз (для рейтинга комнаты)
+    room = models.ForeignKey(Room, on_delete=models.SET_NULL, null=True, blank=True, related_name="quiz_results")
     score = models.IntegerField()
     total = models.IntegerField()
     completed_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'completed_at'], name='quizresult_user_done_idx'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.score}/{self.total}"
 
 
+# 7a. Leaderboards
+class LeaderboardEntry(models.Model):
+    """
+    Aggregate of QuizResult per (quiz, user) or (room, user), updated with the first result of a user
+    (services/leaderboard_services.py). Quiz: score of the first result, room: sum of the first result
+    of every quiz played in the room. attempts counts the counted results.
+    The ranking itself is served from a sorted set in the cache backend, rebuilt from these rows.
+    """
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, null=True, blank=True, related_name="leaderboard")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, blank=True, related_name="leaderboard")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="leaderboard_entries")
+    points = models.IntegerField(default=0)
+    attempts = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quiz', 'user'], condition=models.Q(quiz__isnull=False),
+                                    name='leaderboard_quiz_user_uniq'),
+            models.UniqueConstraint(fields=['room', 'user'], condition=models.Q(room__isnull=False),
+                                    name='leaderboard_room_user_uniq'),
+            models.CheckConstraint(condition=models.Q(quiz__isnull=True) ^ models.Q(room__isnull=True),
+                                   name='leaderboard_one_scope'),
+        ]
+        indexes = [
+            # Рейтинг без кэша: WHERE quiz = ? ORDER BY points DESC
+            models.Index(fields=['quiz', '-points'], name='leaderboard_quiz_points_idx'),
+            models.Index(fields=['room', '-points'], name='leaderboard_room_points_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.points}"
+
+
 # 8. Notifications
 class Notification(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="notifications")
@@ -188,6 +276,12 @@ class Notification(models.Model):
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            # Непрочитанные пользователя: WHERE user = ? AND is_read = false ORDER BY created_at
+            models.Index(fields=['user', 'is_read', 'created_at'], name='notification_user_read_idx'),
+        ]
+
     def __str__(self):
         return self.message[:50]  # Показываем первые 50 символов
 
@@ -227,4 +321,91 @@ class LikeSave(models.Model):
         unique_together = ("user", "set", "action_type")
 
     def __str__(self):
-        return f"{self.user.username} {self.action_type}d {self.set.title}"
\ No newline at end of file
+        return f"{self.user.username} {self.action_type}d {self.set.title}"
+
+
+# 11. Sync change log
+class SyncChange(models.Model):
+    """
+    Per-user change log for delta sync, `seq` (per user, see SyncSequence) is the change token.
+    The auto-increment id can not be: ids are taken at INSERT but become visible at COMMIT,
+    a long transaction would commit an id below a token a client already synced past.
+    """
+    KIND_CHOICES = [
+        ("set", "Set"),
+        ("card", "Card"),
+        ("progress", "Learning progress"),  # object_id = card id
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="sync_changes")
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    seq = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'object_id'], name='syncchange_object_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'seq'], name='syncchange_user_seq_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}{' deleted' if self.deleted else ''}"
+
+
+class SyncSequence(models.Model):
+    """
+    Last SyncChange.seq of a user. Writers take the next values with an UPDATE that keeps the row
+    locked until their transaction commits, so the changes of a user commit in seq order.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name="sync_sequence")
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id}: {self.value}"
+
+
+# 12. Full-text search
+class SearchDocument(models.Model):
+    """
+    Searchable text of a public set (title, description) or of its cards (term, definition),
+    maintained by services/search_services.py. On PostgreSQL the migration adds a generated
+    tsvector column `vector` with a GIN index, other databases use SearchPosting.
+    """
+    FIELD_CHOICES = [
+        ("title", "Title"),
+        ("description", "Description"),
+        ("term", "Term"),
+        ("definition", "Definition"),
+    ]
+
+    set = models.ForeignKey(Set, on_delete=models.CASCADE, related_name="search_documents")
+    card = models.ForeignKey(Card, on_delete=models.CASCADE, null=True, blank=True, related_name="search_documents")
+    field = models.CharField(max_length=16, choices=FIELD_CHOICES)
+    language = models.CharField(max_length=32, default="simple")  # конфигурация text search PostgreSQL
+    text = models.TextField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['set', 'card'], name='searchdoc_set_card_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.field}: {self.text[:50]}"
+
+
+class SearchPosting(models.Model):
+    """Inverted index (term -> documents) for databases without full-text search (SQLite)."""
+    term = models.CharField(max_length=64)
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name="postings")
+    count = models.PositiveSmallIntegerField(default=1)  # вхождений термина в документе
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['term', 'document'], name='searchposting_term_idx'),
+        ]
+
+    def __str__(self):
+        return self.term
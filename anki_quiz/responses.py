@@ -0,0 +1,14 @@
+from django.http import HttpResponse
+
+from services.json_services import dumps
+from services.metrics_services import timed
+
+
+class FastJsonResponse(HttpResponse):
+    """Drop-in for JsonResponse (dict payloads) encoded with services.json_services."""
+
+    def __init__(self, data, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        with timed('serialization'):
+            content = dumps(data)
+        super().__init__(content=content, **kwargs)
@@ -2,6 +2,7 @@ from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 
 
+# Datetimes are returned as is, the JSON encoders (services.json_services, FastAPI) emit ISO 8601
 class UserSerializer:
     @staticmethod
     def serialize_user(user):
@@ -9,8 +10,8 @@ class UserSerializer:
             'id': user.id,
             'email': user.email,
             'name': user.name,
-            'last_login': user.last_login.isoformat(),
-            'token_expires': user.token_expires.isoformat()
+            'last_login': user.last_login,
+            'token_expires': user.token_expires
         }
     
     @staticmethod
@@ -22,6 +23,9 @@ class UserSerializer:
             return False
 
 class SetSerializer:
+    FIELDS = ('id', 'title', 'description', 'term_lang', 'definition_lang', 'created_at', 'is_public')
+    USER_FIELDS = ('id', 'email', 'name', 'last_login', 'token_expires')
+
     @staticmethod
     def serialize_set(card_set):
         return {
@@ -30,21 +34,156 @@ class SetSerializer:
             'description': card_set.description,
             'term_lang': card_set.term_lang,
             'definition_lang': card_set.definition_lang,
-            'created_at': card_set.created_at.isoformat(),
+            'created_at': card_set.created_at,
             'is_public': card_set.is_public,
             # 'cards': [CardSerializer.serialize_card(card) for card in card_set.cards.all()],
             'user': UserSerializer.serialize_user(card_set.user)
         }
 
+    @staticmethod
+    def serialize_many(queryset):
+        """
+        Serializes a Set queryset (sliced or not) with a single query.
+        The owner columns are joined via .values() instead of loading card_set.user per set.
+        """
+        user_columns = [f'user__{field}' for field in SetSerializer.USER_FIELDS]
+        rows = queryset.values(*SetSerializer.FIELDS, *user_columns)
+        return [
+            {
+                'id': row['id'],
+                'title': row['title'],
+                'description': row['description'],
+                'term_lang': row['term_lang'],
+                'definition_lang': row['definition_lang'],
+                'created_at': row['created_at'],
+                'is_public': row['is_public'],
+                'user': {
+                    'id': row['user__id'],
+                    'email': row['user__email'],
+                    'name': row['user__name'],
+                    'last_login': row['user__last_login'],
+                    'token_expires': row['user__token_expires'],
+                },
+            }
+            for row in rows
+        ]
+
+    # Public sets are shown to other users: only the owner's name, no email or token data
+    PUBLIC_FIELDS = (*FIELDS, 'user__name')
+
+    @staticmethod
+    def serialize_public_row(row):
+        """Row of queryset.values(*SetSerializer.PUBLIC_FIELDS)."""
+        return {
+            'id': row['id'],
+            'title': row['title'],
+            'description': row['description'],
+            'term_lang': row['term_lang'],
+            'definition_lang': row['definition_lang'],
+            'created_at': row['created_at'],
+            'is_public': row['is_public'],
+            'owner': row['user__name'],
+        }
+
 
 class CardSerializer:
+    FIELDS = ('id', 'term', 'definition', 'set_id', 'image_url', 'audio_url')
+
     @staticmethod
     def serialize_card(card):
         return {
             'id': card.id,
             'term': card.term,
             'definition': card.definition,
-            'set': card.set.id,
+            'set': card.set_id,  # set_id does not load the Set
             'image_url': card.image_url,
             'audio_url': card.audio_url
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def serialize_row(row):
+        """Same output as serialize_card for a row of queryset.values(*CardSerializer.FIELDS)."""
+        return {
+            'id': row['id'],
+            'term': row['term'],
+            'definition': row['definition'],
+            'set': row['set_id'],
+            'image_url': row['image_url'],
+            'audio_url': row['audio_url']
+        }
+
+    @staticmethod
+    def serialize_many(queryset):
+        return [CardSerializer.serialize_row(row) for row in queryset.values(*CardSerializer.FIELDS)]
+
+
+class ProgressSerializer:
+    @staticmethod
+    def serialize_progress(progress):
+        return {
+            'card': progress.card_id,
+            'level': progress.level,
+            'ease': progress.ease,
+            'interval': progress.interval,
+            'repetitions': progress.repetitions,
+            'due_at': progress.due_at,
+            'last_reviewed': progress.last_reviewed,
+        }
+
+    @staticmethod
+    def serialize_due_row(row):
+        """Row of services.review_services.due_queue: the card with its scheduler state."""
+        return {
+            'card': {
+                'id': row['card_id'],
+                'term': row['card__term'],
+                'definition': row['card__definition'],
+                'set': row['card__set_id'],
+                'image_url': row['card__image_url'],
+                'audio_url': row['card__audio_url'],
+            },
+            'level': row['level'],
+            'ease': row['ease'],
+            'interval': row['interval'],
+            'repetitions': row['repetitions'],
+            'due_at': row['due_at'],
+            'last_reviewed': row['last_reviewed'],
+        }
+
+
+class QuizSerializer:
+    @staticmethod
+    def serialize_quiz(quiz, with_answers=False):
+        # The answer positions stay on the server unless asked for, results are checked against them
+        questions = quiz.questions
+        if not with_answers:
+            questions = [{key: value for key, value in question.items() if key != 'answer'} for question in questions]
+        return {
+            'id': quiz.id,
+            'set': quiz.set_id,
+            'title': quiz.title,
+            'created_at': quiz.created_at,
+            'questions': questions,
+        }
+
+    @staticmethod
+    def serialize_result(result):
+        return {
+            'id': result.id,
+            'quiz': result.quiz_id,
+            'room': result.room_id,
+            'score': result.score,
+            'total': result.total,
+            'completed_at': result.completed_at,
+        }
+
+
+class NotificationSerializer:
+    @staticmethod
+    def serialize_notification(notification):
+        return {
+            'id': notification.id,
+            'message': notification.message,
+            'is_read': notification.is_read,
+            'created_at': notification.created_at,
+        }
@@ -0,0 +1,95 @@
+from django.db.backends.signals import connection_created
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from services.auth_services import get_token_cache
+from services.db_services import connection_stats
+from services.metrics_services import install_db_wrapper
+from services.search_services import index_cards, index_set
+from services.sync_services import record_changes
+from .models import CustomUser, Set, Card, LearningProgress
+
+
+TOKEN_FIELDS = {'token', 'token_id', 'token_expires'}
+
+
+@receiver(post_save, sender=CustomUser)
+def refresh_verified_tokens(sender, instance, update_fields=None, **kwargs):
+    # QuerySet.update() does not send post_save, tokens must be changed through save()
+    if update_fields is not None and not TOKEN_FIELDS.intersection(update_fields):
+        return
+    get_token_cache().refresh_user(instance)
+
+
+@receiver(post_delete, sender=CustomUser)
+def drop_verified_tokens(sender, instance, **kwargs):
+    get_token_cache().invalidate_user(instance.pk)
+
+
+# -------------------Sync change log-----------------
+def _deleted_directly(origin, model):
+    # Cascaded deletions are implied by the deletion of their parent (set -> cards -> progress)
+    if isinstance(origin, QuerySet):
+        return origin.model is model
+    return isinstance(origin, model)
+
+
+@receiver(post_save, sender=Set)
+def log_set_saved(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'set', [instance.pk])
+
+
+@receiver(post_delete, sender=Set)
+def log_set_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Set):
+        record_changes(instance.user_id, 'set', [instance.pk], deleted=True)
+
+
+def _card_owner_id(card):
+    if Card.set.is_cached(card):
+        return card.set.user_id
+    return Set.objects.filter(id=card.set_id).values_list('user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Card)
+def log_card_saved(sender, instance, **kwargs):
+    record_changes(_card_owner_id(instance), 'card', [instance.pk])
+
+
+@receiver(post_delete, sender=Card)
+def log_card_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, Card):
+        record_changes(_card_owner_id(instance), 'card', [instance.pk], deleted=True)
+
+
+@receiver(post_save, sender=LearningProgress)
+def log_progress_saved(sender, instance, **kwargs):
+    record_changes(instance.user_id, 'progress', [instance.card_id])
+
+
+@receiver(post_delete, sender=LearningProgress)
+def log_progress_deleted(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(origin, LearningProgress):
+        record_changes(instance.user_id, 'progress', [instance.card_id], deleted=True)
+
+
+# -------------------Search index-----------------
+# Deletions need no handler: SearchDocument rows cascade with their set/card
+@receiver(post_save, sender=Set)
+def index_saved_set(sender, instance, **kwargs):
+    index_set(instance)
+
+
+@receiver(post_save, sender=Card)
+def index_saved_card(sender, instance, **kwargs):
+    card_set = instance.set if Card.set.is_cached(instance) else Set.objects.filter(id=instance.set_id).first()
+    if card_set is not None and card_set.is_public:
+        index_cards(card_set, [instance])
+
+
+# -------------------DB connections-----------------
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    connection_stats.record_opened()
+    # Per-request query count and DB time (services.metrics_services)
+    install_db_wrapper(connection)
@@ -1,3 +1,744 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import zipfile
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from anki_quiz.models import (
+    Card, CustomUser, LeaderboardEntry, LearningProgress, Notification, Quiz, QuizResult, Room, RoomMember, Set,
+)
+from fastapi_app.schemas import LoginIn, SetUpdate
+from services import async_services
+from services.auth_services import aget_user_by_token, get_token_cache, get_user_by_token
+from services.cache_services import RedisCache, get_api_cache
+from services.card_services import apply_card_operations
+from services.import_services import DeckImportError, iter_apkg_rows
+from services.leaderboard_services import leaderboard, record_points, save_results, score_answers, submit_result
+from services.notification_services import event_stream, get_unread_counter, notify, read
+from services.quiz_services import QuizError, build_questions, generate_quiz
+from services.review_services import MIN_EASE, apply_review, review_card, review_cards, sm2, sm2_batch
+from services.room_services import RoomEngine
+from services.search_services import language_config, search_public, tokenize
+from services.sync_services import changes_since, record_changes
+
+# TestCase wraps each test in a transaction of the test thread's connection, the sync calls of the
+# async services (run_sync) have to run on that thread to see its rows
+async_services._sync_executor = async_services.SyncExecutor(workers=0)
+
+
+def create_user(email, **fields):
+    return CustomUser.objects.create(username=email, email=email, name=email.split('@')[0], **fields)
+
+
+class LegacyTokenTests(TestCase):
+    def setUp(self):
+        get_token_cache().clear()
+        self.user = create_user('legacy@example.com')
+        self.raw_token = self.user.generate_token()
+
+    def test_raw_token_keeps_working_after_migration(self):
+        user, upgraded = get_user_by_token(self.raw_token)
+        self.assertEqual(user.pk, self.user.pk)
+        self.assertEqual(upgraded.split(':')[1], self.raw_token)
+
+        # The middleware path drops the upgraded token, the client keeps sending the raw one
+        get_token_cache().clear()
+        self.assertEqual(async_to_sync(aget_user_by_token)(self.raw_token).pk, self.user.pk)
+        user, again = get_user_by_token(self.raw_token)
+        self.assertEqual(again, upgraded)
+        self.assertEqual(get_user_by_token(upgraded)[0].pk, self.user.pk)
+
+    def test_migrated_raw_token_found_without_scan(self):
+        get_user_by_token(self.raw_token)
+        with self.settings(LEGACY_TOKEN_SCAN_LIMIT=0):
+            self.assertEqual(get_user_by_token(self.raw_token)[0].pk, self.user.pk)
+
+    def test_malformed_legacy_token_rejected(self):
+        self.assertEqual(get_user_by_token('not-a-token'), (None, None))
+        self.assertEqual(get_user_by_token(self.raw_token.upper()), (None, None))
+
+    def test_raw_token_rejected_after_new_login(self):
+        get_user_by_token(self.raw_token)
+        self.user.refresh_from_db()
+        self.user.generate_token_pair()
+        self.assertEqual(get_user_by_token(self.raw_token), (None, None))
+
+
+class CardOperationsTests(TestCase):
+    def setUp(self):
+        self.user = create_user('cards@example.com')
+        self.set = Set.objects.create(user=self.user, title='Words')
+        self.cards = [Card.objects.create(set=self.set, term=f't{i}', definition=f'd{i}') for i in range(3)]
+
+    def test_mixed_operations(self):
+        first, second, third = self.cards
+        results = apply_card_operations(self.user, self.set.id, [
+            {'op': 'create', 'term': 'new', 'definition': 'card'},
+            {'op': 'update', 'id': first.id, 'term': 'changed'},
+            {'op': 'delete', 'id': second.id},
+            {'op': 'update', 'id': 999999, 'term': 'missing'},
+            {'op': 'create', 'term': 'no definition'},
+            {'op': 'rename', 'id': third.id},
+        ])
+        self.assertEqual([result['success'] for result in results], [True, True, True, False, False, False])
+        self.assertEqual([result['index'] for result in results], list(range(6)))
+        self.assertEqual(results[0]['card']['term'], 'new')
+        self.assertEqual(results[1]['card']['term'], 'changed')
+        self.assertEqual(results[3]['error'], 'Card not found')
+        self.assertEqual(
+            sorted(Card.objects.filter(set=self.set).values_list('term', flat=True)), ['changed', 'new', 't2']
+        )
+
+    def test_duplicate_delete(self):
+        card = self.cards[0]
+        results = apply_card_operations(self.user, self.set.id, [
+            {'op': 'delete', 'id': card.id},
+            {'op': 'delete', 'id': card.id},
+            {'op': 'update', 'id': self.cards[1].id, 'definition': 'kept'},
+        ])
+        self.assertEqual([result['success'] for result in results], [True, False, True])
+        self.assertEqual(results[0]['id'], card.id)
+        self.assertFalse(Card.objects.filter(id=card.id).exists())
+        self.assertEqual(results[2]['card']['definition'], 'kept')
+
+    def test_update_of_deleted_card(self):
+        first, second, _ = self.cards
+        results = apply_card_operations(self.user, self.set.id, [
+            {'op': 'update', 'id': first.id, 'term': 'lost'},
+            {'op': 'delete', 'id': first.id},
+            {'op': 'delete', 'id': second.id},
+            {'op': 'update', 'id': second.id, 'term': 'lost'},
+        ])
+        self.assertEqual([result['success'] for result in results], [False, True, True, False])
+        self.assertEqual(results[0]['error'], 'Card is deleted in this batch')
+        self.assertFalse(Card.objects.filter(id__in=[first.id, second.id]).exists())
+
+    def test_bool_id_rejected(self):
+        results = apply_card_operations(self.user, self.set.id, [
+            {'op': 'delete', 'id': True},
+            {'op': 'update', 'id': False, 'term': 'x'},
+        ])
+        self.assertEqual([result['error'] for result in results], ['id is required', 'id is required'])
+        self.assertEqual(Card.objects.filter(set=self.set).count(), 3)
+
+
+def make_apkg(notes, extra=None):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'collection.anki2')
+        collection = sqlite3.connect(path)
+        collection.execute('CREATE TABLE notes (id INTEGER PRIMARY KEY, flds TEXT)')
+        collection.executemany('INSERT INTO notes (flds) VALUES (?)', [('\x1f'.join(note),) for note in notes])
+        collection.commit()
+        collection.close()
+        package = io.BytesIO()
+        with zipfile.ZipFile(package, 'w', zipfile.ZIP_DEFLATED) as archive:
+            archive.write(path, 'collection.anki2')
+            for name, data in (extra or {}).items():
+                archive.writestr(name, data)
+    package.seek(0)
+    return package
+
+
+class ApkgImportTests(TestCase):
+    def test_legacy_collection(self):
+        rows = list(iter_apkg_rows(make_apkg([('term', 'definition')])))
+        self.assertEqual([(row['term'], row['definition']) for row in rows], [('term', 'definition')])
+
+    def test_new_format_rejected(self):
+        package = make_apkg([('stub', 'update Anki')], extra={'collection.anki21b': b'zstd', 'meta': b'\x08\x03'})
+        with self.assertRaises(DeckImportError):
+            list(iter_apkg_rows(package))
+
+    def test_collection_size_limit(self):
+        with self.assertRaises(DeckImportError):
+            list(iter_apkg_rows(make_apkg([('term', 'definition')]), max_collection_bytes=1024))
+
+
+class FakeRedis:
+    """GET/MGET/SET over RESP2, drops every connection after `close_after` commands."""
+
+    def __init__(self, close_after):
+        self.close_after = close_after
+        self.data = {}
+        self.connections = 0
+
+    async def read_command(self, reader):
+        count = int((await reader.readline())[1:])
+        args = []
+        for _ in range(count):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    @staticmethod
+    def bulk(value):
+        return b'$-1\r\n' if value is None else b'$%d\r\n%s\r\n' % (len(value), value)
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        for _ in range(self.close_after):
+            try:
+                name, *args = await self.read_command(reader)
+            except (ValueError, asyncio.IncompleteReadError):
+                break
+            # Let other clients interleave between reading a command and replying
+            await asyncio.sleep(0)
+            if name == b'SET':
+                self.data[args[0]] = args[1]
+                writer.write(b'+OK\r\n')
+            elif name == b'MGET':
+                writer.write(b'*%d\r\n' % len(args) + b''.join(self.bulk(self.data.get(key)) for key in args))
+            await writer.drain()
+        writer.close()
+
+
+class RedisCacheTests(SimpleTestCase):
+    def test_concurrent_commands_with_reconnects(self):
+        async def run():
+            fake = FakeRedis(close_after=7)
+            server = await asyncio.start_server(fake.handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            cache = RedisCache(f'redis://127.0.0.1:{port}/0')
+
+            async def roundtrip(i):
+                for _ in range(3):
+                    try:
+                        await cache.set(f'key{i}', f'value{i}')
+                        return await cache.get_many([f'key{i}'])
+                    except Exception:
+                        continue  # the connection was dropped under this command
+
+            try:
+                results = await asyncio.gather(*(roundtrip(i) for i in range(50)))
+            finally:
+                if cache._writer is not None:
+                    cache._writer.close()
+                    await asyncio.sleep(0.05)  # the server's handler reads EOF and returns
+                server.close()
+                await server.wait_closed()
+            return fake, results
+
+        fake, results = asyncio.run(run())
+        self.assertGreater(fake.connections, 1)
+        for i, result in enumerate(results):
+            if result is not None:
+                self.assertEqual(result, [f'value{i}'.encode()])
+        self.assertGreater(sum(result is not None for result in results), 25)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        async_to_sync(get_api_cache().backend.clear)()
+        self.user = create_user('notified@example.com')
+
+    def create_notifications(self, count):
+        # Written by another worker: rows and counter, nothing reaches this worker's hub
+        Notification.objects.bulk_create([Notification(user=self.user, message=f'm{i}') for i in range(count)])
+        async_to_sync(get_unread_counter().add)(self.user.pk, count)
+        return list(Notification.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+
+    @staticmethod
+    async def next_notifications(stream, unread):
+        """Ids of the notification events up to the 'unread' event with the given count."""
+        ids = []
+        async for chunk in stream:
+            if chunk.startswith('id: ') and 'event: notification' in chunk:
+                ids.append(int(chunk.split('\n')[0][4:]))
+            elif f'"unread":{unread}}}' in chunk:
+                return ids
+
+    def test_catch_up_reads_every_page(self):
+        async def run():
+            stream = event_stream(self.user.pk, keepalive=0.01)
+            try:
+                await stream.__anext__()  # loads the unread counter
+                first = await sync_to_async(self.create_notifications)(150)
+                caught_up = await self.next_notifications(stream, 150)
+                second = await sync_to_async(self.create_notifications)(30)
+                return first, caught_up, second, await self.next_notifications(stream, 180)
+            finally:
+                await stream.aclose()
+
+        first, caught_up, second, caught_up_again = async_to_sync(run)()
+        self.assertEqual(caught_up, first)
+        self.assertEqual(caught_up_again, second[150:])
+
+    def test_reconnect_with_last_event_id(self):
+        ids = self.create_notifications(120)
+
+        async def run():
+            stream = event_stream(self.user.pk, last_event_id=ids[9], keepalive=0.01)
+            try:
+                return [await stream.__anext__() for _ in range(111)]
+            finally:
+                await stream.aclose()
+
+        events = async_to_sync(run)()
+        self.assertIn('event: unread', events[0])
+        self.assertEqual([int(event.split('\n')[0][4:]) for event in events[1:]], ids[10:])
+
+    def test_bulk_mark_as_read(self):
+        other = create_user('other@example.com')
+        counter = get_unread_counter()
+        self.assertEqual(async_to_sync(counter.get)(self.user.pk), 0)
+        for i in range(3):
+            self.assertEqual(async_to_sync(notify)([self.user.pk, other.pk], f'm{i}'), 2)
+        self.assertEqual(async_to_sync(counter.get)(self.user.pk), 3)
+
+        ids = list(Notification.objects.filter(user=self.user).order_by('id').values_list('id', flat=True))
+        self.assertEqual(async_to_sync(read)(self.user.pk, ids[:2] + [ids[0]]), (2, 1))
+        self.assertEqual(async_to_sync(read)(self.user.pk), (1, 0))
+        self.assertEqual(async_to_sync(read)(self.user.pk), (0, 0))
+        self.assertFalse(Notification.objects.filter(user=self.user, is_read=False).exists())
+        self.assertEqual(Notification.objects.filter(user=other, is_read=False).count(), 3)
+
+
+class SyncTokenTests(TransactionTestCase):
+    # Needs row locks, SQLite locks the whole table and fails the waiting writer
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_interleaved_writers(self):
+        user = create_user('sync@example.com')
+        first_logged, release, second_done = threading.Event(), threading.Event(), threading.Event()
+
+        def first_writer():
+            try:
+                with transaction.atomic():
+                    record_changes(user.pk, 'set', [1001])
+                    first_logged.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        def second_writer():
+            try:
+                first_logged.wait(5)
+                with transaction.atomic():
+                    record_changes(user.pk, 'set', [1002])
+                second_done.set()
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=first_writer), threading.Thread(target=second_writer)]
+        for thread in threads:
+            thread.start()
+        first_logged.wait(5)
+        # The second writer waits for the first one's commit instead of committing a later token first
+        self.assertFalse(second_done.wait(0.3))
+        token = changes_since(user, 0, 100)['next_token']
+        self.assertEqual(token, 0)
+
+        release.set()
+        for thread in threads:
+            thread.join(10)
+        changes = changes_since(user, token, 100)
+        self.assertEqual(changes['deleted']['sets'], [1001, 1002])
+        self.assertEqual(changes_since(user, changes['next_token'], 100)['deleted']['sets'], [])
+
+
+class RequestModelTests(SimpleTestCase):
+    def test_unknown_keys_ignored(self):
+        login = LoginIn.model_validate({'email': 'a@example.com', 'password': 'secret', 'remember': True})
+        self.assertEqual(login.model_dump(), {'email': 'a@example.com', 'password': 'secret'})
+        update = SetUpdate.model_validate({'id': 5, 'user': 7, 'title': 'Words'})
+        self.assertEqual(update.model_dump(exclude_unset=True), {'title': 'Words'})
+
+
+class SM2Tests(SimpleTestCase):
+    # (grade, ease, interval, repetitions) -> (ease, interval, repetitions), SuperMemo SM-2 reference values
+    STEPS = [
+        ((5, 2.5, 0.0, 0), (2.6, 1.0, 1)),
+        ((4, 2.5, 1.0, 1), (2.5, 6.0, 2)),
+        ((3, 2.5, 6.0, 2), (2.36, 15.0, 3)),
+        ((4, 2.36, 15.0, 3), (2.36, 35.4, 4)),
+        ((5, 2.6, 15.0, 3), (2.7, 39.0, 4)),
+        ((2, 2.5, 15.0, 3), (2.5, 1.0, 0)),
+        ((0, 2.1, 39.0, 6), (2.1, 1.0, 0)),
+        ((3, 1.35, 1.0, 1), (MIN_EASE, 6.0, 2)),
+        ((3, MIN_EASE, 6.0, 2), (MIN_EASE, 7.8, 3)),
+    ]
+
+    def test_steps(self):
+        for args, (ease, interval, repetitions) in self.STEPS:
+            with self.subTest(args=args):
+                new_ease, new_interval, new_repetitions = sm2(*args)
+                self.assertAlmostEqual(new_ease, ease)
+                self.assertAlmostEqual(new_interval, interval)
+                self.assertEqual(new_repetitions, repetitions)
+
+    def test_progression(self):
+        state, intervals = (2.5, 0.0, 0), []
+        for grade in (4, 4, 4, 4, 1, 4):
+            state = sm2(grade, *state)
+            intervals.append(state[1])
+        self.assertEqual(intervals, [1.0, 6.0, 15.0, 37.5, 1.0, 1.0])
+        self.assertEqual(state[2], 1)
+
+    def test_apply_review(self):
+        reviewed_at = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        progress = apply_review(LearningProgress(ease=2.5, interval=6.0, repetitions=2), 5, reviewed_at)
+        self.assertEqual((progress.interval, progress.repetitions, progress.level), (15.0, 3, 3))
+        self.assertEqual(progress.due_at, reviewed_at + timedelta(days=15))
+        self.assertEqual(progress.last_reviewed, reviewed_at)
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(12)
+        states = [(rng.choice([1.3, 1.7, 2.5, 2.8]), rng.choice([0.0, 1.0, 6.0, 20.5]), rng.randrange(5))
+                  for _ in range(200)]
+        for _ in range(10):
+            grades = [rng.randrange(6) for _ in states]
+            eases, intervals, repetitions = sm2_batch(grades, *zip(*states))
+            expected = [sm2(grade, *state) for grade, state in zip(grades, states)]
+            for got, want in zip(zip(eases.tolist(), intervals.tolist(), repetitions.tolist()), expected):
+                self.assertAlmostEqual(got[0], want[0])
+                # np.round and round() may round an exact half of the second decimal differently
+                self.assertAlmostEqual(got[1], want[1], delta=0.011)
+                self.assertEqual(got[2], want[2])
+            states = expected
+
+
+class ReviewBatchTests(TestCase):
+    def setUp(self):
+        self.user = create_user('review@example.com')
+        self.set = Set.objects.create(user=self.user, title='Words')
+        self.cards = [Card.objects.create(set=self.set, term=f't{i}', definition=f'd{i}') for i in range(5)]
+
+    def test_matches_apply_review(self):
+        rng = random.Random(7)
+        start = timezone.now() - timedelta(days=30)
+        answers = []
+        for position, card in enumerate(self.cards):
+            for day in range(6):
+                answers.append({'card': card.id, 'grade': rng.randrange(6),
+                                'reviewed_at': (start + timedelta(days=day, minutes=position)).isoformat()})
+        rng.shuffle(answers)
+
+        results = review_cards(self.user, answers)
+        self.assertTrue(all(result['success'] for result in results))
+
+        # Replay every card's answers in time order with the scalar scheduler, one snapshot per answer
+        for card in self.cards:
+            progress = LearningProgress(ease=2.5, interval=0.0, repetitions=0)
+            own = sorted((i for i, answer in enumerate(answers) if answer['card'] == card.id),
+                         key=lambda i: answers[i]['reviewed_at'])
+            for i in own:
+                apply_review(progress, answers[i]['grade'], datetime.fromisoformat(answers[i]['reviewed_at']))
+                snapshot = results[i]['progress']
+                self.assertAlmostEqual(snapshot['ease'], progress.ease)
+                self.assertAlmostEqual(snapshot['interval'], progress.interval, delta=0.011)
+                self.assertEqual(snapshot['repetitions'], progress.repetitions)
+                self.assertEqual(snapshot['last_reviewed'], progress.last_reviewed)
+            stored = LearningProgress.objects.get(user=self.user, card=card)
+            self.assertAlmostEqual(stored.ease, progress.ease)
+            self.assertAlmostEqual(stored.interval, progress.interval, delta=0.011)
+            self.assertEqual((stored.repetitions, stored.level), (progress.repetitions, progress.level))
+
+    def test_answer_older_than_last_review_rejected(self):
+        card = self.cards[0]
+        reviewed = review_card(self.user, card.id, 4)
+        results = review_cards(self.user, [
+            {'card': card.id, 'grade': 0, 'reviewed_at': '2026-01-01T00:00:00+00:00'},
+            {'card': self.cards[1].id, 'grade': 5, 'reviewed_at': '2026-01-01T00:00:00+00:00'},
+        ])
+        self.assertEqual([result['success'] for result in results], [False, True])
+        stored = LearningProgress.objects.get(user=self.user, card=card)
+        self.assertEqual((stored.repetitions, stored.last_reviewed), (reviewed.repetitions, reviewed.last_reviewed))
+
+    def test_bool_card_and_grade_rejected(self):
+        results = review_cards(self.user, [
+            {'card': True, 'grade': 4},
+            {'card': self.cards[0].id, 'grade': True},
+        ])
+        self.assertEqual([result['success'] for result in results], [False, False])
+        self.assertFalse(LearningProgress.objects.filter(user=self.user).exists())
+
+
+def create_quiz(user, answers=(0, 1, 2)):
+    card_set = Set.objects.create(user=user, title='Quiz set')
+    questions = [
+        {'card': i, 'term': f't{i}', 'options': [{'card': j, 'definition': f'd{j}'} for j in range(3)], 'answer': answer}
+        for i, answer in enumerate(answers)
+    ]
+    return Quiz.objects.create(set=card_set, user=user, title='Quiz', questions=questions)
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        async_to_sync(get_api_cache().backend.clear)()
+        self.users = [create_user(f'player{i}@example.com') for i in range(3)]
+        self.quiz = create_quiz(self.users[0])
+        self.room = Room.objects.create(creator=self.users[0], name='Room')
+        for user in self.users[1:]:
+            RoomMember.objects.create(room_obj=self.room, user=user)
+
+    def save(self, scores, room_id=None):
+        _, boards = save_results(self.quiz, scores, room_id)
+        async_to_sync(record_points)(boards)
+        return boards
+
+    def test_save_results(self):
+        first, second, _ = self.users
+        self.save({first.pk: 2, second.pk: 1}, self.room.id)
+        # Resubmitting the quiz is saved but does not count, on neither board
+        boards = self.save({first.pk: 1, second.pk: 3}, self.room.id)
+        self.assertEqual(boards, [('quiz', self.quiz.id, {first.pk: 2, second.pk: 1}),
+                                  ('room', self.room.id, {first.pk: 2, second.pk: 1})])
+        self.assertEqual(QuizResult.objects.filter(quiz=self.quiz).count(), 4)
+        entry = LeaderboardEntry.objects.get(quiz=self.quiz, user=first)
+        self.assertEqual((entry.points, entry.attempts), (2, 1))
+
+        # The room board sums the first result of every quiz played in the room
+        other_quiz = create_quiz(self.users[0])
+        _, boards = save_results(other_quiz, {first.pk: 3}, self.room.id)
+        self.assertEqual(boards[1], ('room', self.room.id, {first.pk: 5}))
+
+    def test_ranking(self):
+        first, second, third = self.users
+        self.save({first.pk: 3, second.pk: 3, third.pk: 1})
+        board = async_to_sync(leaderboard)('quiz', self.quiz.id, third, 10)
+        self.assertCountEqual([(leader['rank'], leader['user']['id'], leader['points']) for leader in board['leaders']],
+                              [(1, first.pk, 3), (1, second.pk, 3), (3, third.pk, 1)])
+        self.assertEqual(board['me'], {'rank': 3, 'points': 1})
+        self.assertEqual(board['count'], 3)
+
+        # Only the first result counts, a resubmission changes neither the cached board nor the rows
+        self.save({third.pk: 3})
+        self.save({first.pk: 0})
+        board = async_to_sync(leaderboard)('quiz', self.quiz.id, third, 2)
+        self.assertEqual([leader['points'] for leader in board['leaders']], [3, 3])
+        self.assertEqual(board['me'], {'rank': 3, 'points': 1})
+        self.assertEqual(LeaderboardEntry.objects.get(quiz=self.quiz, user=third).points, 1)
+
+    def test_submit_result_scores_answers(self):
+        user = self.users[1]
+        result, boards = submit_result(user, self.quiz.id, [0, 2, None], self.room.id)
+        self.assertEqual((result.score, result.total, result.room_id), (1, 3, self.room.id))
+        self.assertEqual(boards[1], ('room', self.room.id, {user.pk: 1}))
+        with self.assertRaises(QuizError):
+            submit_result(self.users[0], self.quiz.id, [0])
+        with self.assertRaises(Room.DoesNotExist):
+            submit_result(create_user('outsider@example.com'), self.quiz.id, [0, 1, 2], self.room.id)
+
+
+class LeaderboardConcurrencyTests(TransactionTestCase):
+    # Needs row locks, SQLite locks the whole table and fails the waiting writer
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_first_results(self):
+        user = create_user('racer@example.com')
+        quiz = create_quiz(user)
+        barrier, errors = threading.Barrier(2), []
+
+        def submit(score):
+            try:
+                barrier.wait(5)
+                save_results(quiz, {user.pk: score})
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit, args=(score,)) for score in (1, 2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(errors, [])
+        entry = LeaderboardEntry.objects.get(quiz=quiz, user=user)
+        self.assertEqual(entry.attempts, 1)
+        self.assertIn(entry.points, (1, 2))
+        self.assertEqual(QuizResult.objects.filter(quiz=quiz, user=user).count(), 2)
+
+
+class QuizGenerationTests(TestCase):
+    def setUp(self):
+        self.user = create_user('quiz@example.com')
+        self.set = Set.objects.create(user=self.user, title='Words')
+        # Two cards share a definition, options must still never repeat a text
+        self.cards = [
+            Card.objects.create(set=self.set, term=f't{i}', definition=f'd{min(i, 10)}') for i in range(12)
+        ]
+
+    def test_options_distinct_and_include_answer(self):
+        quiz = generate_quiz(self.user, self.set.id, questions=12, options=4, rng=np.random.default_rng(3))
+        self.assertEqual(len(quiz.questions), 12)
+        self.assertEqual(len({question['card'] for question in quiz.questions}), 12)
+        definitions = {card.id: card.definition for card in self.cards}
+        for question in quiz.questions:
+            options = question['options']
+            self.assertEqual(len(options), 4)
+            self.assertEqual(len({option['definition'] for option in options}), 4)
+            self.assertEqual(options[question['answer']]['card'], question['card'])
+            self.assertEqual(options[question['answer']]['definition'], definitions[question['card']])
+
+    def test_weighted_favors_low_levels(self):
+        card_ids = list(range(40))
+        definitions = [f'd{i}' for i in card_ids]
+        levels = [0] * 20 + [5] * 20  # cards 0-19 unknown, 20-39 learned
+
+        def unknown_share(levels):
+            rng = np.random.default_rng(5)
+            drawn = Counter()
+            for _ in range(50):
+                for question in build_questions(card_ids, definitions, definitions, levels, count=10, rng=rng):
+                    for option in question['options']:
+                        if option['card'] != question['card']:
+                            drawn[option['card'] < 20] += 1
+            return drawn[True] / sum(drawn.values())
+
+        self.assertGreater(unknown_share(levels), 0.75)
+        self.assertLess(abs(unknown_share(None) - 0.5), 0.1)
+
+    def test_weighted_quiz_uses_progress(self):
+        for card in self.cards[:6]:
+            LearningProgress.objects.create(user=self.user, card=card, level=5)
+        quiz = generate_quiz(self.user, self.set.id, questions=5, weighted=True, rng=np.random.default_rng(1))
+        self.assertEqual(len(quiz.questions), 5)
+
+    def test_too_few_definitions(self):
+        Card.objects.filter(set=self.set).update(definition='same')
+        with self.assertRaises(QuizError):
+            generate_quiz(self.user, self.set.id)
+
+    def test_score_answers(self):
+        quiz = create_quiz(self.user, answers=(0, 1, 2, 0))
+        self.assertEqual(score_answers(quiz, [0, 1, 0, None]), 2)
+        self.assertEqual(score_answers(quiz, [0, 1, 2, 0]), 4)
+        with self.assertRaises(QuizError):
+            score_answers(quiz, [0, 1])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = create_user('search@example.com')
+        self.public = Set.objects.create(user=self.user, title='Animals', is_public=True, term_lang='en')
+        self.private = Set.objects.create(user=self.user, title='Animals', is_public=False, term_lang='en')
+        self.card = Card.objects.create(set=self.public, term='running dogs', definition='laufende Hunde')
+        Card.objects.create(set=self.private, term='running dogs', definition='laufende Hunde')
+
+    def test_language_config(self):
+        self.assertEqual(language_config('en-US'), 'english')
+        self.assertEqual(language_config('Deutsch'), 'german')
+        self.assertEqual(language_config('xx'), 'simple')
+        self.assertEqual(list(tokenize('The running dogs', 'english')), ['run', 'dog'])
+
+    def test_public_cards_only(self):
+        results, _, has_more = search_public('dogs', language='en')
+        self.assertFalse(has_more)
+        self.assertEqual([(result['set']['id'], result['card']['id']) for result in results],
+                         [(self.public.id, self.card.id)])
+        results, _, _ = search_public('animals')
+        self.assertEqual([(result['set']['id'], result['card']) for result in results], [(self.public.id, None)])
+
+    def test_index_follows_visibility(self):
+        self.public.is_public = False
+        self.public.save()
+        self.assertEqual(search_public('dogs')[0], [])
+        self.private.is_public = True
+        self.private.save()
+        self.assertEqual({result['set']['id'] for result in search_public('dogs')[0]}, {self.private.id})
+
+
+class FakeSocket:
+    def __init__(self):
+        self.messages = []
+        self.closed_with = None
+
+    async def send(self, text):
+        self.messages.append(json.loads(text))
+
+    async def close(self, code):
+        self.closed_with = code
+
+    def types(self):
+        return [message['type'] for message in self.messages]
+
+
+class RoomEngineTests(TestCase):
+    def setUp(self):
+        async_to_sync(get_api_cache().backend.clear)()
+        self.host = create_user('host@example.com')
+        self.player = create_user('player@example.com')
+        self.room = Room.objects.create(creator=self.host, name='Room')
+        RoomMember.objects.create(room_obj=self.room, user=self.player)
+        self.quiz = create_quiz(self.host, answers=(0, 1, 2))
+
+    def test_game(self):
+        async def until(condition):
+            for _ in range(500):
+                if condition():
+                    return
+                await asyncio.sleep(0.01)
+            self.fail('Timed out')
+
+        async def run():
+            engine = RoomEngine(question_seconds=60, reveal_seconds=0)
+            host_socket, player_socket = FakeSocket(), FakeSocket()
+            state, host = engine.join(self.room.id, self.host.pk, self.host, host_socket.send, host_socket.close)
+            _, player = engine.join(self.room.id, self.host.pk, self.player, player_socket.send, player_socket.close)
+
+            await engine.handle(state, player, json.dumps({'type': 'start', 'quiz': self.quiz.id}))
+            await engine.handle(state, host, json.dumps({'type': 'start', 'quiz': self.quiz.id}))
+            self.assertEqual((state.phase, state.index, state.players), ('question', 0, {self.host.pk, self.player.pk}))
+
+            # Question 0: both answer, the host correctly, the last answer reveals at once
+            await engine.handle(state, host, json.dumps({'type': 'answer', 'index': 0, 'choice': 0}))
+            self.assertEqual(state.phase, 'question')
+            await engine.handle(state, player, json.dumps({'type': 'answer', 'index': 0, 'choice': 2}))
+            self.assertEqual(state.phase, 'reveal')
+            await until(lambda: state.phase == 'question' and state.index == 1)
+
+            # Question 1: the player leaves without answering, the host's answer was the last one missing
+            await engine.handle(state, host, json.dumps({'type': 'answer', 'index': 1, 'choice': 1}))
+            self.assertEqual(state.phase, 'question')
+            engine.leave(state, player)
+            await player.close()
+            self.assertEqual(state.phase, 'reveal')
+            await until(lambda: state.phase == 'question' and state.index == 2)
+
+            await engine.handle(state, host, json.dumps({'type': 'answer', 'index': 2, 'choice': 0}))
+            await until(lambda: 'saved' in host_socket.types())
+            self.assertEqual(state.phase, 'finished')
+            for task in list(state.tasks):
+                task.cancel()
+            await host.close()
+            return state, host_socket, player_socket
+
+        state, host_socket, player_socket = async_to_sync(run)()
+        self.assertEqual(state.scores, {self.host.pk: 2, self.player.pk: 0})
+        self.assertIn('error', player_socket.types())  # the player may not start the quiz
+        types = host_socket.types()
+        self.assertEqual([types.count(kind) for kind in ('started', 'question', 'reveal', 'finished', 'saved')],
+                         [1, 3, 3, 1, 1])
+        self.assertIn('member_left', types)
+        self.assertEqual(
+            dict(QuizResult.objects.filter(quiz=self.quiz, room=self.room).values_list('user_id', 'score')),
+            {self.host.pk: 2, self.player.pk: 0},
+        )
+        self.assertEqual(LeaderboardEntry.objects.get(room=self.room, user=self.host).points, 2)
+
+    def test_answer_checks(self):
+        async def run():
+            engine = RoomEngine(question_seconds=60, reveal_seconds=60)
+            socket = FakeSocket()
+            state, host = engine.join(self.room.id, self.host.pk, self.host, socket.send, socket.close)
+            await engine.handle(state, host, json.dumps({'type': 'answer', 'index': 0, 'choice': 0}))
+            await engine.handle(state, host, 'not json')
+            await engine.handle(state, host, json.dumps({'type': 'start', 'quiz': 0}))
+            await asyncio.sleep(0.01)
+            await host.close()
+            return socket.messages
+
+        messages = async_to_sync(run)()
+        self.assertEqual([message['error'] for message in messages if message['type'] == 'error'],
+                         ['No open question with this index', 'Invalid message', 'Quiz not found'])
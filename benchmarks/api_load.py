@@ -0,0 +1,287 @@
+"""
+Load test of the API: seeds the configured database, replays a weighted request mix in-process
+against canellus.asgi.application (httpx.ASGITransport) and reports latency percentiles and req/s.
+
+    python -m benchmarks.api_load [--users 20] [--sets 10] [--cards 200] [--progress 0.3]
+                                  [--requests 2000] [--concurrency 16] [--seed 1]
+                                  [--save result.json] [--compare baseline.json] [--threshold 10]
+
+The mix (--mix op=weight ...) defaults to login=2 check-auth=10 get-sets=30 get-cards=40 create-cards=10
+review-due=8; create-cards is a burst of --burst sequential create-card requests.
+Seeding is idempotent for the same --users/--sets/--cards/--progress, use a scratch database.
+--compare exits with status 1 if p95 of an operation or the total req/s is worse than --threshold percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+import httpx  # noqa: E402
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import connection  # noqa: E402
+
+from anki_quiz.models import Card, CustomUser, LearningProgress, Set  # noqa: E402
+
+EMAIL = 'load-{}@example.com'
+LOGIN_EMAIL = 'load-login-{}@example.com'  # login rotates the token, so it uses its own accounts
+PASSWORD = 'load-password-1'
+DEFAULT_MIX = {'login': 2, 'check-auth': 10, 'get-sets': 30, 'get-cards': 40, 'create-cards': 10, 'review-due': 8}
+
+
+# -------------------Seeding-----------------
+def seed(users, sets, cards, progress, rng):
+    """Creates the load users with their sets/cards/progress, returns {email: [set ids]}."""
+    emails = [EMAIL.format(i) for i in range(users)]
+    login_emails = [LOGIN_EMAIL.format(i) for i in range(users)]
+    existing = set(CustomUser.objects.filter(email__in=emails + login_emails).values_list('email', flat=True))
+    password = make_password(PASSWORD)  # one hash for all users
+    CustomUser.objects.bulk_create([
+        CustomUser(email=email, username=email, name=email.split('@')[0], password=password)
+        for email in emails + login_emails if email not in existing
+    ])
+    result = {}
+    for user in CustomUser.objects.filter(email__in=emails).order_by('id'):
+        set_ids = list(Set.objects.filter(user=user).order_by('id').values_list('id', flat=True))
+        if len(set_ids) < sets:
+            Set.objects.bulk_create([
+                Set(user=user, title=f'Load set {i}', term_lang='en', definition_lang='de')
+                for i in range(len(set_ids), sets)
+            ])
+            set_ids = list(Set.objects.filter(user=user).order_by('id').values_list('id', flat=True))
+        for set_id in set_ids:
+            count = Card.objects.filter(set_id=set_id).count()
+            if count < cards:
+                Card.objects.bulk_create([
+                    Card(set_id=set_id, term=f'term {i}', definition=f'definition {i}') for i in range(count, cards)
+                ], batch_size=1000)
+        if progress and not LearningProgress.objects.filter(user=user).exists():
+            card_ids = list(Card.objects.filter(set__user=user).values_list('id', flat=True))
+            picked = rng.sample(card_ids, int(len(card_ids) * progress))
+            LearningProgress.objects.bulk_create([
+                LearningProgress(user=user, card_id=card_id, level=rng.randint(0, 5)) for card_id in picked
+            ], batch_size=1000)
+        result[user.email] = set_ids[:sets]
+    return result
+
+
+# -------------------Request mix-----------------
+async def authenticate(client, session):
+    r = await client.post('/api/login/', json={'email': session['email'], 'password': PASSWORD})
+    session['headers'] = {'Authorization': f"Token {r.json()['token']}"}
+
+
+async def login(client, session):
+    return [await client.post('/api/login/', json={'email': session['login_email'], 'password': PASSWORD})]
+
+
+async def check_auth(client, session):
+    return [await client.post('/api/check-auth/', headers=session['headers'])]
+
+
+async def get_sets(client, session):
+    return [await client.get('/api/get-sets/', headers=session['headers'])]
+
+
+async def get_cards(client, session):
+    set_id = session['rng'].choice(session['sets'])
+    return [await client.get(f'/api/get-cards/{set_id}/', headers=session['headers'])]
+
+
+async def create_cards(client, session):
+    set_id = session['rng'].choice(session['sets'])
+    responses = []
+    for i in range(session['burst']):
+        responses.append(await client.post('/api/create-card/', headers=session['headers'],
+                                           json={'set': set_id, 'term': f'load term {i}', 'definition': 'load'}))
+    return responses
+
+
+async def review_due(client, session):
+    return [await client.get('/api/review/due/', headers=session['headers'])]
+
+
+OPERATIONS = {
+    'login': login,
+    'check-auth': check_auth,
+    'get-sets': get_sets,
+    'get-cards': get_cards,
+    'create-cards': create_cards,
+    'review-due': review_due,
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def replay(app, sessions, mix, requests, concurrency, rng):
+    ops = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    timings = {op: [] for op in mix}
+    errors = {op: 0 for op in mix}
+    error_samples = {}
+    sent = 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://load') as client:
+        for session in sessions:
+            await authenticate(client, session)
+
+        async def one(op, session):
+            nonlocal sent
+            async with semaphore:
+                start = time.perf_counter()
+                responses = await OPERATIONS[op](client, session)
+                timings[op].append((time.perf_counter() - start) * 1000)
+                sent += len(responses)
+                failed = [r for r in responses if r.status_code != 200]
+                if failed:
+                    errors[op] += 1
+                    error_samples.setdefault(op, f'{failed[0].status_code} {failed[0].text[:200]}')
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(op, sessions[i % len(sessions)]) for i, op in enumerate(ops)))
+        elapsed = time.perf_counter() - start
+
+    operations = {}
+    for op, values in timings.items():
+        values.sort()
+        operations[op] = {
+            'count': len(values),
+            'errors': errors[op],
+            'p50_ms': percentile(values, 50),
+            'p95_ms': percentile(values, 95),
+            'p99_ms': percentile(values, 99),
+            'error_sample': error_samples.get(op),
+        }
+    return {'rps': sent / elapsed, 'requests': sent, 'seconds': elapsed, 'operations': operations}
+
+
+# -------------------Reporting-----------------
+def print_result(result):
+    print(f"{'operation':<14}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for op, stats in result['operations'].items():
+        if not stats['count']:
+            continue
+        print(f"{op:<14}{stats['count']:>8}{stats['errors']:>8}"
+              f"{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+    for op, stats in result['operations'].items():
+        if stats['error_sample']:
+            print(f"{op} error: {stats['error_sample']}")
+    print(f"total: {result['requests']} requests, {result['rps']:.0f} req/s over {result['seconds']:.2f} s")
+
+
+def compare(result, baseline, threshold):
+    """Prints the change against a saved result, returns True if something regressed beyond threshold %."""
+    def change(new, old):
+        return (new - old) / old * 100 if old else 0.0
+
+    regressed = False
+    print(f"\nvs baseline {baseline['meta']['created_at']} ({baseline['meta'].get('git_rev') or '-'}):")
+    print(f"{'operation':<14}{'p50 %':>10}{'p95 %':>10}{'p99 %':>10}")
+    for op, stats in result['operations'].items():
+        old = baseline['operations'].get(op)
+        if not stats['count'] or not old or not old['count']:
+            continue
+        deltas = [change(stats[key], old[key]) for key in ('p50_ms', 'p95_ms', 'p99_ms')]
+        flag = ''
+        if deltas[1] > threshold:
+            regressed, flag = True, '  REGRESSION'
+        print(f"{op:<14}" + ''.join(f'{delta:>+10.1f}' for delta in deltas) + flag)
+    rps_delta = change(result['rps'], baseline['rps'])
+    flag = ''
+    if rps_delta < -threshold:
+        regressed, flag = True, '  REGRESSION'
+    print(f"{'req/s':<14}{rps_delta:>+10.1f}{flag}")
+    return regressed
+
+
+def git_rev():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_mix(items):
+    mix = dict(DEFAULT_MIX)
+    if items:
+        mix = {}
+        for item in items:
+            op, _, weight = item.partition('=')
+            if op not in OPERATIONS:
+                raise SystemExit(f'Unknown operation {op}, one of {", ".join(OPERATIONS)}')
+            mix[op] = float(weight or 1)
+    return mix
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--sets', type=int, default=10, help='sets per user')
+    parser.add_argument('--cards', type=int, default=200, help='cards per set')
+    parser.add_argument('--progress', type=float, default=0.3, help='share of cards with LearningProgress')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--burst', type=int, default=5, help='create-card requests per create-cards operation')
+    parser.add_argument('--mix', nargs='*', metavar='OP=WEIGHT')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--save', metavar='PATH')
+    parser.add_argument('--compare', metavar='PATH')
+    parser.add_argument('--threshold', type=float, default=10, help='allowed regression in percent')
+    args = parser.parse_args()
+
+    from canellus.asgi import application
+    from services.async_services import run_sync
+    from services.cache_services import get_api_cache
+
+    rng = random.Random(args.seed)
+    mix = parse_mix(args.mix)
+    start = time.perf_counter()
+    sets_by_user = await run_sync(seed, args.users, args.sets, args.cards, args.progress, rng)
+    print(f'seeded {args.users} users x {args.sets} sets x {args.cards} cards in {time.perf_counter() - start:.1f} s')
+
+    await get_api_cache().backend.clear()
+    sessions = [
+        {'email': email, 'login_email': LOGIN_EMAIL.format(i), 'sets': set_ids, 'rng': random.Random(args.seed + i),
+         'burst': args.burst, 'headers': {}}
+        for i, (email, set_ids) in enumerate(sets_by_user.items())
+    ]
+    result = await replay(application, sessions, mix, args.requests, args.concurrency, rng)
+    result['meta'] = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_rev': git_rev(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'config': {key: value for key, value in vars(args).items() if key not in ('save', 'compare')},
+        'mix': mix,
+    }
+    print_result(result)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f'saved to {args.save}')
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(result, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
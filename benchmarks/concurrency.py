@@ -0,0 +1,102 @@
+"""
+Throughput of the FastAPI endpoints under concurrent requests, in-process through httpx.ASGITransport.
+
+    python -m benchmarks.concurrency [--requests 400] [--concurrency 1 8 32] [--workers 0 8] [--latency-ms 5]
+
+workers=0:  every sync ORM call goes through sync_to_async's single thread_sensitive thread (before)
+workers=N:  services.async_services executor with N threads (after, settings.API_SYNC_WORKERS)
+
+--latency-ms adds a sleep to every SQL statement to emulate a networked database; with SQLite
+queries take microseconds and the run mostly measures Python overhead.
+Uses the configured database, a benchmark user with one set of cards is created if missing.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+import httpx  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+
+from anki_quiz.models import Card, CustomUser, Set  # noqa: E402
+from canellus.asgi import application  # noqa: E402
+from services import async_services  # noqa: E402
+from services.cache_services import get_api_cache  # noqa: E402
+
+EMAIL = 'bench-concurrency@example.com'
+PASSWORD = 'bench-password-1'
+
+
+def seed():
+    user = CustomUser.objects.filter(email=EMAIL).first()
+    if user is None:
+        user = CustomUser.objects.create_user(username=EMAIL, email=EMAIL, password=PASSWORD, name='bench')
+    card_set = Set.objects.filter(user=user).first() or Set.objects.create(user=user, title='bench')
+    if not Card.objects.filter(set=card_set).exists():
+        Card.objects.bulk_create(Card(set=card_set, term=f't{i}', definition=f'd{i}') for i in range(200))
+    return card_set.id
+
+
+def add_latency(latency):
+    def wrapper(execute, sql, params, many, context):
+        time.sleep(latency)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(wrapper)
+
+    connection_created.connect(install, weak=False)
+
+
+async def run(client, headers, set_id, requests, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            # Alternate a cache-missing page (unique limit) with an uncached endpoint
+            if i % 2:
+                r = await client.get(f'/api/get-cards/{set_id}/', params={'limit': 1 + i}, headers=headers)
+            else:
+                r = await client.get('/api/review/due/', params={'set': set_id}, headers=headers)
+            assert r.status_code == 200, r.text
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    return requests / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32])
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 8])
+    parser.add_argument('--latency-ms', type=float, default=5)
+    args = parser.parse_args()
+
+    set_id = await async_services.run_sync(seed)
+    if args.latency_ms:
+        add_latency(args.latency_ms / 1000)
+
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        r = await client.post('/api/login/', json={'email': EMAIL, 'password': PASSWORD})
+        headers = {'Authorization': f"Token {r.json()['token']}"}
+
+        print(f"{'workers':<10}" + ''.join(f'{f"c={c} req/s":>14}' for c in args.concurrency))
+        for workers in args.workers:
+            async_services._sync_executor = async_services.SyncExecutor(workers=workers)
+            row = []
+            for concurrency in args.concurrency:
+                await get_api_cache().backend.clear()
+                row.append(await run(client, headers, set_id, args.requests, concurrency))
+            async_services._sync_executor.shutdown()
+            print(f'{workers:<10}' + ''.join(f'{rps:>14.0f}' for rps in row))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
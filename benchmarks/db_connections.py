@@ -0,0 +1,119 @@
+"""
+Load test of the DB connection settings: new connection per call vs persistent connections vs psycopg pool.
+
+    python -m benchmarks.db_connections [--requests 400] [--concurrency 16] [--modes close persistent pool]
+
+close:       DATABASE_CONN_MAX_AGE=0, every API executor call / Django request opens a connection
+persistent:  DATABASE_CONN_MAX_AGE=None, each thread keeps its connection
+pool:        DATABASE_POOL=True (PostgreSQL with psycopg[pool] only, skipped otherwise)
+
+Each mode runs in a fresh process (the settings are read from the environment at startup) against
+the configured database, requests go through httpx.ASGITransport to canellus.asgi.application.
+The difference in latency between close and the other modes is the connection setup cost.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+
+MODES = {
+    'close': {'DATABASE_CONN_MAX_AGE': '0', 'DATABASE_POOL': 'False'},
+    'persistent': {'DATABASE_CONN_MAX_AGE': 'None', 'DATABASE_POOL': 'False'},
+    'pool': {'DATABASE_POOL': 'True'},
+}
+EMAIL = 'bench-connections@example.com'
+PASSWORD = 'bench-password-1'
+
+
+def seed():
+    from anki_quiz.models import Card, CustomUser, Set
+    user = CustomUser.objects.filter(email=EMAIL).first()
+    if user is None:
+        user = CustomUser.objects.create_user(username=EMAIL, email=EMAIL, password=PASSWORD, name='bench')
+    card_set = Set.objects.filter(user=user).first() or Set.objects.create(user=user, title='bench')
+    if not Card.objects.filter(set=card_set).exists():
+        Card.objects.bulk_create(Card(set=card_set, term=f't{i}', definition=f'd{i}') for i in range(100))
+    return card_set.id
+
+
+async def load(set_id, requests, concurrency):
+    import httpx
+    from canellus.asgi import application
+    from services.db_services import pool_stats
+
+    timings = []
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=application), base_url='http://bench') as client:
+        r = await client.post('/api/login/', json={'email': EMAIL, 'password': PASSWORD})
+        headers = {'Authorization': f"Token {r.json()['token']}"}
+
+        async def one(i):
+            async with semaphore:
+                start = time.perf_counter()
+                r = await client.get('/api/review/due/', params={'set': set_id, 'limit': 1 + i % 50}, headers=headers)
+                timings.append((time.perf_counter() - start) * 1000)
+                assert r.status_code == 200, r.text
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    timings.sort()
+    return {
+        'rps': requests / elapsed,
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[int(len(timings) * 0.95) - 1],
+        'stats': pool_stats(),
+    }
+
+
+def run_mode(args):
+    django.setup()
+    from django.db import connection
+    if args.run_mode == 'pool' and connection.vendor != 'postgresql':
+        print(json.dumps({'skipped': f'pool needs postgresql, database is {connection.vendor}'}))
+        return
+    result = asyncio.run(load(seed(), args.requests, args.concurrency))
+    print(json.dumps(result, default=str))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+    parser.add_argument('--run-mode', choices=list(MODES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_mode:
+        return run_mode(args)
+
+    print(f"{'mode':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'opened':>10}  pool")
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.db_connections', '--run-mode', mode,
+             '--requests', str(args.requests), '--concurrency', str(args.concurrency)],
+            env={**os.environ, **MODES[mode]}, capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        if 'skipped' in result:
+            print(f"{mode:<12}skipped: {result['skipped']}")
+            continue
+        stats = result['stats']
+        pool = stats['pool'] or {}
+        pool_info = ' '.join(f'{key}={pool[key]}' for key in ('pool_size', 'pool_available', 'requests_waiting',
+                                                               'requests_wait_ms') if key in pool)
+        print(f"{mode:<12}{result['rps']:>10.0f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{stats['connections_opened']:>10}  {pool_info or '-'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Encode time of large list payloads (no database needed).
+
+    python -m benchmarks.json_encoding [--cards 10000] [--sets 1000] [--rounds 20]
+
+before:  jsonable_encoder + stdlib json.dumps (FastAPI default for returned dicts)
+after:   services.json_services.dumps (orjson when installed), as used by FastJSONResponse
+"""
+import argparse
+import json
+import os
+import statistics
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+from django.utils import timezone  # noqa: E402
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from anki_quiz.models import Card, CustomUser, Set  # noqa: E402
+from anki_quiz.serializers import CardSerializer, SetSerializer  # noqa: E402
+from services import json_services  # noqa: E402
+
+
+def cards_payload(count):
+    cards = [
+        Card(id=i, set_id=1, term=f'term {i} ünïcode', definition=f'definition of term {i} ' * 3,
+             image_url=f'https://example.com/img/{i}.png', audio_url=None)
+        for i in range(count)
+    ]
+    return {'success': True, 'cards': [CardSerializer.serialize_card(card) for card in cards]}
+
+
+def sets_payload(count):
+    now = timezone.now()
+    user = CustomUser(id=1, email='user@example.com', name='User', last_login=now,
+                      token_expires=now + timedelta(days=2))
+    sets = [
+        Set(id=i, user=user, title=f'Set {i}', description='description ' * 5, term_lang='en',
+            definition_lang='de', created_at=now - timedelta(minutes=i), is_public=bool(i % 2))
+        for i in range(count)
+    ]
+    return {'success': True, 'sets': [SetSerializer.serialize_set(card_set) for card_set in sets]}
+
+
+def stdlib_encode(payload):
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+
+def measure(func, payload, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func(payload)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cards', type=int, default=10000)
+    parser.add_argument('--sets', type=int, default=1000)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    payloads = [
+        (f'{args.cards} cards', cards_payload(args.cards)),
+        (f'{args.sets} sets', sets_payload(args.sets)),
+    ]
+    print(f'fast encoder backend: {json_services.BACKEND}')
+    print(f"{'payload':<14}{'before ms':>12}{'after ms':>12}{'speedup':>10}{'bytes':>12}")
+    for name, payload in payloads:
+        before = measure(stdlib_encode, payload, args.rounds)
+        after = measure(json_services.dumps, payload, args.rounds)
+        size = len(json_services.dumps(payload))
+        print(f'{name:<14}{before:>12.2f}{after:>12.2f}{before / after:>9.1f}x{size:>12}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+Leaderboard reads (top 10 + "my rank") against the number of players of one quiz, on the configured database.
+
+    python -m benchmarks.leaderboard [--players 1000 10000 50000] [--results 2] [--rounds 20]
+
+before:  computed on demand from QuizResult (GROUP BY user, MAX(score), ORDER BY, COUNT for the rank)
+after:   services.leaderboard_services.leaderboard, sorted set in the API cache backend (warm)
+db:      the same from the LeaderboardEntry aggregate, used when the cache backend is unavailable
+Seeds users, a quiz per player count and QuizResult/LeaderboardEntry rows (idempotent), use a scratch database.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db.models import Max  # noqa: E402
+
+from anki_quiz.models import CustomUser, LeaderboardEntry, Quiz, QuizResult, Set  # noqa: E402
+from services.async_services import run_sync  # noqa: E402
+from services.leaderboard_services import _from_database, leaderboard  # noqa: E402
+
+EMAIL = 'bench-lb-{}@example.com'
+
+
+def seed(players, results):
+    emails = [EMAIL.format(i) for i in range(players)]
+    existing = set(CustomUser.objects.filter(email__in=emails).values_list('email', flat=True))
+    password = make_password('bench-password-1')
+    CustomUser.objects.bulk_create(
+        (CustomUser(email=email, username=email, name=email.split('@')[0], password=password)
+         for email in emails if email not in existing),
+        batch_size=1000,
+    )
+    users = list(CustomUser.objects.filter(email__in=emails).order_by('id'))
+    owner = users[0]
+    card_set = Set.objects.filter(user=owner, title='leaderboard bench').first() or Set.objects.create(
+        user=owner, title='leaderboard bench', is_public=True
+    )
+    quiz = Quiz.objects.filter(set=card_set, title=f'bench {players}').first()
+    if quiz is None:
+        quiz = Quiz.objects.create(set=card_set, user=owner, title=f'bench {players}')
+        rng = random.Random(players)
+        best = {}
+        rows = []
+        for user in users:
+            for _ in range(results):
+                score = rng.randint(0, 100)
+                best[user.pk] = max(best.get(user.pk, 0), score)
+                rows.append(QuizResult(quiz=quiz, user=user, score=score, total=100))
+        QuizResult.objects.bulk_create(rows, batch_size=1000)
+        LeaderboardEntry.objects.bulk_create(
+            (LeaderboardEntry(quiz=quiz, user_id=user_id, points=points, attempts=results)
+             for user_id, points in best.items()),
+            batch_size=1000,
+        )
+    return quiz, users[len(users) // 2]
+
+
+def on_demand(quiz, user):
+    per_user = QuizResult.objects.filter(quiz=quiz).values('user_id').annotate(best=Max('score'))
+    top = list(per_user.order_by('-best', 'user_id')[:10])
+    mine = per_user.filter(user_id=user.pk).values_list('best', flat=True).get()
+    rank = per_user.filter(best__gt=mine).count() + 1
+    return top, rank
+
+
+async def measure(func, rounds):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--results', type=int, default=2, help='results per player')
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'players':>8}{'before ms':>12}{'after ms':>12}{'db ms':>12}")
+    for players in args.players:
+        quiz, user = await run_sync(seed, players, args.results)
+        before = await measure(lambda: run_sync(on_demand, quiz, user), args.rounds)
+        await leaderboard('quiz', quiz.id, user)  # loads the sorted set
+        after = await measure(lambda: leaderboard('quiz', quiz.id, user), args.rounds)
+        database = await measure(lambda: run_sync(_from_database, 'quiz', quiz.id, user.pk, 10), args.rounds)
+        print(f'{players:>8}{before:>12.2f}{after:>12.2f}{database:>12.2f}')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
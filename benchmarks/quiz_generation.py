@@ -0,0 +1,96 @@
+"""
+Quiz generation time against deck size, on the configured database.
+
+    python -m benchmarks.quiz_generation [--decks 100 1000 10000] [--questions 20] [--options 4] [--rounds 5]
+
+before:  one random distractor query per question (ORDER BY random() LIMIT options - 1)
+after:   services.quiz_services.generate_quiz, the deck is loaded once and sampled with numpy
+Seeds one user with a set per deck size (idempotent), use a scratch database.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+
+from anki_quiz.models import Card, CustomUser, LearningProgress, Quiz, Set  # noqa: E402
+from services.quiz_services import generate_quiz  # noqa: E402
+
+EMAIL = 'bench-quiz@example.com'
+
+
+def seed(user, size):
+    card_set = Set.objects.filter(user=user, title=f'quiz bench {size}').first()
+    if card_set is None:
+        card_set = Set.objects.create(user=user, title=f'quiz bench {size}')
+        Card.objects.bulk_create(
+            (Card(set=card_set, term=f'term {i}', definition=f'definition {i}') for i in range(size)), batch_size=1000
+        )
+        card_ids = list(Card.objects.filter(set=card_set).values_list('id', flat=True))
+        LearningProgress.objects.bulk_create(
+            (LearningProgress(user=user, card_id=card_id, level=random.randint(0, 5))
+             for card_id in random.sample(card_ids, len(card_ids) // 2)),
+            batch_size=1000,
+        )
+    return card_set
+
+
+def naive_quiz(user, card_set, questions, options):
+    cards = list(Card.objects.filter(set=card_set).order_by('?')[:questions])
+    items = []
+    for card in cards:
+        distractors = list(
+            Card.objects.filter(set=card_set).exclude(definition=card.definition).order_by('?')
+            .values_list('id', 'definition')[:options - 1]
+        )
+        items.append({'card': card.id, 'term': card.term, 'options': [(card.id, card.definition), *distractors]})
+    return Quiz.objects.create(set=card_set, user=user, title=card_set.title, questions=items)
+
+
+def measure(func, rounds):
+    timings, queries = [], 0
+    for _ in range(rounds):
+        with CaptureQueriesContext(connection) as captured:
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        queries = len(captured)
+    return statistics.median(timings), queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--decks', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--options', type=int, default=4)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    user = CustomUser.objects.filter(email=EMAIL).first() or CustomUser.objects.create_user(
+        username=EMAIL, email=EMAIL, password='bench-password-1', name='bench'
+    )
+    print(f"{'cards':>8}{'before ms':>12}{'queries':>9}{'after ms':>12}{'queries':>9}{'weighted ms':>13}")
+    for size in args.decks:
+        card_set = seed(user, size)
+        before, before_queries = measure(lambda: naive_quiz(user, card_set, args.questions, args.options), args.rounds)
+        after, after_queries = measure(
+            lambda: generate_quiz(user, card_set.id, questions=args.questions, options=args.options), args.rounds
+        )
+        weighted, _ = measure(
+            lambda: generate_quiz(user, card_set.id, questions=args.questions, options=args.options, weighted=True),
+            args.rounds,
+        )
+        print(f'{size:>8}{before:>12.2f}{before_queries:>9}{after:>12.2f}{after_queries:>9}{weighted:>13.2f}')
+    Quiz.objects.filter(user=user).delete()
+
+
+if __name__ == '__main__':
+    main()
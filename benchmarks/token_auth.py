@@ -0,0 +1,67 @@
+"""
+Per-request cost of bearer token verification.
+
+    python -m benchmarks.token_auth [--requests 200]
+
+before:     PBKDF2 check_password of the token secret (what check_auth did on every request)
+after:      TokenHasher HMAC-SHA256 verification (verified-token cache miss)
+after+hit:  verified-token cache hit, no hashing at all
+"""
+import argparse
+import os
+import secrets
+import statistics
+import time
+from datetime import timedelta
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+django.setup()
+
+from django.contrib.auth.hashers import check_password, make_password  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from anki_quiz.hashers import TokenHasher  # noqa: E402
+from anki_quiz.models import CustomUser  # noqa: E402
+from services.auth_services import VerifiedTokenCache  # noqa: E402
+
+
+def measure(func, requests):
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        assert func()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.mean(timings), timings[int(len(timings) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    secret = secrets.token_urlsafe(32)
+    token = f"{secrets.token_hex(8)}:{secret}"
+    hasher = TokenHasher(pepper=secrets.token_bytes(32))
+    pbkdf2_hash = make_password(secret, hasher='pbkdf2_sha256_custom')
+    hmac_hash = hasher.encode(secret)
+
+    cache = VerifiedTokenCache()
+    user = CustomUser(pk=1, token=hmac_hash, token_expires=timezone.now() + timedelta(days=2))
+    cache.set(token, user)
+
+    cases = [
+        ('before (PBKDF2)', lambda: check_password(secret, pbkdf2_hash)),
+        ('after (HMAC-SHA256)', lambda: hasher.verify(secret, hmac_hash)),
+        ('after (cache hit, no DB)', lambda: cache.get(token) is not None),
+    ]
+    print(f"{'case':<26}{'mean ms':>12}{'p95 ms':>12}{'req/s':>14}")
+    for name, func in cases:
+        mean, p95 = measure(func, args.requests)
+        print(f"{name:<26}{mean:>12.4f}{p95:>12.4f}{1000 / mean:>14.0f}")
+
+
+if __name__ == '__main__':
+    main()
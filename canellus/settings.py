@@ -13,11 +13,13 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-load_dotenv(dotenv_path=".env", verbose=True, override=True)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# The project's .env whatever the working directory (manage.py tune_hashers --write updates this file)
+load_dotenv(dotenv_path=BASE_DIR / ".env", verbose=True, override=True)
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -45,7 +47,74 @@ PASSWORD_HASHERS = [
 ]
 
 # Настройка кастомного hasher — вариант 1
-PBKDF2_ITERATIONS = 100_000
+# Iterations of CustomPBKDF2Hasher, measure with `python manage.py tune_hashers`
+PBKDF2_ITERATIONS = int(os.getenv('PBKDF2_ITERATIONS', 100_000))
+
+# Process pool for password hashing (services.hashing_services), 0 workers = background thread.
+# Beyond PASSWORD_HASHING_MAX_PENDING queued jobs login/register answer 503 with Retry-After.
+PASSWORD_HASHING_WORKERS = int(os.getenv('PASSWORD_HASHING_WORKERS', 2))
+PASSWORD_HASHING_MAX_PENDING = int(os.getenv('PASSWORD_HASHING_MAX_PENDING', 16))
+PASSWORD_HASHING_RETRY_AFTER = int(os.getenv('PASSWORD_HASHING_RETRY_AFTER', 1))  # seconds
+
+# Rows fetched per round-trip by the NDJSON mode of get-cards
+CARDS_STREAM_CHUNK_SIZE = int(os.getenv('CARDS_STREAM_CHUNK_SIZE', 2000))
+
+# Max operations accepted by one /cards/bulk/ request
+CARDS_BULK_MAX_OPERATIONS = int(os.getenv('CARDS_BULK_MAX_OPERATIONS', 500))
+
+# Deck import (/import/ and `manage.py import_deck`)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', 1000))  # cards per bulk_create
+IMPORT_MAX_UPLOAD_BYTES = int(os.getenv('IMPORT_MAX_UPLOAD_BYTES', 200 * 1024 * 1024))
+IMPORT_SPOOL_MAX_MEMORY = 1024 * 1024  # larger uploads are spooled to a temporary file
+# Uncompressed size of the SQLite collection of an .apkg, checked while extracting (zip bombs)
+IMPORT_MAX_COLLECTION_BYTES = int(os.getenv('IMPORT_MAX_COLLECTION_BYTES', 1024 * 1024 * 1024))
+
+# Max answers accepted by one /review/answers/ request
+REVIEW_MAX_ANSWERS = int(os.getenv('REVIEW_MAX_ANSWERS', 1000))
+
+# Read-through cache of set/card reads (services.cache_services).
+# locmem is per process: a write invalidates only the cache of the worker that handled it, the other
+# workers keep serving the old sets/cards for up to API_CACHE_TTL seconds. Use locmem with a single worker
+# only, with several (gunicorn -w / WEB_CONCURRENCY, uvicorn --workers) set redis (or any Redis-protocol server).
+API_CACHE_BACKEND = os.getenv('API_CACHE_BACKEND', 'locmem')  # locmem | redis
+API_CACHE_URL = os.getenv('API_CACHE_URL', 'redis://localhost:6379/0')
+API_CACHE_TTL = int(os.getenv('API_CACHE_TTL', 300))  # seconds
+API_CACHE_MAX_ENTRIES = int(os.getenv('API_CACHE_MAX_ENTRIES', 10_000))  # locmem only
+
+# Threads for the sync ORM work of the FastAPI endpoints (services.async_services),
+# each keeps its own DB connection. 0 runs everything on the single thread_sensitive thread.
+API_SYNC_WORKERS = int(os.getenv('API_SYNC_WORKERS', 8))
+
+# Request instrumentation (services.metrics_services): Prometheus text at /api/metrics/ for these
+# client addresses, and a JSON log line (logger services.metrics_services) for requests slower than SLOW_REQUEST_MS
+METRICS_ALLOWED_HOSTS = os.getenv('METRICS_ALLOWED_HOSTS', '127.0.0.1,::1').split(',')
+SLOW_REQUEST_MS = int(os.getenv('SLOW_REQUEST_MS', 500))
+
+# Live quiz rooms (services.room_services, WebSocket /api/rooms/<id>/ws/). Room state is kept in the
+# worker process, with several workers route the sockets of a room to the same one
+ROOM_QUESTION_SECONDS = int(os.getenv('ROOM_QUESTION_SECONDS', 20))  # default time per question
+ROOM_REVEAL_SECONDS = int(os.getenv('ROOM_REVEAL_SECONDS', 3))  # pause after the answer is shown
+ROOM_SEND_QUEUE_SIZE = int(os.getenv('ROOM_SEND_QUEUE_SIZE', 100))  # messages a client may lag behind
+
+# Notifications (services.notification_services): events an SSE stream (/api/notifications/stream/) may
+# lag behind before they are dropped and read from the database, and the keepalive interval of the stream
+NOTIFICATIONS_QUEUE_SIZE = int(os.getenv('NOTIFICATIONS_QUEUE_SIZE', 100))
+NOTIFICATIONS_KEEPALIVE_SECONDS = int(os.getenv('NOTIFICATIONS_KEEPALIVE_SECONDS', 15))
+
+# Tokens without token_id (issued by generate_token) are still accepted and migrated
+# to the token_id:secret scheme on first use. Disable once no legacy tokens remain.
+LEGACY_TOKEN_AUTH = os.getenv('LEGACY_TOKEN_AUTH', 'True') == 'True'
+# Password hashes checked per request for a not yet migrated legacy token (most recent logins first),
+# holders of older legacy tokens have to log in again
+LEGACY_TOKEN_SCAN_LIMIT = int(os.getenv('LEGACY_TOKEN_SCAN_LIMIT', 50))
+
+# Key of the HMAC-SHA256 used for session tokens (anki_quiz.hashers.TokenHasher).
+# Falls back to SECRET_KEY, changing it invalidates all issued tokens.
+TOKEN_HASH_PEPPER = os.getenv('TOKEN_HASH_PEPPER')
+
+# In-process cache of verified tokens used by the auth middleware
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))  # seconds
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10_000))
 
 
 # Application definition
@@ -61,6 +130,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'anki_quiz.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -102,9 +172,27 @@ DATABASES = {
          'USER': os.getenv('DATABASE_USERNAME'),
          'PASSWORD': os.getenv('DATABASE_PASSWORD'),
          'NAME': os.getenv('DATABASE_NAME'),
+         # Seconds a connection is reused across requests (0 = new connection per request, None = unlimited).
+         # Also applies to the API executor threads (services.async_services).
+         'CONN_MAX_AGE': None if os.getenv('DATABASE_CONN_MAX_AGE') == 'None' else int(os.getenv('DATABASE_CONN_MAX_AGE', 60)),
+         'CONN_HEALTH_CHECKS': os.getenv('DATABASE_CONN_HEALTH_CHECKS', 'True') == 'True',
      }
  }
 
+# psycopg3 connection pool (postgresql backend, needs psycopg[pool]) instead of persistent connections.
+# Connections are borrowed per request / executor call and returned afterwards, a caller waits up to
+# DATABASE_POOL_TIMEOUT seconds for a free one. With max_size below API_SYNC_WORKERS + 1 calls queue.
+DATABASE_POOL = os.getenv('DATABASE_POOL', 'False') == 'True'
+if DATABASE_POOL:
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # required by Django with a pool
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.getenv('DATABASE_POOL_MIN_SIZE', 2)),
+            'max_size': int(os.getenv('DATABASE_POOL_MAX_SIZE', 10)),
+            'timeout': float(os.getenv('DATABASE_POOL_TIMEOUT', 10)),
+        },
+    }
+
 # DATABASES = {
 #     'default': {
 #         'ENGINE': 'django.db.backends.sqlite3',
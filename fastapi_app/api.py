@@ -1,14 +1,76 @@
 import re
-from fastapi import FastAPI, Query, Request, Response
-from fastapi.responses import JSONResponse
-from anki_quiz.models import CustomUser, Set, Card
-from anki_quiz.serializers import CardSerializer, UserSerializer, SetSerializer
+import csv
+import logging
+import tempfile
+from fastapi import FastAPI, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from django.conf import settings
+from anki_quiz.models import CustomUser, Set, Card, Notification, Quiz, Room
+from anki_quiz.serializers import (
+    CardSerializer, NotificationSerializer, ProgressSerializer, QuizSerializer, SetSerializer, UserSerializer,
+)
 from asgiref.sync import sync_to_async
-from django.contrib.auth.hashers import check_password
-from typing import Dict, Any
+from services.async_services import run_sync
+from services.auth_services import aget_user_by_token, split_token
+from services.db_services import pool_stats
+from services.metrics_services import finish_request, is_metrics_client, registry, start_request, timed
+from services.cache_services import get_api_cache, set_cards_scope, sets_scope, user_cards_scope
+from services.card_services import apply_card_operations
+from services.import_services import DeckImportError, detect_format, import_deck
+from services.leaderboard_services import check_access, is_room_member, leaderboard, record_points, submit_result
+from services.notification_services import (
+    event_stream, friend_ids, get_unread_counter, notify, read, room_member_ids,
+)
+from services.quiz_services import QuizError, generate_quiz
+from services.room_services import CLOSE_FORBIDDEN, get_room_engine
+from services.review_services import due_queue, review_card, review_cards
+from services.search_services import search_public
+from services.sync_services import changes_since
+from services.pagination_services import decode_cursor, encode_cursor
+from services.hashing_services import HashingPoolSaturated, acheck_user_password, get_hashing_pool
+from services.json_services import dumps
+from fastapi_app.responses import FastJSONResponse
+from fastapi_app.schemas import (
+    AuthOut, BulkCardsIn, CardCreate, CardEnvelope, CardsEnvelope, CardUpdate, LeaderboardEnvelope, LoginIn,
+    NotificationSendIn, NotificationsEnvelope, NotificationsReadIn, QuizCreate, QuizEnvelope, QuizResultEnvelope,
+    QuizResultIn, RegisterIn, ReviewAnswerIn, ReviewAnswersIn, SearchEnvelope, SetCreate, SetEnvelope, SetsEnvelope,
+    SetUpdate, documented,
+)
+from typing import Optional
+from django.db.models import Q
 from datetime import datetime, timezone
 
-api_app = FastAPI()
+logger = logging.getLogger(__name__)
+
+api_app = FastAPI(default_response_class=FastJSONResponse)
+
+
+@api_app.exception_handler(RequestValidationError)
+async def request_validation_error(request: Request, exc: RequestValidationError):
+    # Same envelope as the endpoint errors instead of FastAPI's 422 body
+    details = [
+        {"field": ".".join(str(part) for part in error["loc"] if part != "body"), "message": error["msg"]}
+        for error in exc.errors()
+    ]
+    return FastJSONResponse({"success": False, "error": "Invalid data format", "details": details}, status_code=400)
+
+
+@api_app.exception_handler(HashingPoolSaturated)
+async def hashing_pool_saturated(request: Request, exc: HashingPoolSaturated):
+    return JSONResponse(
+        {"success": False, "error": "Server is busy, try again later"},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+def _is_token_pair(token):
+    """Same format check as the check_auth middleware: legacy tokens (no token_id) never reach the legacy scan here."""
+    if not token:
+        return False
+    token_id, token_secret = split_token(token)
+    return token_id is not None and bool(token_secret)
 
 
 @api_app.middleware("http")
@@ -19,6 +81,8 @@ async def check_auth(request: Request, call_next):
         r'^/api/register/',
         r'^/api/check-auth/',
         r'^/api/users/',
+        r'^/api/metrics/$',
+        r'^/api/notifications/stream/$',  # EventSource can not send headers, authenticates itself
     ]
 
     if any(re.match(pattern, request.url.path) for pattern in EXCLUDED_PATHS):
@@ -28,23 +92,34 @@ async def check_auth(request: Request, call_next):
     if not auth_header or not auth_header.startswith("Token "):
         return JSONResponse({"success": False, "error": "Token not provided"}, status_code=401)
 
-    try:
-        token = auth_header.split(" ")[1]
-        token_id, token_secret = token.split(":")
-    except ValueError:
+    token = auth_header.split(" ", 1)[1]
+    token_id, token_secret = split_token(token)
+    if token_id is None or not token_secret:
         return JSONResponse({"success": False, "error": "Invalid token format"}, status_code=400)
 
-    try:
-        user = await sync_to_async(CustomUser.objects.get)(token_id=token_id)
-    except CustomUser.DoesNotExist:
+    # token_id lookup + HMAC check, repeat requests are served from the verified-token cache
+    with timed("auth"):
+        user = await aget_user_by_token(token)
+    if user is None:
         return JSONResponse({"success": False, "error": "Invalid token"}, status_code=401)
 
-    if check_password(token_secret, user.token):
-        request.state.user = user
-        return await call_next(request)
+    request.state.user = user
+    return await call_next(request)
 
-    return JSONResponse({"success": False, "error": "Invalid token"}, status_code=401)
 
+# Registered after check_auth, so it is the outer middleware and its wall time includes authentication
+@api_app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    token = start_request()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        route = request.scope.get("root_path", "") + route.path if route else "unmatched"
+        finish_request(token, "fastapi", request.method, route, status, request.url.path)
 
 
 
@@ -55,45 +130,45 @@ async def ping():
 @api_app.get("/users/{email}")
 async def get_user(email: str):
     try:
-        user = await sync_to_async(CustomUser.objects.get)(email=email)
+        user = await CustomUser.objects.aget(email=email)
         return {"email": user.email, "name": user.username}
     except CustomUser.DoesNotExist:
         return {"error": "User not found"}
 
 @api_app.get("/users/")
 async def get_users():
-    users = await sync_to_async(list)(CustomUser.objects.all())
-    return [{"email": user.email, "name": user.username} for user in users]
+    return [{"email": user.email, "name": user.username} async for user in CustomUser.objects.all()]
 
 
 # -------------------Authentication-----------------
-@api_app.post("/login/")
-async def login(payload: Dict[Any, Any]):
-    email = payload.get("email")
-    password = payload.get("password")
+@api_app.post("/login/", responses=documented(AuthOut))
+async def login(payload: LoginIn):
+    email = payload.email
+    password = payload.password
 
     try:
-        user = await sync_to_async(CustomUser.objects.get)(email=email)
+        user = await CustomUser.objects.aget(email=email)
     except CustomUser.DoesNotExist:
         return {"success": False, "error": "Invalid credentials"}
 
-    if not user.check_password(password):
+    if not await acheck_user_password(user, password):
         return {"success": False, "error": "Invalid credentials"}
 
     if user:
-        # token = await sync_to_async(user.generate_token)()
-        full_token, _, _ = await sync_to_async(user.generate_token_pair)()
-        user_data = await sync_to_async(UserSerializer.serialize_user)(user)
-        return {"success": True, "token": full_token, "user": user_data, "expires": user.token_expires.isoformat()}
+        full_token, _, _ = await user.async_generate_token_pair()
+        # Cached sets embed the owner with token_expires
+        await get_api_cache().invalidate(sets_scope(user.pk))
+        user_data = UserSerializer.serialize_user(user)
+        return FastJSONResponse({"success": True, "token": full_token, "user": user_data, "expires": user.token_expires})
     else:
         return {"success": False, "error": "Invalid credentials"}
     
 
-@api_app.post("/register/")
-async def register(payload: Dict[Any, Any]):
-    email = payload.get("email")
-    password = payload.get("password")
-    name = payload.get("name")
+@api_app.post("/register/", responses=documented(AuthOut))
+async def register(payload: RegisterIn):
+    email = payload.email
+    password = payload.password
+    name = payload.name
 
     if not UserSerializer.validate_email(email):
         return {"success": False, "error": "Invalid email"}
@@ -102,10 +177,16 @@ async def register(payload: Dict[Any, Any]):
     if user_exists:
         return {"success": False, "error": "Email already exists"}
 
-    user = await sync_to_async(CustomUser.objects.create_user)(email=email, username=email, password=password, name=name)
-    full_token, _, _ = await sync_to_async(user.generate_token_pair)()
-    user_data = await sync_to_async(UserSerializer.serialize_user)(user)
-    return {"success": True, "token": full_token, "user": user_data, "expires": user.token_expires.isoformat()}
+    user = CustomUser(
+        email=CustomUser.objects.normalize_email(email),
+        username=CustomUser.normalize_username(email),
+        name=name,
+        password=await get_hashing_pool().make_password(password),
+    )
+    await user.asave()
+    full_token, _, _ = await user.async_generate_token_pair()
+    user_data = UserSerializer.serialize_user(user)
+    return FastJSONResponse({"success": True, "token": full_token, "user": user_data, "expires": user.token_expires})
 
 
 @api_app.post("/check-auth/")
@@ -119,117 +200,133 @@ async def check_auth(request: Request, response: Response):
     else:
         return {"success": False, "error": "Token not provided"}
     
-    try:
-        token_id, token_secret = token.split(":")
-    except ValueError:
+    token_id, token_secret = split_token(token)
+    if token_id is None or not token_secret:
         return {"success": False, "error": "Invalid token"}
-    
-    try:
-        user = await sync_to_async(CustomUser.objects.get)(token_id=token_id)
-    except CustomUser.DoesNotExist:
+
+    user = await aget_user_by_token(token)
+    if user is None:
         return {"success": False, "error": "Invalid token"}
-    
-    if check_password(token_secret, user.token):
-        response.status_code = 200
-        return {"success": True, "user": UserSerializer.serialize_user(user)}
 
-    return {"success": False, "error": "Invalid token"}
+    response.status_code = 200
+    return {"success": True, "user": UserSerializer.serialize_user(user)}
 
 # ------------------End Authentication---------------
 
 
-@api_app.post("/create-set/")
-async def create_set(request: Request, response: Response):
-    data = await request.json()
+@api_app.post("/create-set/", responses=documented(SetEnvelope))
+async def create_set(request: Request, response: Response, payload: SetCreate):
     user = request.state.user
     response.status_code = 400
 
     if user:
         try:
-            new_set = await sync_to_async(Set.objects.create)(user=user, **data)
-            response.status_code = 200
-            return {"success": True, "set": await sync_to_async(SetSerializer.serialize_set)(new_set)}
+            new_set = await Set.objects.acreate(user=user, **payload.model_dump(exclude_unset=True))
+            await get_api_cache().invalidate(sets_scope(user.pk))
+            return FastJSONResponse({"success": True, "set": SetSerializer.serialize_set(new_set)})
         except Exception as e:
-            print('Create set error:', e)
+            logger.warning('Create set error: %s', e)
             return {"success": False, "error": "Error creating set, invalid data format (title, description, is_public) or user not found"}
 
     return {"success": False, "error": "User not found"}
 
 
-@api_app.get("/get-sets/")
+@api_app.get("/get-sets/", responses=documented(SetsEnvelope))
 async def get_sets(
         request: Request, 
         response: Response, 
         since: str = '1999-01-01T00:00:00',
         skip: int = Query(0, ge=0, description="Number of items to skip"),
-        limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return")   
+        limit: int = Query(100, ge=1, le=1000, description="Maximum number of items to return"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page, replaces skip")
     ):
 
-    print(request.state.user, since)
+    logger.debug('get-sets user=%s since=%s', request.state.user, since)
     user = request.state.user
     response.status_code = 400
     
     if user:
-        try:
-            sets_query = Set.objects.filter(user=user).filter(created_at__gt=since).order_by('-created_at')[skip:skip+limit+1] # прибавляем 1, чтобы узнать, есть ли еще данные
-            sets = await sync_to_async(list)(sets_query)
-
-            # Проверяем, есть ли еще данные
-            has_more = len(sets) > limit
-            if has_more:
-                sets = sets[:limit]  # Обрезаем лишнее
-
-            response.status_code = 200
-            return {"success": True, 
-                    "sets": [await sync_to_async(SetSerializer.serialize_set)(set) for set in sets], 
-                    "pagination": {
-                    "skip": skip,
-                    "limit": limit,
-                    "count": len(sets),
-                    "has_more": has_more
+        async def build():
+            try:
+                sets_query = Set.objects.filter(user=user).filter(created_at__gt=since).order_by('-created_at', '-id')
+                if cursor:
+                    # Keyset pagination on (created_at, id), served by set_user_created_id_idx
+                    try:
+                        created_at, set_id = decode_cursor(cursor, 2)
+                        created_at = datetime.fromisoformat(created_at)
+                    except (ValueError, TypeError):
+                        return {"success": False, "error": "Invalid cursor"}
+                    sets_query = sets_query.filter(
+                        Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=set_id)
+                    )[:limit+1]
+                else:
+                    sets_query = sets_query[skip:skip+limit+1] # прибавляем 1, чтобы узнать, есть ли еще данные
+                # One query (owner joined) and one executor hop for the whole page
+                sets = await run_sync(SetSerializer.serialize_many, sets_query)
+
+                # Проверяем, есть ли еще данные
+                has_more = len(sets) > limit
+                if has_more:
+                    sets = sets[:limit]  # Обрезаем лишнее
+
+                return {"success": True, 
+                        "sets": sets, 
+                        "pagination": {
+                        "skip": None if cursor else skip,
+                        "limit": limit,
+                        "count": len(sets),
+                        "has_more": has_more,
+                        "next_cursor": encode_cursor(sets[-1]["created_at"], sets[-1]["id"]) if has_more else None,
+                    }
                 }
-            }
-        except Exception as e:
-            print('Get sets error:', e)
-            return {"success": False, "error": "Error getting sets"}
+            except Exception as e:
+                logger.warning('Get sets error: %s', e)
+                return {"success": False, "error": "Error getting sets"}
+
+        result = await get_api_cache().get_or_build(
+            "sets", [user.pk, since, skip, limit, cursor], [sets_scope(user.pk)], build
+        )
+        # Returned as a Response, so FastAPI does not run jsonable_encoder over the page
+        return FastJSONResponse(result, status_code=200 if result["success"] else 400)
 
     return {"success": False, "error": "User not found"}
 
 
-@api_app.get("/get-set/{set_id}/")
+@api_app.get("/get-set/{set_id}/", responses=documented(SetEnvelope))
 async def get_set(request: Request, response: Response, set_id: int):
     user = request.state.user
     response.status_code = 400
 
     if user:
-        try:
-            set = await sync_to_async(Set.objects.get)(id=set_id, user=user)
-            response.status_code = 200
-            return {"success": True, "set": await sync_to_async(SetSerializer.serialize_set)(set)}
-        except Exception as e:
-            print('Get set error:', e)
-            return {"success": False, "error": "Error getting set, user not found or set not found"}
+        async def build():
+            try:
+                set = await Set.objects.select_related('user').aget(id=set_id, user=user)
+                return {"success": True, "set": SetSerializer.serialize_set(set)}
+            except Exception as e:
+                logger.warning('Get set error: %s', e)
+                return {"success": False, "error": "Error getting set, user not found or set not found"}
+
+        result = await get_api_cache().get_or_build("set", [user.pk, set_id], [sets_scope(user.pk)], build)
+        return FastJSONResponse(result, status_code=200 if result["success"] else 400)
 
     return {"success": False, "error": "User not found"}
 
 
-@api_app.post("/update-set/{set_id}/")
-async def update_set(request: Request, response: Response, set_id: int):
-    data = await request.json()
+@api_app.post("/update-set/{set_id}/", responses=documented(SetEnvelope))
+async def update_set(request: Request, response: Response, set_id: int, payload: SetUpdate):
     user = request.state.user
     response.status_code = 400
 
     if user:
         try:
-            set = await sync_to_async(Set.objects.get)(id=set_id, user=user)
-            set.title = data.get("title", set.title)
-            set.description = data.get("description", set.description)
-            set.is_public = data.get("is_public", set.is_public)
-            await sync_to_async(set.save)()
-            response.status_code = 200
-            return {"success": True, "set": await sync_to_async(SetSerializer.serialize_set)(set)}
+            set = await Set.objects.select_related('user').aget(id=set_id, user=user)
+            for field, value in payload.model_dump(exclude_unset=True).items():
+                setattr(set, field, value)
+            await set.asave()
+            await get_api_cache().invalidate(sets_scope(user.pk))
+            return FastJSONResponse({"success": True, "set": SetSerializer.serialize_set(set)})
         except Exception as e:
-            print('Update set error:', e)
+            logger.warning('Update set error: %s', e)
             return {"success": False, "error": "Error updating set, user not found or set not found"}
 
     return {"success": False, "error": "User not found"}
@@ -242,84 +339,142 @@ async def delete_set(request: Request, response: Response, set_id: int):
 
     if user:
         try:
-            set = await sync_to_async(Set.objects.get)(id=set_id, user=user)
-            await sync_to_async(set.delete)()
+            set = await Set.objects.aget(id=set_id, user=user)
+            await set.adelete()
+            await get_api_cache().invalidate(sets_scope(user.pk), set_cards_scope(set_id), user_cards_scope(user.pk))
             response.status_code = 200
             return {"success": True, "message": "Set deleted successfully"}
         except Exception as e:
-            print('Delete set error:', e)
+            logger.warning('Delete set error: %s', e)
             return {"success": False, "error": "Error deleting set, user not found or set not found"}
 
     return {"success": False, "error": "User not found"}
 
 
-@api_app.post("/create-card/")
-async def create_card(request: Request, response: Response):
-    data = await request.json()
+@api_app.post("/create-card/", responses=documented(CardEnvelope))
+async def create_card(request: Request, response: Response, payload: CardCreate):
     user = request.state.user
     response.status_code = 400
 
     if user:
         try:
-            data["set"] = await sync_to_async(Set.objects.get)(id=data.get("set"), user=user)
-            new_card = await sync_to_async(Card.objects.create)(**data)
-            response.status_code = 200
-            return {"success": True, "card": await sync_to_async(CardSerializer.serialize_card)(new_card)}
+            card_set = await Set.objects.aget(id=payload.set, user=user)
+            new_card = await Card.objects.acreate(
+                set=card_set, **payload.model_dump(exclude={"set"}, exclude_unset=True)
+            )
+            await get_api_cache().invalidate(set_cards_scope(new_card.set_id), user_cards_scope(user.pk))
+            return FastJSONResponse({"success": True, "card": CardSerializer.serialize_card(new_card)})
         except Exception as e:
-            print('Create card error:', e)
+            logger.warning('Create card error: %s', e)
             return {"success": False, "error": "Error creating card, invalid data format (term, definition, set) or user not found"}
 
     return {"success": False, "error": "User not found"}
 
-@api_app.get("/get-cards/{set_id}/")
-async def get_cards(request: Request, response: Response, set_id: int):
+@api_app.get("/get-cards/{set_id}/", responses=documented(CardsEnvelope))
+async def get_cards(
+        request: Request,
+        response: Response,
+        set_id: int,
+        limit: Optional[int] = Query(None, ge=1, le=5000, description="Page size, all cards of the set if omitted"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+        stream: bool = Query(False, description="Stream all cards (after cursor) as NDJSON, one card per line"),
+    ):
     user = request.state.user
     response.status_code = 400
 
     if user:
-        try:
-            cards = await sync_to_async(list)(Card.objects.filter(set__user=user, set__id=set_id))
-            response.status_code = 200
-            return {"success": True, "cards": [await sync_to_async(CardSerializer.serialize_card)(card) for card in cards]}
-        except Exception as e:
-            print('Get cards error:', e)
-            return {"success": False, "error": "Error getting cards, user not found"}
+        cards_query = Card.objects.filter(set__user=user, set__id=set_id).order_by('id')
+        if cursor:
+            # Keyset pagination on Card.id (primary key index)
+            try:
+                last_id, = decode_cursor(cursor, 1)
+                cards_query = cards_query.filter(id__gt=int(last_id))
+            except (ValueError, TypeError):
+                return {"success": False, "error": "Invalid cursor"}
+
+        if stream:
+            if not await Set.objects.filter(id=set_id, user=user).aexists():
+                return {"success": False, "error": "Set not found"}
+            return StreamingResponse(stream_cards_ndjson(cards_query), media_type="application/x-ndjson")
+
+        async def build():
+            try:
+                if limit is None:
+                    cards = await run_sync(CardSerializer.serialize_many, cards_query)
+                    return {"success": True, "cards": cards}
+
+                cards = await run_sync(CardSerializer.serialize_many, cards_query[:limit+1])
+                has_more = len(cards) > limit
+                if has_more:
+                    cards = cards[:limit]
+                return {"success": True,
+                        "cards": cards,
+                        "pagination": {
+                            "limit": limit,
+                            "count": len(cards),
+                            "has_more": has_more,
+                            "next_cursor": encode_cursor(cards[-1]["id"]) if has_more else None,
+                        }
+                }
+            except Exception as e:
+                logger.warning('Get cards error: %s', e)
+                return {"success": False, "error": "Error getting cards, user not found"}
+
+        result = await get_api_cache().get_or_build(
+            "cards", [user.pk, set_id, limit, cursor], [set_cards_scope(set_id)], build
+        )
+        return FastJSONResponse(result, status_code=200 if result["success"] else 400)
 
     return {"success": False, "error": "User not found"}
 
-@api_app.get("/get-card/{card_id}/")
+
+async def stream_cards_ndjson(cards_query):
+    """Iterates the cards server-side in chunks, memory use does not depend on the deck size."""
+    chunk_size = settings.CARDS_STREAM_CHUNK_SIZE
+    lines = []
+    async for row in cards_query.values(*CardSerializer.FIELDS).aiterator(chunk_size=chunk_size):
+        lines.append(dumps(CardSerializer.serialize_row(row)))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+@api_app.get("/get-card/{card_id}/", responses=documented(CardEnvelope))
 async def get_card(request: Request, response: Response, card_id: int):
     user = request.state.user
     response.status_code = 400
 
     if user:
-        try:            
-            card = await sync_to_async(Card.objects.get)(id=card_id, set__user=user)
-            response.status_code = 200
-            return {"success": True, "card": await sync_to_async(CardSerializer.serialize_card)(card)}
-        except Exception as e:
-            print('Get card error:', e)
-            return {"success": False, "error": "Error getting card, user not found or card not found"}
+        async def build():
+            try:
+                card = await Card.objects.aget(id=card_id, set__user=user)
+                return {"success": True, "card": CardSerializer.serialize_card(card)}
+            except Exception as e:
+                logger.warning('Get card error: %s', e)
+                return {"success": False, "error": "Error getting card, user not found or card not found"}
+
+        result = await get_api_cache().get_or_build("card", [user.pk, card_id], [user_cards_scope(user.pk)], build)
+        return FastJSONResponse(result, status_code=200 if result["success"] else 400)
 
     return {"success": False, "error": "User not found"}
 
 
-@api_app.post("/update-card/{card_id}/")
-async def update_card(request: Request, response: Response, card_id: int):
-    data = await request.json()
+@api_app.post("/update-card/{card_id}/", responses=documented(CardEnvelope))
+async def update_card(request: Request, response: Response, card_id: int, payload: CardUpdate):
     user = request.state.user
     response.status_code = 400
 
     if user:
         try:
-            card = await sync_to_async(Card.objects.get)(id=card_id, set__user=user)
-            card.term = data.get("term", card.term)
-            card.definition = data.get("definition", card.definition)
-            await sync_to_async(card.save)()
-            response.status_code = 200
-            return {"success": True, "card": await sync_to_async(CardSerializer.serialize_card)(card)}
+            card = await Card.objects.aget(id=card_id, set__user=user)
+            for field, value in payload.model_dump(exclude_unset=True).items():
+                setattr(card, field, value)
+            await card.asave()
+            await get_api_cache().invalidate(set_cards_scope(card.set_id), user_cards_scope(user.pk))
+            return FastJSONResponse({"success": True, "card": CardSerializer.serialize_card(card)})
         except Exception as e:
-            print('Update card error:', e)
+            logger.warning('Update card error: %s', e)
             return {"success": False, "error": "Error updating card, user not found or card not found"}
 
     return {"success": False, "error": "User not found"}
@@ -332,17 +487,517 @@ async def delete_card(request: Request, response: Response, card_id: int):
 
     if user:
         try:
-            card = await sync_to_async(Card.objects.get)(id=card_id, set__user=user)
-            await sync_to_async(card.delete)()
+            card = await Card.objects.aget(id=card_id, set__user=user)
+            await card.adelete()
+            await get_api_cache().invalidate(set_cards_scope(card.set_id), user_cards_scope(user.pk))
             response.status_code = 200
             return {"success": True, "message": "Card deleted successfully"}
         except Exception as e:
-            print('Delete card error:', e)
+            logger.warning('Delete card error: %s', e)
             return {"success": False, "error": "Error deleting card, user not found or card not found"}
 
     return {"success": False, "error": "User not found"}
 
 
+@api_app.post("/cards/bulk/")
+async def bulk_cards(request: Request, response: Response, payload: BulkCardsIn):
+    user = request.state.user
+    response.status_code = 400
+
+    operations = payload.operations
+    max_operations = settings.CARDS_BULK_MAX_OPERATIONS
+    if len(operations) > max_operations:
+        return {"success": False, "error": f"Too many operations, at most {max_operations} per request"}
+
+    if user:
+        try:
+            results = await run_sync(apply_card_operations, user, payload.set, operations)
+            await get_api_cache().invalidate(set_cards_scope(payload.set), user_cards_scope(user.pk))
+            return FastJSONResponse({"success": True, "results": results})
+        except Set.DoesNotExist:
+            return {"success": False, "error": "Set not found"}
+        except Exception as e:
+            logger.warning('Bulk cards error: %s', e)
+            return {"success": False, "error": "Error applying card operations"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/import/")
+async def import_deck_file(
+        request: Request,
+        response: Response,
+        format: Optional[str] = Query(None, description="csv, tsv or apkg, detected from filename/content if omitted"),
+        filename: Optional[str] = Query(None),
+        title: Optional[str] = Query(None, max_length=100),
+        description: Optional[str] = Query(None),
+        term_lang: Optional[str] = Query(None, max_length=50),
+        definition_lang: Optional[str] = Query(None, max_length=50),
+    ):
+    """Imports a deck sent as the raw request body. The upload is spooled to disk, never held in memory."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        max_bytes = settings.IMPORT_MAX_UPLOAD_BYTES
+        upload = tempfile.SpooledTemporaryFile(max_size=settings.IMPORT_SPOOL_MAX_MEMORY)
+        try:
+            size = 0
+            async for chunk in request.stream():
+                size += len(chunk)
+                if size > max_bytes:
+                    response.status_code = 413
+                    return {"success": False, "error": f"File is too large, at most {max_bytes} bytes"}
+                upload.write(chunk)
+            if not size:
+                return {"success": False, "error": "Empty file"}
+            upload.seek(0)
+            fmt = format or detect_format(filename, upload.read(2))
+            upload.seek(0)
+
+            def log_progress(cards, elapsed):
+                logger.info('Import for user %s: %s cards, %.0f cards/s', user.pk, cards, cards / elapsed if elapsed else 0)
+
+            # Long-running, kept on the default executor so it does not hold an API executor thread
+            card_set, stats = await sync_to_async(import_deck, thread_sensitive=False)(
+                user, upload, fmt, title=title, description=description, term_lang=term_lang,
+                definition_lang=definition_lang, batch_size=settings.IMPORT_BATCH_SIZE, progress=log_progress,
+            )
+            await get_api_cache().invalidate(sets_scope(user.pk))
+            response.status_code = 200
+            return {"success": True, "set": card_set, "import": stats}
+        except (DeckImportError, UnicodeDecodeError, csv.Error) as e:
+            return {"success": False, "error": f"Import failed: {e}"}
+        except Exception as e:
+            logger.exception('Import error')
+            return {"success": False, "error": "Error importing deck"}
+        finally:
+            upload.close()
+
+    return {"success": False, "error": "User not found"}
+
+
+# -------------------Review (spaced repetition)-----------------
+@api_app.get("/review/due/")
+async def get_due_cards(
+        request: Request,
+        response: Response,
+        limit: int = Query(20, ge=1, le=500, description="Maximum number of due cards to return"),
+        set: Optional[int] = Query(None, description="Only cards of this set"),
+    ):
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            rows = await run_sync(due_queue, user, limit, set_id=set)
+            return FastJSONResponse({"success": True, "due": [ProgressSerializer.serialize_due_row(row) for row in rows]})
+        except Exception as e:
+            logger.warning('Get due cards error: %s', e)
+            return {"success": False, "error": "Error getting due cards"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/review/answer/")
+async def review_answer(request: Request, response: Response, payload: ReviewAnswerIn):
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            progress = await run_sync(review_card, user, payload.card, payload.grade)
+            return FastJSONResponse({"success": True, "progress": ProgressSerializer.serialize_progress(progress)})
+        except Card.DoesNotExist:
+            return {"success": False, "error": "Card not found"}
+        except Exception as e:
+            logger.warning('Review answer error: %s', e)
+            return {"success": False, "error": "Error saving review answer"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/review/answers/")
+async def review_answers(request: Request, response: Response, payload: ReviewAnswersIn):
+    user = request.state.user
+    response.status_code = 400
+
+    answers = payload.answers
+    max_answers = settings.REVIEW_MAX_ANSWERS
+    if len(answers) > max_answers:
+        return {"success": False, "error": f"Too many answers, at most {max_answers} per request"}
+
+    if user:
+        try:
+            results = await run_sync(review_cards, user, answers)
+            return FastJSONResponse({"success": True, "results": results})
+        except Exception as e:
+            logger.warning('Review answers error: %s', e)
+            return {"success": False, "error": "Error saving review answers"}
+
+    return {"success": False, "error": "User not found"}
+
+
+# -------------------Search-----------------
+@api_app.get("/search/", responses=documented(SearchEnvelope))
+async def search(
+        request: Request,
+        response: Response,
+        q: str = Query(..., min_length=1, max_length=200, description="Words to find, all must match"),
+        lang: Optional[str] = Query(None, description="Language of the query (code or name), all languages if omitted"),
+        limit: int = Query(20, ge=1, le=100, description="Maximum number of results to return"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    ):
+    """Ranked full-text search over public sets (title, description) and their cards (term, definition)."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        after = None
+        if cursor:
+            # Keyset pagination on (rank desc, document id)
+            try:
+                rank, doc_id = decode_cursor(cursor, 2)
+                after = (float(rank), int(doc_id))
+            except (ValueError, TypeError):
+                return {"success": False, "error": "Invalid cursor"}
+        try:
+            results, next_key, has_more = await run_sync(search_public, q, lang, limit, after)
+            return FastJSONResponse({
+                "success": True,
+                "results": results,
+                "pagination": {
+                    "limit": limit,
+                    "count": len(results),
+                    "has_more": has_more,
+                    "next_cursor": encode_cursor(*next_key) if has_more else None,
+                },
+            })
+        except Exception as e:
+            logger.warning('Search error: %s', e)
+            return {"success": False, "error": "Error searching"}
+
+    return {"success": False, "error": "User not found"}
+
+
+# -------------------Quizzes-----------------
+@api_app.post("/quizzes/", responses=documented(QuizEnvelope))
+async def create_quiz(request: Request, response: Response, payload: QuizCreate):
+    """Generates a multiple-choice quiz over one of the user's sets or a public set."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            quiz = await run_sync(
+                generate_quiz, user, payload.set, payload.title, payload.questions, payload.options, payload.weighted
+            )
+            return FastJSONResponse({"success": True, "quiz": QuizSerializer.serialize_quiz(quiz)})
+        except Set.DoesNotExist:
+            return {"success": False, "error": "Set not found"}
+        except QuizError as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.warning('Create quiz error: %s', e)
+            return {"success": False, "error": "Error creating quiz"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/quizzes/{quiz_id}/results/", responses=documented(QuizResultEnvelope))
+async def submit_quiz_result(request: Request, response: Response, quiz_id: int, payload: QuizResultIn):
+    """
+    Scores the answers, saves the QuizResult and updates the quiz (and room) leaderboards.
+    Only the first result per quiz (and room) counts, the correct answers are not returned.
+    """
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            result, boards = await run_sync(submit_result, user, quiz_id, payload.answers, payload.room)
+            await record_points(boards)
+            return FastJSONResponse({
+                "success": True,
+                "result": QuizSerializer.serialize_result(result),
+            })
+        except Quiz.DoesNotExist:
+            return {"success": False, "error": "Quiz not found"}
+        except Room.DoesNotExist:
+            return {"success": False, "error": "Room not found"}
+        except QuizError as e:
+            return {"success": False, "error": str(e)}
+        except Exception as e:
+            logger.warning('Submit quiz result error: %s', e)
+            return {"success": False, "error": "Error saving quiz result"}
+
+    return {"success": False, "error": "User not found"}
+
+
+async def _leaderboard_response(user, kind, scope_id, limit):
+    try:
+        await run_sync(check_access, user, kind, scope_id)
+        return FastJSONResponse({"success": True, **await leaderboard(kind, scope_id, user, limit)})
+    except (Quiz.DoesNotExist, Room.DoesNotExist):
+        return {"success": False, "error": f"{kind.capitalize()} not found"}
+    except Exception as e:
+        logger.warning('Leaderboard error: %s', e)
+        return {"success": False, "error": "Error getting leaderboard"}
+
+
+@api_app.get("/quizzes/{quiz_id}/leaderboard/", responses=documented(LeaderboardEnvelope))
+async def quiz_leaderboard(
+        request: Request,
+        response: Response,
+        quiz_id: int,
+        limit: int = Query(10, ge=1, le=100, description="Number of top users to return"),
+    ):
+    """Best score per user."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        return await _leaderboard_response(user, "quiz", quiz_id, limit)
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.get("/rooms/{room_id}/leaderboard/", responses=documented(LeaderboardEnvelope))
+async def room_leaderboard(
+        request: Request,
+        response: Response,
+        room_id: int,
+        limit: int = Query(10, ge=1, le=100, description="Number of top members to return"),
+    ):
+    """Sum of the scores of the results submitted in the room, per member."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        return await _leaderboard_response(user, "room", room_id, limit)
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.websocket("/rooms/{room_id}/ws/")
+async def room_socket(websocket: WebSocket, room_id: int, token: Optional[str] = None):
+    """
+    Live quiz of a room (services.room_services). The HTTP auth middleware does not see WebSockets:
+    the token (?token=token_id:secret, browsers can not set headers) is checked once per connection.
+    """
+    user = await aget_user_by_token(token) if _is_token_pair(token) else None
+    engine = get_room_engine()
+    try:
+        if user is None:
+            raise Room.DoesNotExist
+        host_id = await engine.authorize(user, room_id)
+    except Room.DoesNotExist:
+        await websocket.close(code=CLOSE_FORBIDDEN)
+        return
+
+    await websocket.accept()
+    state, connection = engine.join(room_id, host_id, user, websocket.send_text, websocket.close)
+    try:
+        while True:
+            await engine.handle(state, connection, await websocket.receive_text())
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.warning('Room socket error: %s', e)
+    finally:
+        engine.leave(state, connection)
+        await connection.close()
+
+
+# -------------------Notifications-----------------
+@api_app.get("/notifications/", responses=documented(NotificationsEnvelope))
+async def get_notifications(
+        request: Request,
+        response: Response,
+        unread_only: bool = Query(False),
+        limit: int = Query(50, ge=1, le=500, description="Maximum number of notifications to return"),
+        cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    ):
+    """Newest first, with the cached unread count."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        query = Notification.objects.filter(user=user).order_by('-id')
+        if unread_only:
+            query = query.filter(is_read=False)
+        if cursor:
+            # Keyset pagination on Notification.id
+            try:
+                last_id, = decode_cursor(cursor, 1)
+                query = query.filter(id__lt=int(last_id))
+            except (ValueError, TypeError):
+                return {"success": False, "error": "Invalid cursor"}
+        try:
+            notifications = [
+                NotificationSerializer.serialize_notification(notification)
+                async for notification in query[:limit+1]
+            ]
+            has_more = len(notifications) > limit
+            notifications = notifications[:limit]
+            return FastJSONResponse({
+                "success": True,
+                "notifications": notifications,
+                "unread": await get_unread_counter().get(user.pk),
+                "pagination": {
+                    "limit": limit,
+                    "count": len(notifications),
+                    "has_more": has_more,
+                    "next_cursor": encode_cursor(notifications[-1]["id"]) if has_more else None,
+                },
+            })
+        except Exception as e:
+            logger.warning('Get notifications error: %s', e)
+            return {"success": False, "error": "Error getting notifications"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.get("/notifications/unread/")
+async def get_unread_count(request: Request, response: Response):
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            return FastJSONResponse({"success": True, "unread": await get_unread_counter().get(user.pk)})
+        except Exception as e:
+            logger.warning('Unread count error: %s', e)
+            return {"success": False, "error": "Error getting unread count"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/notifications/read/")
+async def read_notifications(request: Request, response: Response, payload: NotificationsReadIn):
+    """Marks the given (or all) unread notifications of the user read with one UPDATE."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            changed, unread = await read(user.pk, payload.ids)
+            return FastJSONResponse({"success": True, "updated": changed, "unread": unread})
+        except Exception as e:
+            logger.warning('Read notifications error: %s', e)
+            return {"success": False, "error": "Error marking notifications read"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.post("/notifications/send/")
+async def send_notification(request: Request, response: Response, payload: NotificationSendIn):
+    """Notifies the members of a room the user belongs to and/or the user's friends."""
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        if payload.room is None and not payload.friends:
+            return {"success": False, "error": "room or friends is required"}
+        try:
+            recipients = set()
+            if payload.room is not None:
+                if not await run_sync(is_room_member, user, payload.room):
+                    return {"success": False, "error": "Room not found"}
+                recipients |= await run_sync(room_member_ids, payload.room)
+            if payload.friends:
+                recipients |= await run_sync(friend_ids, user.pk)
+            recipients.discard(user.pk)
+            sent = await notify(recipients, payload.message) if recipients else 0
+            return FastJSONResponse({"success": True, "sent": sent})
+        except Exception as e:
+            logger.warning('Send notification error: %s', e)
+            return {"success": False, "error": "Error sending notification"}
+
+    return {"success": False, "error": "User not found"}
+
+
+@api_app.get("/notifications/stream/")
+async def notification_stream(request: Request, token: Optional[str] = None):
+    """
+    Server-Sent Events: 'unread' and 'notification' events pushed as they happen, no polling.
+    The token comes from the Authorization header or ?token= (EventSource can not set headers)
+    and is checked once per connection; Last-Event-ID resumes after the last received notification.
+    """
+    auth_header = request.headers.get("Authorization", "")
+    if auth_header.startswith("Token "):
+        token = auth_header.split(" ", 1)[1]
+    user = await aget_user_by_token(token) if _is_token_pair(token) else None
+    if user is None:
+        return JSONResponse({"success": False, "error": "Invalid token"}, status_code=401)
+
+    last_event_id = request.headers.get("Last-Event-ID")
+    last_event_id = int(last_event_id) if last_event_id and last_event_id.isdigit() else None
+    return StreamingResponse(
+        event_stream(user.pk, last_event_id, settings.NOTIFICATIONS_KEEPALIVE_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# -------------------Delta sync-----------------
+@api_app.get("/sync/")
+async def sync(
+        request: Request,
+        response: Response,
+        since_token: Optional[str] = Query(None, description="next_token of the previous sync, full sync if omitted"),
+        limit: int = Query(1000, ge=1, le=5000, description="Maximum number of changes to return"),
+    ):
+    user = request.state.user
+    response.status_code = 400
+
+    if user:
+        try:
+            since_id = 0
+            if since_token:
+                try:
+                    since_id, = decode_cursor(since_token, 1)
+                    since_id = int(since_id)
+                except (ValueError, TypeError):
+                    return {"success": False, "error": "Invalid sync token"}
+
+            changes = await run_sync(changes_since, user, since_id, limit)
+            changes["next_token"] = encode_cursor(changes["next_token"])
+            return FastJSONResponse({"success": True, **changes})
+        except Exception as e:
+            logger.warning('Sync error: %s', e)
+            return {"success": False, "error": "Error getting changes"}
+
+    return {"success": False, "error": "User not found"}
+
+
+def _staff_only(request: Request):
+    """403 response for non-staff users, process internals (cache, pool) are not for API clients."""
+    user = getattr(request.state, "user", None)
+    if user is None or not user.is_staff:
+        return JSONResponse({"success": False, "error": "Forbidden"}, status_code=403)
+    return None
+
+
+@api_app.get("/cache/stats/")
+async def cache_stats(request: Request):
+    forbidden = _staff_only(request)
+    if forbidden is not None:
+        return forbidden
+    return {"success": True, "cache": get_api_cache().stats()}
+
 
+@api_app.get("/metrics/", response_class=PlainTextResponse)
+async def metrics(request: Request):
+    """Prometheus text format, only for METRICS_ALLOWED_HOSTS (scraper on the same host)."""
+    if request.client is None or not is_metrics_client(request.client.host):
+        return PlainTextResponse("Forbidden\n", status_code=403)
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
 
 
+@api_app.get("/db/pool/")
+async def db_pool_stats(request: Request):
+    forbidden = _staff_only(request)
+    if forbidden is not None:
+        return forbidden
+    return {"success": True, "database": pool_stats()}
@@ -0,0 +1,16 @@
+from fastapi.responses import JSONResponse
+
+from services.json_services import dumps
+from services.metrics_services import timed
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with services.json_services (orjson when installed).
+    Returned directly from an endpoint it also skips FastAPI's jsonable_encoder walk,
+    serializer dicts may contain datetimes as is.
+    """
+
+    def render(self, content) -> bytes:
+        with timed('serialization'):
+            return dumps(content)
@@ -0,0 +1,283 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+# -------------------Request models-----------------
+# Validated once by pydantic-core before the endpoint runs. Unknown keys are ignored like before
+# the models existed (clients send e.g. "remember" or the set's "id"), model_dump() only returns
+# the declared fields, so nothing else reaches Model.objects.create(**data)
+
+class RequestModel(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+
+class LoginIn(RequestModel):
+    email: str = Field(max_length=254)
+    password: str
+
+
+class RegisterIn(RequestModel):
+    email: str = Field(max_length=254)
+    password: str
+    name: Optional[str] = Field(None, max_length=255)
+
+
+class SetCreate(RequestModel):
+    title: str = Field(max_length=100)
+    description: Optional[str] = None
+    term_lang: Optional[str] = Field(None, max_length=50)
+    definition_lang: Optional[str] = Field(None, max_length=50)
+    is_public: bool = False
+
+
+class SetUpdate(RequestModel):
+    # Omitted fields keep their value, title and is_public can not be set to null
+    title: str = Field(None, max_length=100)
+    description: Optional[str] = None
+    is_public: bool = None
+
+
+class CardCreate(RequestModel):
+    set: int
+    term: str
+    definition: str
+    image_url: Optional[str] = Field(None, max_length=200)
+    audio_url: Optional[str] = Field(None, max_length=200)
+
+
+class CardUpdate(RequestModel):
+    term: str = None
+    definition: str = None
+
+
+class BulkCardsIn(RequestModel):
+    set: int
+    # Items are checked one by one in services.card_services, a bad item fails only itself
+    operations: List[Dict[str, Any]] = Field(min_length=1)
+
+
+class QuizCreate(RequestModel):
+    set: int
+    title: Optional[str] = Field(None, max_length=100)
+    questions: int = Field(20, ge=1, le=500)
+    options: int = Field(4, ge=2, le=8)
+    weighted: bool = False  # distractors drawn mostly from cards with a low LearningProgress.level
+
+
+class QuizResultIn(RequestModel):
+    answers: List[Optional[int]] = Field(min_length=1)  # chosen option position per question, null if skipped
+    room: Optional[int] = None
+
+
+class NotificationSendIn(RequestModel):
+    message: str = Field(min_length=1, max_length=1000)
+    room: Optional[int] = None  # all members of this room
+    friends: bool = False  # all accepted friends
+
+
+class NotificationsReadIn(RequestModel):
+    ids: Optional[List[int]] = Field(None, max_length=1000)  # all unread notifications if omitted
+
+
+class ReviewAnswerIn(RequestModel):
+    card: int
+    grade: int = Field(ge=0, le=5)
+
+
+class ReviewAnswersIn(RequestModel):
+    # Items are checked one by one in services.review_services, a bad item fails only itself
+    answers: List[Dict[str, Any]] = Field(min_length=1)
+
+
+# -------------------Response structs-----------------
+# Mirror anki_quiz.serializers, the endpoints return the encoded dicts directly (FastJSONResponse),
+# these types only document the responses
+
+@dataclass(slots=True)
+class UserOut:
+    id: int
+    email: str
+    name: Optional[str]
+    last_login: Optional[datetime]
+    token_expires: datetime
+
+
+@dataclass(slots=True)
+class SetOut:
+    id: int
+    title: str
+    description: Optional[str]
+    term_lang: Optional[str]
+    definition_lang: Optional[str]
+    created_at: datetime
+    is_public: bool
+    user: UserOut
+
+
+@dataclass(slots=True)
+class CardOut:
+    id: int
+    term: str
+    definition: str
+    set: int
+    image_url: Optional[str]
+    audio_url: Optional[str]
+
+
+@dataclass(slots=True)
+class PublicSetOut:
+    id: int
+    title: str
+    description: Optional[str]
+    term_lang: Optional[str]
+    definition_lang: Optional[str]
+    created_at: datetime
+    is_public: bool
+    owner: Optional[str]
+
+
+@dataclass(slots=True)
+class SearchHit:
+    rank: float
+    set: PublicSetOut
+    card: Optional[CardOut]  # None for a match in the set title/description
+
+
+@dataclass(slots=True)
+class QuizOptionOut:
+    card: int
+    definition: str
+
+
+@dataclass(slots=True)
+class QuizQuestionOut:
+    card: int
+    term: str
+    options: List[QuizOptionOut]
+
+
+@dataclass(slots=True)
+class QuizOut:
+    id: int
+    set: int
+    title: str
+    created_at: datetime
+    questions: List[QuizQuestionOut]
+
+
+@dataclass(slots=True)
+class QuizResultOut:
+    id: int
+    quiz: int
+    room: Optional[int]
+    score: int
+    total: int
+    completed_at: datetime
+
+
+@dataclass(slots=True)
+class LeaderUserOut:
+    id: int
+    name: Optional[str]
+
+
+@dataclass(slots=True)
+class LeaderOut:
+    rank: int
+    user: LeaderUserOut
+    points: int
+
+
+@dataclass(slots=True)
+class MyRankOut:
+    rank: int
+    points: int
+
+
+@dataclass(slots=True)
+class NotificationOut:
+    id: int
+    message: str
+    is_read: bool
+    created_at: datetime
+
+
+@dataclass(slots=True)
+class Pagination:
+    limit: int
+    count: int
+    has_more: bool
+    next_cursor: Optional[str]
+    skip: Optional[int] = None
+
+
+class ErrorOut(BaseModel):
+    success: bool = False
+    error: str
+
+
+class AuthOut(BaseModel):
+    success: bool
+    token: str
+    user: UserOut
+    expires: datetime
+
+
+class SetEnvelope(BaseModel):
+    success: bool
+    set: SetOut
+
+
+class SetsEnvelope(BaseModel):
+    success: bool
+    sets: List[SetOut]
+    pagination: Pagination
+
+
+class CardEnvelope(BaseModel):
+    success: bool
+    card: CardOut
+
+
+class CardsEnvelope(BaseModel):
+    success: bool
+    cards: List[CardOut]
+    pagination: Optional[Pagination] = None
+
+
+class SearchEnvelope(BaseModel):
+    success: bool
+    results: List[SearchHit]
+    pagination: Pagination
+
+
+class QuizEnvelope(BaseModel):
+    success: bool
+    quiz: QuizOut
+
+
+class QuizResultEnvelope(BaseModel):
+    success: bool
+    result: QuizResultOut
+
+
+class LeaderboardEnvelope(BaseModel):
+    success: bool
+    leaders: List[LeaderOut]
+    me: Optional[MyRankOut]
+    count: int
+
+
+class NotificationsEnvelope(BaseModel):
+    success: bool
+    notifications: List[NotificationOut]
+    unread: int
+    pagination: Pagination
+
+
+def documented(model):
+    """responses= argument of a route: success model plus the common error envelope."""
+    return {200: {'model': model}, 400: {'model': ErrorOut}}
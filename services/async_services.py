@@ -0,0 +1,68 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+class SyncExecutor:
+    """
+    Sized thread pool for the sync code the async views still need (multi-query services,
+    transactions, bulk writes). Unlike sync_to_async's default thread_sensitive=True, which funnels
+    every call through one shared thread, calls run in parallel on up to `workers` threads.
+    Each thread holds its own DB connection (persistent with CONN_MAX_AGE, borrowed from the pool
+    with DATABASE_POOL), so workers should stay below the DB connection limit.
+    With workers=0 calls fall back to thread_sensitive=True (the previous behaviour, for comparison).
+    """
+
+    def __init__(self, workers=8):
+        self.workers = workers
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None and self.workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='api-sync')
+        return self._executor
+
+    async def run(self, func, *args, **kwargs):
+        executor = self._get_executor()
+        if executor is None:
+            return await sync_to_async(func)(*args, **kwargs)
+        return await sync_to_async(_with_connection_cleanup(func), thread_sensitive=False, executor=executor)(
+            *args, **kwargs
+        )
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def _with_connection_cleanup(func):
+    # Pool threads live outside Django's request cycle, so the end of every call is handled
+    # like request_finished: broken or expired (CONN_MAX_AGE) connections are closed,
+    # with DATABASE_POOL the connection goes back to the pool
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for conn in connections.all(initialized_only=True):
+                conn.close_if_unusable_or_obsolete()
+    return wrapper
+
+
+_sync_executor = None
+
+
+def get_sync_executor():
+    global _sync_executor
+    if _sync_executor is None:
+        from django.conf import settings
+        _sync_executor = SyncExecutor(workers=getattr(settings, 'API_SYNC_WORKERS', 8))
+    return _sync_executor
+
+
+async def run_sync(func, *args, **kwargs):
+    """Runs a blocking function (ORM queries included) in the sized API executor."""
+    return await get_sync_executor().run(func, *args, **kwargs)
@@ -1,7 +1,13 @@
 import re
+import copy
+import time
 import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
 from django.http import JsonResponse
-from asgiref.sync import sync_to_async
+from services.async_services import run_sync
+from django.utils import timezone
 
 def is_valid_email(email: str) -> bool:
     # Расширенное регулярное выражение, приближённое к RFC 5322
@@ -48,4 +54,178 @@ def check_auth(view_func):
             return JsonResponse({'error': 'Authentication required'}, status=401)
         response = view_func(request, *args, **kwargs)
         return await response if asyncio.iscoroutine(response) else response
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+# generate_token() issues secrets.token_hex(32)
+LEGACY_TOKEN_PATTERN = re.compile(r'[0-9a-f]{64}')
+
+
+def split_token(token: str):
+    """Splits "token_id:secret". Legacy tokens (generate_token) have no token_id."""
+    token_id, sep, secret = token.partition(':')
+    if not sep:
+        return None, token
+    return token_id, secret
+
+
+def get_user_by_token(token: str):
+    """
+    Returns (user, token) for a valid token or (None, None).
+    New tokens are found by the indexed token_id and verified with a single hash check.
+    Legacy tokens are migrated to the token_id scheme on first use, the returned
+    token is the one the client should send from now on. Clients that keep sending the
+    raw legacy token are still accepted until it expires or the user logs in again.
+    """
+    from django.conf import settings
+    from django.db.models import Q
+    from anki_quiz.hashers import get_token_hasher
+    from anki_quiz.models import LEGACY_TOKEN_ID_PREFIX, CustomUser, legacy_token_id
+
+    hasher = get_token_hasher()
+    token_id, secret = split_token(token)
+    if not secret:
+        return None, None
+
+    if token_id is not None:
+        user = CustomUser.objects.filter(token_id=token_id).first()
+        if user and hasher.verify(secret, user.token):
+            _upgrade_token_hash(user, secret)
+            return user, token
+        return None, None
+
+    if not getattr(settings, 'LEGACY_TOKEN_AUTH', True) or not LEGACY_TOKEN_PATTERN.fullmatch(secret):
+        return None, None
+
+    # Migrated legacy tokens: the token_id is derived from the token, one indexed lookup
+    user = CustomUser.objects.filter(token_id=legacy_token_id(secret), token_expires__gt=timezone.now()).first()
+    if user and hasher.verify(secret, user.token):
+        _upgrade_token_hash(user, secret)
+        return user, f"{user.token_id}:{secret}"
+
+    # Migration path: unexpired tokens issued before token_id existed (not yet migrated, or migrated
+    # with a random LEGACY_TOKEN_ID_PREFIX id) are scanned, at most LEGACY_TOKEN_SCAN_LIMIT hash checks
+    # per request, most recently logged in users first. The set shrinks as tokens expire and users log in
+    legacy_users = CustomUser.objects.filter(
+        Q(token_id__isnull=True) | Q(token_id__startswith=LEGACY_TOKEN_ID_PREFIX),
+        token_expires__gt=timezone.now(),
+    ).exclude(token__isnull=True).exclude(token__exact='').order_by('-last_login')
+    for user in legacy_users[:getattr(settings, 'LEGACY_TOKEN_SCAN_LIMIT', 50)]:
+        if hasher.verify(secret, user.token):
+            token_id = user.token_id or user.migrate_legacy_token(secret)
+            _upgrade_token_hash(user, secret)
+            return user, f"{token_id}:{secret}"
+    return None, None
+
+
+def _upgrade_token_hash(user, secret):
+    """Re-stores a PBKDF2 token hash as an HMAC digest so later checks take the fast path."""
+    from anki_quiz.hashers import get_token_hasher
+
+    hasher = get_token_hasher()
+    if hasher.must_update(user.token):
+        user.token = hasher.encode(secret)
+        user.save(update_fields=['token'])
+
+
+class VerifiedTokenCache:
+    """
+    Bounded in-process LRU of recently verified tokens.
+    Keys are SHA-256 digests of the raw token, so plaintext tokens are never kept in memory.
+    An entry lives until the TTL or the token expiry, whichever comes first, and is dropped
+    as soon as the owner's token/token_expires change (see anki_quiz.signals).
+    Other worker processes only see the change after the TTL, keep it short.
+    """
+
+    def __init__(self, max_entries=10_000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (user, expires_at)
+        self._keys_by_user = {}  # user_id -> set of keys
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token):
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            user, expires_at = entry
+            if expires_at <= time.time():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+        # Copy so that a view changing request.user does not change the cached instance
+        return copy.copy(user)
+
+    def set(self, token, user):
+        if self.max_entries <= 0:
+            return
+        key = self._key(token)
+        expires_at = min(time.time() + self.ttl, user.token_expires.timestamp())
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (copy.copy(user), expires_at)
+            self._keys_by_user.setdefault(user.pk, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def refresh_user(self, user):
+        """Drops cached tokens of the user whose token or token_expires no longer match."""
+        with self._lock:
+            for key in list(self._keys_by_user.get(user.pk, ())):
+                cached, _ = self._entries[key]
+                if cached.token != user.token or cached.token_expires != user.token_expires:
+                    self._discard(key)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for key in list(self._keys_by_user.get(user_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_user.clear()
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        user_id = entry[0].pk
+        keys = self._keys_by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[user_id]
+
+
+_token_cache = None
+
+
+def get_token_cache():
+    global _token_cache
+    if _token_cache is None:
+        from django.conf import settings
+        _token_cache = VerifiedTokenCache(
+            max_entries=getattr(settings, 'TOKEN_CACHE_MAX_ENTRIES', 10_000),
+            ttl=getattr(settings, 'TOKEN_CACHE_TTL', 60),
+        )
+    return _token_cache
+
+
+async def aget_user_by_token(token: str):
+    """Returns the owner of a valid unexpired token, repeat requests are served from the cache without hashing."""
+    cache = get_token_cache()
+    user = cache.get(token)
+    if user is not None:
+        return user
+
+    user, _ = await run_sync(get_user_by_token, token)
+    if user is None or not user.is_token_valid():
+        return None
+    cache.set(token, user)
+    return user
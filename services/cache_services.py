@@ -0,0 +1,389 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from services.json_services import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+
+class CacheBackendError(Exception):
+    pass
+
+
+class SortedSet:
+    """
+    Members ordered by score, highest first (ties by member), kept in a list with bisect:
+    score and rank (count_above) lookups are O(log n), an update moves one entry.
+    """
+
+    def __init__(self):
+        self._keys = []  # (-score, member), ascending
+        self._scores = {}
+
+    def __len__(self):
+        return len(self._scores)
+
+    def add(self, member, score, gt=False):
+        old = self._scores.get(member)
+        if old is not None:
+            if gt and score <= old:
+                return
+            del self._keys[bisect_left(self._keys, (-old, member))]
+        self._scores[member] = score
+        insort(self._keys, (-score, member))
+
+    def score(self, member):
+        return self._scores.get(member)
+
+    def count_above(self, score):
+        """Number of members with a higher score."""
+        return bisect_left(self._keys, (-score, ''))
+
+    def range(self, start, stop):
+        """Members ranked start..stop (inclusive, like ZREVRANGE) as (member, score)."""
+        return [(member, -score) for score, member in self._keys[start:stop + 1]]
+
+
+class LocMemCache:
+    """In-process LRU with TTL. Each worker process has its own copy, use RedisCache with several workers."""
+
+    def __init__(self, max_entries=10_000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._sorted_sets = OrderedDict()  # key -> SortedSet, LRU as well
+        self._lock = threading.Lock()
+
+    async def get_many(self, keys):
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] is not None and entry[1] <= now:
+                    del self._entries[key]
+                    entry = None
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                values.append(entry[0] if entry is not None else None)
+        return values
+
+    async def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sorted_sets.clear()
+
+    async def incr_existing(self, key, amount):
+        """Adds `amount` to an integer value and returns it, None (and no new key) if the key is missing."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry[1] is not None and entry[1] <= now):
+                return None
+            value = int(entry[0]) + amount
+            self._entries[key] = (str(value).encode(), entry[1])
+            return value
+
+    async def incr_existing_many(self, amounts):
+        """incr_existing for every key -> amount of the dict, returns the values in the same order."""
+        return [await self.incr_existing(key, amount) for key, amount in amounts.items()]
+
+    # Sorted sets, mirroring the Redis commands used by RedisCache (members are strings)
+    def _sorted_set(self, key, create=False):
+        sorted_set = self._sorted_sets.get(key)
+        if sorted_set is None and create:
+            sorted_set = self._sorted_sets[key] = SortedSet()
+            while len(self._sorted_sets) > self.max_entries:
+                self._sorted_sets.popitem(last=False)
+        if sorted_set is not None:
+            self._sorted_sets.move_to_end(key)
+        return sorted_set
+
+    async def zadd(self, key, mapping, gt=False):
+        with self._lock:
+            sorted_set = self._sorted_set(key, create=True)
+            for member, score in mapping.items():
+                sorted_set.add(str(member), float(score), gt=gt)
+
+    async def zcard(self, key):
+        with self._lock:
+            sorted_set = self._sorted_set(key)
+            return len(sorted_set) if sorted_set is not None else 0
+
+    async def zscore(self, key, member):
+        with self._lock:
+            sorted_set = self._sorted_set(key)
+            return sorted_set.score(str(member)) if sorted_set is not None else None
+
+    async def zcount_above(self, key, score):
+        with self._lock:
+            sorted_set = self._sorted_set(key)
+            return sorted_set.count_above(score) if sorted_set is not None else 0
+
+    async def zrevrange(self, key, start, stop):
+        with self._lock:
+            sorted_set = self._sorted_set(key)
+            return sorted_set.range(start, stop) if sorted_set is not None else []
+
+
+class RedisCache:
+    """
+    Minimal client for the Redis protocol (RESP2): GET/MGET/SET EX, the sorted set commands used by
+    the leaderboards and a conditional INCRBY (unread counters) over one asyncio connection.
+    Works with Redis, Valkey, KeyDB or any local stand-in speaking the same protocol.
+    url: redis://[:password@]host[:port][/db]
+    """
+
+    def __init__(self, url, timeout=1.0):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout
+        self._reader = self._writer = None
+        self._loop = None
+        # One request/reply in flight on the connection, (re)connecting included
+        self._lock = asyncio.Lock()
+
+    async def _connect(self):
+        """Opens the connection if needed, called with self._lock held."""
+        loop = asyncio.get_running_loop()
+        if self._writer is not None and self._loop is loop and not self._reader.at_eof():
+            return
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._loop = loop
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        if self.password:
+            await self._send('AUTH', self.password)
+        if self.db:
+            await self._send('SELECT', self.db)
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    async def _read_reply(self):
+        line = await self._reader.readline()
+        if not line.endswith(b'\r\n'):
+            raise CacheBackendError('Connection closed')
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload
+        if prefix == b'-':
+            raise CacheBackendError(payload.decode(errors='replace'))
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            return (await self._reader.readexactly(length + 2))[:-2]
+        if prefix == b'*':
+            length = int(payload)
+            return None if length < 0 else [await self._read_reply() for _ in range(length)]
+        raise CacheBackendError(f'Unexpected reply {line[:20]!r}')
+
+    async def _send(self, *args):
+        self._writer.write(self._encode(args))
+        await self._writer.drain()
+        return await asyncio.wait_for(self._read_reply(), self.timeout)
+
+    async def _command(self, *args):
+        async with self._lock:
+            try:
+                await self._connect()
+                return await self._send(*args)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, CacheBackendError):
+                # The stream may be out of sync, reconnect on the next command
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+                raise
+
+    async def get_many(self, keys):
+        return await self._command('MGET', *keys)
+
+    async def set(self, key, value, ttl=None):
+        if ttl:
+            await self._command('SET', key, value, 'EX', int(ttl))
+        else:
+            await self._command('SET', key, value)
+
+    async def clear(self):
+        await self._command('FLUSHDB')
+
+    # INCRBY would create a missing key from 0, a counter must be loaded before it is maintained
+    INCR_EXISTING = "if redis.call('EXISTS', KEYS[1]) == 1 then return redis.call('INCRBY', KEYS[1], ARGV[1]) end"
+
+    async def incr_existing(self, key, amount):
+        return await self._command('EVAL', self.INCR_EXISTING, 1, key, amount)
+
+    # Missing keys give false, i.e. a nil reply
+    INCR_EXISTING_MANY = (
+        "local values = {} for i, key in ipairs(KEYS) do "
+        "if redis.call('EXISTS', key) == 1 then values[i] = redis.call('INCRBY', key, ARGV[i]) "
+        "else values[i] = false end end return values"
+    )
+
+    async def incr_existing_many(self, amounts):
+        """incr_existing for every key -> amount of the dict in one round-trip."""
+        if not amounts:
+            return []
+        return await self._command('EVAL', self.INCR_EXISTING_MANY, len(amounts), *amounts, *amounts.values())
+
+    async def zadd(self, key, mapping, gt=False):
+        # GT needs Redis 6.2+
+        args = [value for member, score in mapping.items() for value in (score, member)]
+        await self._command('ZADD', key, *(['GT'] if gt else []), *args)
+
+    async def zcard(self, key):
+        return await self._command('ZCARD', key)
+
+    async def zscore(self, key, member):
+        score = await self._command('ZSCORE', key, member)
+        return float(score) if score is not None else None
+
+    async def zcount_above(self, key, score):
+        return await self._command('ZCOUNT', key, f'({score}', '+inf')
+
+    async def zrevrange(self, key, start, stop):
+        reply = await self._command('ZREVRANGE', key, start, stop, 'WITHSCORES')
+        return [(reply[i].decode(), float(reply[i + 1])) for i in range(0, len(reply), 2)]
+
+
+class ApiCache:
+    """
+    Read-through cache of API responses with versioned invalidation.
+    Every entry is keyed by the current versions of the scopes it depends on
+    (e.g. "sets:<user>", "cards:<set>"), bumping a scope makes all its entries unreachable,
+    they expire by TTL. A missing version (evicted, restarted) gets a fresh random-ish value,
+    so old entries can never be served again.
+    Backend errors are logged and treated as misses, the backend is then skipped for retry_after seconds.
+    """
+
+    def __init__(self, backend, ttl=300, prefix='anki', retry_after=5):
+        self.backend = backend
+        self.ttl = ttl
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._retry_at = 0
+
+    def available(self):
+        return time.monotonic() >= self._retry_at
+
+    def failed(self, error):
+        self.errors += 1
+        self._retry_at = time.monotonic() + self.retry_after
+        logger.warning('Cache backend error: %s', error)
+
+    def _version_key(self, scope):
+        return f'{self.prefix}:v:{scope}'
+
+    async def _versions(self, scopes):
+        keys = [self._version_key(scope) for scope in scopes]
+        versions = await self.backend.get_many(keys)
+        for index, version in enumerate(versions):
+            if version is None:
+                version = str(time.time_ns()).encode()
+                await self.backend.set(keys[index], version)
+                versions[index] = version
+        return [v.decode() if isinstance(v, bytes) else str(v) for v in versions]
+
+    async def get_or_build(self, name, parts, scopes, build):
+        """Returns the cached value of `await build()` (a JSON-serializable dict)."""
+        if not self.available():
+            return await build()
+        try:
+            versions = await self._versions(scopes)
+            key = ':'.join([self.prefix, name, *map(str, parts), *versions])
+            cached, = await self.backend.get_many([key])
+        except Exception as e:
+            self.failed(e)
+            return await build()
+
+        if cached is not None:
+            self.hits += 1
+            return loads(cached)
+
+        self.misses += 1
+        value = await build()
+        if value.get('success', True):
+            try:
+                await self.backend.set(key, dumps(value), self.ttl)
+            except Exception as e:
+                self.failed(e)
+        return value
+
+    async def invalidate(self, *scopes):
+        for scope in scopes:
+            try:
+                await self.backend.set(self._version_key(scope), str(time.time_ns()).encode())
+            except Exception as e:
+                # Entries of this scope may stay reachable until their TTL
+                self.failed(e)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': self.hits,
+            'misses': self.misses,
+            'errors': self.errors,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+        }
+
+
+_api_cache = None
+
+
+def get_api_cache():
+    global _api_cache
+    if _api_cache is None:
+        from django.conf import settings
+        backend_name = getattr(settings, 'API_CACHE_BACKEND', 'locmem')
+        if backend_name == 'redis':
+            backend = RedisCache(settings.API_CACHE_URL)
+        elif backend_name == 'locmem':
+            backend = LocMemCache(max_entries=getattr(settings, 'API_CACHE_MAX_ENTRIES', 10_000))
+        else:
+            raise ValueError(f'Unknown API_CACHE_BACKEND {backend_name!r}, expected locmem or redis')
+        _api_cache = ApiCache(backend, ttl=getattr(settings, 'API_CACHE_TTL', 300))
+    return _api_cache
+
+
+# Cache scopes, see ApiCache
+def sets_scope(user_id):
+    return f'sets:{user_id}'
+
+
+def set_cards_scope(set_id):
+    return f'cards:{set_id}'
+
+
+def user_cards_scope(user_id):
+    return f'user-cards:{user_id}'
@@ -0,0 +1,111 @@
+from django.db import transaction
+from anki_quiz.models import Card, Set
+from anki_quiz.serializers import CardSerializer
+from services.search_services import index_cards
+from services.sync_services import record_changes
+
+
+CARD_FIELDS = ('term', 'definition', 'image_url', 'audio_url')
+
+
+def _validate_fields(data, required=()):
+    fields = {field: data[field] for field in CARD_FIELDS if field in data}
+    for field in required:
+        if not fields.get(field):
+            return None, f'{field} is required'
+    for field, value in fields.items():
+        if value is not None and not isinstance(value, str):
+            return None, f'{field} must be a string'
+        if value is None and field in ('term', 'definition'):
+            return None, f'{field} can not be null'
+    return fields, None
+
+
+def apply_card_operations(user, set_id, operations, batch_size=500):
+    """
+    Applies a batch of card operations to one set of the user in a single transaction:
+    [{"op": "create", "term": ..., "definition": ...}, {"op": "update", "id": 1, "term": ...}, {"op": "delete", "id": 2}]
+    Creates and updates go through bulk_create/bulk_update, deletes through one DELETE ... IN.
+    Returns per-item results in the order of the operations. Raises Set.DoesNotExist.
+    An update of a card the same batch deletes fails, whatever the order of the two.
+    """
+    card_set = Set.objects.get(id=set_id, user=user)
+    results = [None] * len(operations)
+    creates = []  # (index, Card)
+    updates = {}  # card_id -> [(index, fields)]
+    deletes = {}  # card_id -> index, a repeated delete of the same card is rejected
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict):
+            results[index] = {'index': index, 'success': False, 'error': 'Operation must be an object'}
+            continue
+        op = operation.get('op')
+        card_id = operation.get('id')
+        if op == 'create':
+            fields, error = _validate_fields(operation, required=('term', 'definition'))
+            if error is None:
+                creates.append((index, Card(set=card_set, **fields)))
+        elif op in ('update', 'delete'):
+            if not isinstance(card_id, int) or isinstance(card_id, bool):
+                error = 'id is required'
+            elif op == 'update':
+                fields, error = _validate_fields(operation)
+                if error is None:
+                    updates.setdefault(card_id, []).append((index, fields))
+            elif card_id in deletes:
+                error = 'Card is already deleted in this batch'
+            else:
+                error = None
+                deletes[card_id] = index
+        else:
+            error = 'op must be one of create, update, delete'
+        if error is not None:
+            results[index] = {'index': index, 'op': op, 'success': False, 'error': error}
+
+    with transaction.atomic():
+        existing = Card.objects.filter(set=card_set).in_bulk(list(updates) + list(deletes))
+
+        changed_cards, changed_fields = [], set()
+        for card_id, items in updates.items():
+            card = existing.get(card_id)
+            for index, fields in items:
+                if card is None:
+                    results[index] = {'index': index, 'op': 'update', 'success': False, 'error': 'Card not found'}
+                    continue
+                if card_id in deletes:
+                    results[index] = {
+                        'index': index, 'op': 'update', 'success': False, 'error': 'Card is deleted in this batch'
+                    }
+                    continue
+                for field, value in fields.items():
+                    setattr(card, field, value)
+                changed_fields.update(fields)
+                results[index] = {'index': index, 'op': 'update', 'success': True, 'card': card}
+            if card is not None and card_id not in deletes:
+                changed_cards.append(card)
+        if changed_cards and changed_fields:
+            Card.objects.bulk_update(changed_cards, list(changed_fields), batch_size=batch_size)
+            record_changes(user.pk, 'card', [card.pk for card in changed_cards])
+
+        found_deletes = [card_id for card_id in deletes if card_id in existing]
+        if found_deletes:
+            Card.objects.filter(set=card_set, id__in=found_deletes).delete()
+        for card_id, index in deletes.items():
+            if card_id in existing:
+                results[index] = {'index': index, 'op': 'delete', 'success': True, 'id': card_id}
+            else:
+                results[index] = {'index': index, 'op': 'delete', 'success': False, 'error': 'Card not found'}
+
+        created = Card.objects.bulk_create([card for _, card in creates], batch_size=batch_size)
+        for (index, _), card in zip(creates, created):
+            results[index] = {'index': index, 'op': 'create', 'success': True, 'card': card}
+        record_changes(user.pk, 'card', [card.pk for card in created])
+        # bulk_create/bulk_update send no post_save, the search index is updated here
+        if card_set.is_public and (changed_cards or created):
+            index_cards(card_set, changed_cards + created)
+
+        # Still in the transaction: an error here rolls the batch back instead of hiding a committed one
+        for result in results:
+            if 'card' in result:
+                result['card'] = CardSerializer.serialize_card(result['card'])
+    return results
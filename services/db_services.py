@@ -0,0 +1,35 @@
+import threading
+
+from django.db import connections
+
+
+class ConnectionStats:
+    """Counts new DB connections (connection_created signal), a pool or persistent connections keep it flat."""
+
+    def __init__(self):
+        self.opened = 0
+        self._lock = threading.Lock()
+
+    def record_opened(self):
+        with self._lock:
+            self.opened += 1
+
+
+connection_stats = ConnectionStats()
+
+
+def pool_stats(alias='default'):
+    """
+    Connection settings and counters of a database alias. With DATABASE_POOL enabled the psycopg pool
+    counters are included (pool_size, pool_available, requests_waiting, requests_wait_ms, ...,
+    see psycopg_pool.ConnectionPool.get_stats).
+    """
+    connection = connections[alias]
+    pool = getattr(connection, 'pool', None)  # postgresql backend only
+    return {
+        'vendor': connection.vendor,
+        'conn_max_age': connection.settings_dict['CONN_MAX_AGE'],
+        'conn_health_checks': connection.settings_dict['CONN_HEALTH_CHECKS'],
+        'connections_opened': connection_stats.opened,
+        'pool': pool.get_stats() if pool is not None else None,
+    }
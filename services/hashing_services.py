@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+class HashingPoolSaturated(Exception):
+    """Raised when too many hashing jobs are queued, callers answer 503 with Retry-After."""
+
+    def __init__(self, retry_after):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+def _init_worker():
+    # Worker processes are spawned, Django has to be set up again in each of them
+    import django
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'canellus.settings')
+    django.setup()
+
+
+def _check_password(password, encoded):
+    from django.contrib.auth.hashers import check_password
+    return check_password(password, encoded)
+
+
+def _verify_password(password, encoded):
+    """Returns (valid, must_update), must_update mirrors django.contrib.auth.hashers.check_password."""
+    from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher
+    if not check_password(password, encoded):
+        return False, False
+    preferred = get_hasher('default')
+    hasher = identify_hasher(encoded)
+    return True, hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def _make_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
+
+
+class PasswordHashingPool:
+    """
+    Runs password KDF work (PBKDF2) in a bounded pool of worker processes,
+    so login/register storms do not block the event loop or the default thread executor.
+    At most max_pending jobs may be queued or running, beyond that HashingPoolSaturated is raised.
+    With workers=0 the jobs run in a single background thread (development, tests).
+    """
+
+    def __init__(self, workers=2, max_pending=16, retry_after=1):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self._pending = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def _get_executor(self):
+        if self._executor is None:
+            if self.workers > 0:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_init_worker,
+                )
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hashing')
+        return self._executor
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingPoolSaturated(self.retry_after)
+            self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    async def check_password(self, password, encoded):
+        if password is None or not encoded:
+            return False
+        return await self._submit(_check_password, password, encoded)
+
+    async def verify_password(self, password, encoded):
+        if password is None or not encoded:
+            return False, False
+        return await self._submit(_verify_password, password, encoded)
+
+    async def make_password(self, password):
+        return await self._submit(_make_password, password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_hashing_pool = None
+
+
+def get_hashing_pool():
+    global _hashing_pool
+    if _hashing_pool is None:
+        from django.conf import settings
+        _hashing_pool = PasswordHashingPool(
+            workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 2),
+            max_pending=getattr(settings, 'PASSWORD_HASHING_MAX_PENDING', 16),
+            retry_after=getattr(settings, 'PASSWORD_HASHING_RETRY_AFTER', 1),
+        )
+    return _hashing_pool
+
+
+async def acheck_user_password(user, password):
+    """
+    Checks the user's password in the hashing pool. Hashes made with an outdated hasher
+    or iteration count are re-hashed with the current settings after a successful check,
+    so stored hashes migrate gradually on login.
+    """
+    pool = get_hashing_pool()
+    valid, must_update = await pool.verify_password(password, user.password)
+    if valid and must_update:
+        try:
+            user.password = await pool.make_password(password)
+        except HashingPoolSaturated:
+            # Not critical, the hash is upgraded on one of the next logins
+            return valid
+        await user.asave(update_fields=['password'])
+    return valid
@@ -0,0 +1,232 @@
+import csv
+import html
+import io
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+import zipfile
+
+from django.conf import settings
+from django.db import transaction
+from anki_quiz.models import Card, Set
+from anki_quiz.serializers import SetSerializer
+from services.sync_services import record_changes
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ('csv', 'tsv', 'apkg')
+COLUMNS = ('term', 'definition', 'image_url', 'audio_url')
+URL_MAX_LENGTH = Card._meta.get_field('image_url').max_length
+
+IMG_RE = re.compile(r'<img[^>]+src="([^"]+)"[^>]*>', re.IGNORECASE)
+SOUND_RE = re.compile(r'\[sound:([^\]]+)\]')
+BR_RE = re.compile(r'<br\s*/?>|</div>|</p>', re.IGNORECASE)
+TAG_RE = re.compile(r'<[^>]+>')
+
+
+class DeckImportError(Exception):
+    pass
+
+
+def detect_format(filename=None, head=b''):
+    if head.startswith(b'PK'):
+        return 'apkg'
+    extension = os.path.splitext(filename or '')[1].lower().lstrip('.')
+    if extension in ('tsv', 'txt'):
+        return 'tsv'
+    return 'csv'
+
+
+def _url(value):
+    value = (value or '').strip()
+    if value.startswith(('http://', 'https://')) and len(value) <= URL_MAX_LENGTH:
+        return value
+    return None
+
+
+def iter_delimited_rows(fileobj, delimiter=','):
+    """
+    Reads term/definition rows one line at a time from a binary file.
+    A header row naming the columns (term, definition, image_url, audio_url) is optional,
+    without it the columns are taken in that order.
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text, delimiter=delimiter)
+    columns = COLUMNS
+    for line_number, row in enumerate(reader):
+        if line_number == 0 and {'term', 'definition'} <= {cell.strip().lower() for cell in row}:
+            columns = tuple(cell.strip().lower() for cell in row)
+            continue
+        if not any(cell.strip() for cell in row):
+            continue
+        values = dict(zip(columns, row))
+        yield {
+            'term': values.get('term', '').strip(),
+            'definition': values.get('definition', '').strip(),
+            'image_url': _url(values.get('image_url')),
+            'audio_url': _url(values.get('audio_url')),
+        }
+    text.detach()
+
+
+def _clean_anki_field(value):
+    """Anki fields are HTML with [sound:...] markers, returns (text, image_url, audio_url)."""
+    image = IMG_RE.search(value)
+    sound = SOUND_RE.search(value)
+    value = SOUND_RE.sub('', IMG_RE.sub('', value))
+    value = TAG_RE.sub('', BR_RE.sub('\n', value))
+    text = html.unescape(value).replace('\xa0', ' ').strip()
+    return text, _url(image.group(1)) if image else None, _url(sound.group(1)) if sound else None
+
+
+def read_apkg_deck_name(collection):
+    try:
+        (decks,) = collection.execute('SELECT decks FROM col').fetchone()
+        names = [deck['name'] for deck in json.loads(decks).values() if deck.get('name') != 'Default']
+        return names[0] if names else None
+    except (sqlite3.Error, TypeError, ValueError, KeyError):
+        return None
+
+
+def apkg_version(package):
+    """
+    Package version from the `meta` entry of Anki 2.1.50+ exports (protobuf PackageMetadata, field 1):
+    1 and 2 are the legacy SQLite collections, 3 the zstd compressed collection.anki21b. None without meta.
+    """
+    try:
+        with package.open('meta') as source:
+            data = source.read(16)
+    except KeyError:
+        return None
+    if len(data) >= 2 and data[0] == 0x08:
+        return data[1]
+    return 0
+
+
+def _copy_limited(source, target, max_bytes, chunk_size=1024 * 1024):
+    """Copies at most max_bytes, the size in the zip header is not trusted (zip bombs)."""
+    copied = 0
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return copied
+        copied += len(chunk)
+        if copied > max_bytes:
+            raise DeckImportError(f'The .apkg collection is too large, at most {max_bytes} bytes')
+        target.write(chunk)
+
+
+def iter_apkg_rows(fileobj, fetch_size=1000, meta=None, max_collection_bytes=None):
+    """
+    Reads notes of an Anki .apkg (zip with a SQLite collection). The collection is copied
+    to a temporary file in chunks (SQLite needs a real file, at most max_collection_bytes)
+    and notes are fetched in batches. The first note field is the term, the second the definition.
+    """
+    if max_collection_bytes is None:
+        max_collection_bytes = getattr(settings, 'IMPORT_MAX_COLLECTION_BYTES', 1024 * 1024 * 1024)
+    try:
+        package = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise DeckImportError('Not a valid .apkg file') from e
+    names = set(package.namelist())
+    # New exports keep the notes in collection.anki21b (zstd), collection.anki2 is only a stub
+    # with an "update Anki" note, importing it would silently give a wrong deck
+    if 'collection.anki21b' in names or (apkg_version(package) or 0) >= 3:
+        raise DeckImportError('Unsupported .apkg format of Anki 2.1.50+, export with "Support older Anki versions"')
+    name = next((n for n in ('collection.anki21', 'collection.anki2') if n in names), None)
+    if name is None:
+        raise DeckImportError('Unsupported .apkg: no collection.anki2/anki21 (export with "Support older Anki versions")')
+    if package.getinfo(name).file_size > max_collection_bytes:
+        raise DeckImportError(f'The .apkg collection is too large, at most {max_collection_bytes} bytes')
+
+    with tempfile.NamedTemporaryFile(suffix='.anki2') as collection_file:
+        with package.open(name) as source:
+            _copy_limited(source, collection_file, max_collection_bytes)
+        collection_file.flush()
+
+        collection = sqlite3.connect(collection_file.name)
+        try:
+            if meta is not None:
+                meta['deck_name'] = read_apkg_deck_name(collection)
+            cursor = collection.execute('SELECT flds FROM notes ORDER BY id')
+            while True:
+                notes = cursor.fetchmany(fetch_size)
+                if not notes:
+                    break
+                for (fields,) in notes:
+                    fields = fields.split('\x1f')
+                    term, term_image, term_audio = _clean_anki_field(fields[0])
+                    definition, image, audio = _clean_anki_field(fields[1] if len(fields) > 1 else '')
+                    yield {
+                        'term': term,
+                        'definition': definition,
+                        'image_url': image or term_image,
+                        'audio_url': audio or term_audio,
+                    }
+        finally:
+            collection.close()
+
+
+def import_deck(user, fileobj, fmt, title=None, description=None, term_lang=None, definition_lang=None,
+                batch_size=1000, progress=None):
+    """
+    Creates a Set from a CSV/TSV/.apkg file and inserts its cards with bulk_create batches,
+    all in one transaction. `progress(imported_cards, elapsed_seconds)` is called after each batch.
+    Returns the created set and import statistics.
+    """
+    if fmt not in FORMATS:
+        raise DeckImportError(f'Unknown format {fmt!r}, expected one of {", ".join(FORMATS)}')
+
+    meta = {}
+    if fmt == 'apkg':
+        rows = iter_apkg_rows(fileobj, meta=meta)
+    else:
+        rows = iter_delimited_rows(fileobj, delimiter='\t' if fmt == 'tsv' else ',')
+
+    started = time.perf_counter()
+    imported = skipped = batches = 0
+    with transaction.atomic():
+        card_set = Set(user=user, title='', description=description, term_lang=term_lang,
+                       definition_lang=definition_lang)
+        batch = []
+        for row in rows:
+            if not card_set.pk:
+                # The .apkg deck name is known only once the collection is opened
+                card_set.title = (title or meta.get('deck_name') or 'Imported deck')[:100]
+                card_set.save()
+            if not row['term'] or not row['definition']:
+                skipped += 1
+                continue
+            batch.append(Card(set=card_set, **row))
+            if len(batch) >= batch_size:
+                Card.objects.bulk_create(batch)
+                record_changes(user.pk, 'card', [card.pk for card in batch])
+                imported += len(batch)
+                batches += 1
+                batch = []
+                if progress:
+                    progress(imported, time.perf_counter() - started)
+        if batch:
+            Card.objects.bulk_create(batch)
+            record_changes(user.pk, 'card', [card.pk for card in batch])
+            imported += len(batch)
+            batches += 1
+            if progress:
+                progress(imported, time.perf_counter() - started)
+        if not card_set.pk:
+            raise DeckImportError('The file contains no cards')
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        'cards': imported,
+        'skipped': skipped,
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'cards_per_second': round(imported / elapsed) if elapsed else imported,
+    }
+    logger.info('Imported %s cards into set %s in %.2fs', imported, card_set.pk, elapsed)
+    return SetSerializer.serialize_set(card_set), stats
@@ -0,0 +1,40 @@
+import datetime
+import decimal
+import json
+import uuid
+
+from django.utils.functional import Promise
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the stdlib encoder produces the same output
+    orjson = None
+
+
+def _default(obj):
+    if isinstance(obj, (datetime.datetime, datetime.date, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (decimal.Decimal, uuid.UUID, Promise)):
+        return str(obj)
+    if hasattr(obj, 'tolist'):  # numpy scalars and arrays from the review scheduler
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    BACKEND = 'orjson'
+    _OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+    def dumps(value) -> bytes:
+        """Encodes serializer output (datetimes included) to UTF-8 JSON bytes."""
+        return orjson.dumps(value, default=_default, option=_OPTIONS)
+
+    loads = orjson.loads
+else:
+    BACKEND = 'json'
+
+    def dumps(value) -> bytes:
+        """Encodes serializer output (datetimes included) to UTF-8 JSON bytes."""
+        return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+    loads = json.loads
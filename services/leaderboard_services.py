@@ -0,0 +1,179 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from anki_quiz.models import CustomUser, LeaderboardEntry, Quiz, QuizResult, Room, RoomMember
+from services.async_services import run_sync
+from services.cache_services import get_api_cache
+from services.quiz_services import QuizError
+
+# A board is ('quiz', quiz_id) or ('room', room_id). Only the first result of a user counts: per quiz on a
+# quiz board, per quiz and room on a room board (the sum over the quizzes played there). Resubmitting can not
+# raise a score, and points only grow, so every write to the sorted set is a ZADD GT and loads and updates
+# can interleave in any order.
+# The member LOADED marks a set rebuilt from LeaderboardEntry, a set without it is (re)loaded.
+LOADED = '-'
+
+
+def _scope(kind, scope_id):
+    return {'quiz_id': scope_id} if kind == 'quiz' else {'room_id': scope_id}
+
+
+def _key(cache, kind, scope_id):
+    return f'{cache.prefix}:lb:{kind}:{scope_id}'
+
+
+def is_room_member(user, room_id):
+    return (RoomMember.objects.filter(room_obj_id=room_id, user=user).exists()
+            or Room.objects.filter(id=room_id, creator=user).exists())
+
+
+def check_access(user, kind, scope_id):
+    """Quiz boards: the quiz author, public sets and anyone who took it; room boards: members. Raises DoesNotExist."""
+    if kind == 'room':
+        if not is_room_member(user, scope_id):
+            raise Room.DoesNotExist
+        return
+    visible = Quiz.objects.filter(
+        Q(user=user) | Q(set__is_public=True) | Q(leaderboard__user=user), id=scope_id
+    )
+    if not visible.exists():
+        raise Quiz.DoesNotExist
+
+
+def _add_points(kind, scope_id, quiz_id, scores):
+    """
+    Adds the scores {user_id: score} of quiz_id to one board, returns {user_id: points}.
+    Users with an earlier QuizResult of the quiz (in this room for a room board) are left unchanged.
+    Missing rows are inserted first with ON CONFLICT DO NOTHING (the unique constraints are partial,
+    an upsert can not name them), then locked: concurrent results of a user wait for each other,
+    so the earlier result check sees the committed one.
+    """
+    scope = _scope(kind, scope_id)
+    LeaderboardEntry.objects.bulk_create(
+        [LeaderboardEntry(user_id=user_id, **scope) for user_id in scores], ignore_conflicts=True
+    )
+    entries = list(LeaderboardEntry.objects.select_for_update().filter(user_id__in=list(scores), **scope))
+    earlier = QuizResult.objects.filter(quiz_id=quiz_id, user_id__in=list(scores))
+    if kind == 'room':
+        earlier = earlier.filter(room_id=scope_id)
+    earlier = set(earlier.values_list('user_id', flat=True))
+    counted = [entry for entry in entries if entry.user_id not in earlier]
+    now = timezone.now()
+    for entry in counted:
+        entry.points += scores[entry.user_id]
+        entry.attempts += 1
+        entry.updated_at = now
+    LeaderboardEntry.objects.bulk_update(counted, ['points', 'attempts', 'updated_at'])
+    return {entry.user_id: entry.points for entry in entries}
+
+
+def save_results(quiz, scores, room_id=None):
+    """
+    Saves one QuizResult per {user_id: score} with a single bulk_create and updates the boards in the
+    same transaction (before the new results exist, see _add_points).
+    Returns the results and [(kind, scope_id, {user_id: points})] for record_points.
+    """
+    with transaction.atomic():
+        boards = [('quiz', quiz.id, _add_points('quiz', quiz.id, quiz.id, scores))]
+        if room_id is not None:
+            boards.append(('room', room_id, _add_points('room', room_id, quiz.id, scores)))
+        results = QuizResult.objects.bulk_create([
+            QuizResult(quiz=quiz, user_id=user_id, room_id=room_id, score=score, total=len(quiz.questions))
+            for user_id, score in scores.items()
+        ])
+    return results, boards
+
+
+def score_answers(quiz, answers):
+    questions = quiz.questions
+    if len(answers) != len(questions):
+        raise QuizError(f'Expected {len(questions)} answers')
+    return sum(answer == question['answer'] for answer, question in zip(answers, questions))
+
+
+def submit_result(user, quiz_id, answers, room_id=None):
+    """
+    Scores `answers` (chosen option position per question, None for skipped) against the stored quiz
+    and saves the result (save_results). Returns the result and the boards for record_points.
+    Raises Quiz.DoesNotExist, Room.DoesNotExist and QuizError.
+    """
+    quiz = Quiz.objects.select_related('set').get(id=quiz_id)
+    if room_id is not None:
+        if not is_room_member(user, room_id):
+            raise Room.DoesNotExist
+    elif quiz.user_id != user.pk and not quiz.set.is_public:
+        raise Quiz.DoesNotExist
+    results, boards = save_results(quiz, {user.pk: score_answers(quiz, answers)}, room_id)
+    return results[0], boards
+
+
+async def record_points(boards):
+    """Applies the new points of save_results to the cached sorted sets (after the commit)."""
+    cache = get_api_cache()
+    if not cache.available():
+        return
+    try:
+        for kind, scope_id, points in boards:
+            await cache.backend.zadd(_key(cache, kind, scope_id), points, gt=True)
+    except Exception as e:
+        # The set keeps the old points until it is evicted and reloaded
+        cache.failed(e)
+
+
+def _entries(kind, scope_id):
+    return list(LeaderboardEntry.objects.filter(**_scope(kind, scope_id)).values_list('user_id', 'points'))
+
+
+def _from_database(kind, scope_id, user_id, limit):
+    entries = LeaderboardEntry.objects.filter(**_scope(kind, scope_id))
+    top = list(entries.order_by('-points', 'user_id').values_list('user_id', 'points')[:limit])
+    mine = entries.filter(user_id=user_id).values_list('points', flat=True).first()
+    rank = entries.filter(points__gt=mine).count() + 1 if mine is not None else None
+    return top, mine, rank, entries.count()
+
+
+async def _from_cache(cache, kind, scope_id, user_id, limit):
+    key = _key(cache, kind, scope_id)
+    backend = cache.backend
+    if await backend.zscore(key, LOADED) is None:
+        entries = await run_sync(_entries, kind, scope_id)
+        await backend.zadd(key, {**dict(entries), LOADED: -1}, gt=True)
+    top = [(int(member), score) for member, score in await backend.zrevrange(key, 0, limit) if member != LOADED]
+    mine = await backend.zscore(key, user_id)
+    rank = await backend.zcount_above(key, mine) + 1 if mine is not None else None
+    return top[:limit], mine, rank, await backend.zcard(key) - 1
+
+
+def _names(user_ids):
+    return dict(CustomUser.objects.filter(id__in=user_ids).values_list('id', 'name'))
+
+
+async def leaderboard(kind, scope_id, user, limit=10):
+    """
+    Top `limit` users of a board and the rank of `user` (1 + users with more points, ties share a rank).
+    Served from the sorted set in the API cache backend, from LeaderboardEntry if the backend fails.
+    """
+    cache = get_api_cache()
+    loaded = None
+    if cache.available():
+        try:
+            loaded = await _from_cache(cache, kind, scope_id, user.pk, limit)
+        except Exception as e:
+            cache.failed(e)
+    if loaded is None:
+        loaded = await run_sync(_from_database, kind, scope_id, user.pk, limit)
+    top, mine, rank, count = loaded
+
+    names = await run_sync(_names, [user_id for user_id, _ in top])
+    leaders = []
+    for position, (user_id, points) in enumerate(top):
+        if not leaders or points != leaders[-1]['points']:
+            leader_rank = position + 1
+        leaders.append({'rank': leader_rank, 'user': {'id': user_id, 'name': names.get(user_id)},
+                        'points': int(points)})
+    return {
+        'leaders': leaders,
+        'me': {'rank': rank, 'points': int(mine)} if mine is not None else None,
+        'count': count,
+    }
@@ -0,0 +1,185 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RequestMetrics:
+    """
+    Timings of the request being handled, reachable from any code running for it through a ContextVar.
+    sync_to_async copies the context into its thread, so DB time of executor calls is attributed too.
+    """
+
+    __slots__ = ('start', 'auth', 'db', 'db_queries', 'serialization', '_lock')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.auth = 0.0
+        self.db = 0.0
+        self.db_queries = 0
+        self.serialization = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + seconds)
+
+    def add_query(self, seconds):
+        with self._lock:
+            self.db_queries += 1
+            self.db += seconds
+
+
+_current = ContextVar('request_metrics', default=None)
+
+
+def start_request():
+    """Starts collecting for the current request, returns the token for finish_request."""
+    return _current.set(RequestMetrics())
+
+
+def current_request():
+    return _current.get()
+
+
+@contextmanager
+def timed(name):
+    """Adds the duration of the block to the 'auth' or 'serialization' time of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - start)
+
+
+def db_execute_wrapper(execute, sql, params, many, context):
+    """connection.execute_wrappers entry counting queries and DB time of the current request."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def install_db_wrapper(connection):
+    # connection_created is sent on every (re)connect of the same wrapper object
+    if db_execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(db_execute_wrapper)
+
+
+class MetricsRegistry:
+    """
+    In-process aggregates per (stack, method, route, status), exported in the Prometheus text format.
+    Each worker process has its own registry.
+    """
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, wall, metrics):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = {
+                    'count': 0, 'wall': 0.0, 'auth': 0.0, 'db': 0.0, 'db_queries': 0, 'serialization': 0.0,
+                    'buckets': [0] * len(self.buckets),
+                }
+            series['count'] += 1
+            series['wall'] += wall
+            series['auth'] += metrics.auth
+            series['db'] += metrics.db
+            series['db_queries'] += metrics.db_queries
+            series['serialization'] += metrics.serialization
+            for index, bound in enumerate(self.buckets):
+                if wall <= bound:
+                    series['buckets'][index] += 1
+
+    def render(self):
+        with self._lock:
+            series = {labels: {**values, 'buckets': list(values['buckets'])} for labels, values in self._series.items()}
+
+        lines = [
+            '# HELP http_request_duration_seconds Wall time of HTTP requests.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for labels, values in series.items():
+            label_text = _label_text(labels)
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'http_request_duration_seconds_bucket{{{label_text},le="+Inf"}} {values["count"]}')
+            lines.append(f'http_request_duration_seconds_sum{{{label_text}}} {values["wall"]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{label_text}}} {values["count"]}')
+
+        for name, key, help_text in (
+            ('http_request_auth_seconds_total', 'auth', 'Time spent authenticating requests.'),
+            ('http_request_db_seconds_total', 'db', 'Time spent executing SQL.'),
+            ('http_request_db_queries_total', 'db_queries', 'SQL statements executed.'),
+            ('http_request_serialization_seconds_total', 'serialization', 'Time spent encoding responses.'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, values in series.items():
+                value = values[key]
+                lines.append(f'{name}{{{_label_text(labels)}}} {value if key == "db_queries" else f"{value:.6f}"}')
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _label_text(labels):
+    stack, method, route, status = labels
+    route = route.replace('\\', '\\\\').replace('"', '\\"')
+    return f'stack="{stack}",method="{method}",route="{route}",status="{status}"'
+
+
+registry = MetricsRegistry()
+
+
+def finish_request(token, stack, method, route, status, path=None):
+    """Records the request in the registry and writes the slow-request log entry if needed."""
+    metrics = _current.get()
+    _current.reset(token)
+    if metrics is None:
+        return
+    wall = time.perf_counter() - metrics.start
+    registry.observe((stack, method, route, str(status)), wall, metrics)
+
+    from django.conf import settings
+    threshold = getattr(settings, 'SLOW_REQUEST_MS', 500)
+    if threshold is not None and wall * 1000 >= threshold:
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'stack': stack,
+            'method': method,
+            'route': route,
+            'path': path,
+            'status': status,
+            'wall_ms': round(wall * 1000, 2),
+            'auth_ms': round(metrics.auth * 1000, 2),
+            'db_ms': round(metrics.db * 1000, 2),
+            'db_queries': metrics.db_queries,
+            'serialization_ms': round(metrics.serialization * 1000, 2),
+        }))
+
+
+def is_metrics_client(host):
+    from django.conf import settings
+    return host in getattr(settings, 'METRICS_ALLOWED_HOSTS', ('127.0.0.1', '::1'))
@@ -0,0 +1,267 @@
+import asyncio
+from collections import defaultdict
+
+from django.db.models import Q
+
+from anki_quiz.models import Friend, Notification, Room, RoomMember
+from anki_quiz.serializers import NotificationSerializer
+from services.async_services import run_sync
+from services.cache_services import get_api_cache
+from services.json_services import dumps
+
+
+# -------------------Recipients-----------------
+def room_member_ids(room_id):
+    members = set(RoomMember.objects.filter(room_obj_id=room_id).values_list('user_id', flat=True))
+    members.update(Room.objects.filter(id=room_id).values_list('creator_id', flat=True))
+    return members
+
+
+def friend_ids(user_id):
+    """Accepted friends in either direction."""
+    rows = Friend.objects.filter(Q(user_id=user_id) | Q(friend_id=user_id), status='accepted')
+    return {friend if user == user_id else user for user, friend in rows.values_list('user_id', 'friend_id')}
+
+
+# -------------------Storage-----------------
+def create_notifications(user_ids, message):
+    """One bulk_create for all recipients (batches of 1000 rows)."""
+    return Notification.objects.bulk_create(
+        [Notification(user_id=user_id, message=message) for user_id in dict.fromkeys(user_ids)], batch_size=1000
+    )
+
+
+def count_unread(user_id):
+    # Served by notification_user_read_idx (user, is_read, created_at)
+    return Notification.objects.filter(user_id=user_id, is_read=False).count()
+
+
+def mark_read(user_id, ids=None):
+    """Marks the user's notifications `ids` (all when None) read with one UPDATE, returns the number changed."""
+    unread = Notification.objects.filter(user_id=user_id, is_read=False)
+    if ids is not None:
+        unread = unread.filter(id__in=ids)
+    return unread.update(is_read=True)
+
+
+def notifications_after(user_id, last_id, unread_only=False, limit=100):
+    query = Notification.objects.filter(user_id=user_id, id__gt=last_id)
+    if unread_only:
+        query = query.filter(is_read=False)
+    return list(query.order_by('id')[:limit])
+
+
+async def iter_notifications_after(user_id, last_id, unread_only=False, page_size=100):
+    """All notifications after last_id in id order, read in pages of page_size."""
+    while True:
+        page = await run_sync(notifications_after, user_id, last_id, unread_only, page_size)
+        for notification in page:
+            yield notification
+        if len(page) < page_size:
+            return
+        last_id = page[-1].id
+
+
+def latest_id(user_id):
+    return Notification.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+# -------------------Unread counters-----------------
+class UnreadCounter:
+    """
+    Unread notifications per user in the API cache backend. Loaded with one indexed COUNT and then
+    adjusted by every write (incr_existing), so reads never count rows. A counter missed by a write
+    (backend error, load racing a write) is corrected when it expires after `ttl` seconds.
+    """
+
+    def __init__(self, cache, ttl=300):
+        self.cache = cache
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f'{self.cache.prefix}:unread:{user_id}'
+
+    async def get(self, user_id):
+        cache = self.cache
+        if cache.available():
+            try:
+                value, = await cache.backend.get_many([self._key(user_id)])
+                if value is not None:
+                    return int(value)
+            except Exception as e:
+                cache.failed(e)
+        count = await run_sync(count_unread, user_id)
+        if cache.available():
+            try:
+                await cache.backend.set(self._key(user_id), str(count).encode(), self.ttl)
+            except Exception as e:
+                cache.failed(e)
+        return count
+
+    async def add(self, user_id, amount):
+        """New value, or None if the counter is not loaded (the next get counts)."""
+        if not amount or not self.cache.available():
+            return None
+        try:
+            return await self.cache.backend.incr_existing(self._key(user_id), amount)
+        except Exception as e:
+            self.cache.failed(e)
+            return None
+
+    async def add_many(self, amounts):
+        """add() for every user_id -> amount of the dict with one backend call, returns {user_id: value or None}."""
+        amounts = {user_id: amount for user_id, amount in amounts.items() if amount}
+        if not amounts or not self.cache.available():
+            return dict.fromkeys(amounts)
+        try:
+            values = await self.cache.backend.incr_existing_many(
+                {self._key(user_id): amount for user_id, amount in amounts.items()}
+            )
+        except Exception as e:
+            self.cache.failed(e)
+            return dict.fromkeys(amounts)
+        return dict(zip(amounts, values))
+
+
+_unread_counter = None
+
+
+def get_unread_counter():
+    global _unread_counter
+    if _unread_counter is None:
+        cache = get_api_cache()
+        _unread_counter = UnreadCounter(cache, ttl=cache.ttl)
+    return _unread_counter
+
+
+# -------------------Push-----------------
+class NotificationHub:
+    """
+    Open event streams per user in this worker process; publish() only queues, it never waits for a client.
+    A stream that falls queue_size events behind loses the overflow and catches up from the database.
+    """
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id, event, data):
+        for queue in self._subscribers.get(user_id, ()):
+            try:
+                queue.put_nowait((event, data))
+            except asyncio.QueueFull:
+                pass
+
+
+_hub = None
+
+
+def get_notification_hub():
+    global _hub
+    if _hub is None:
+        from django.conf import settings
+        _hub = NotificationHub(queue_size=getattr(settings, 'NOTIFICATIONS_QUEUE_SIZE', 100))
+    return _hub
+
+
+async def notify(user_ids, message):
+    """
+    Fan-out: stores one notification per recipient with a single bulk_create, then updates the
+    unread counters and pushes the notification to the recipients' open streams. Returns the count.
+    """
+    notifications = await run_sync(create_notifications, user_ids, message)
+    unread_counts = await get_unread_counter().add_many({notification.user_id: 1 for notification in notifications})
+    hub = get_notification_hub()
+    for notification in notifications:
+        unread = unread_counts[notification.user_id]
+        hub.publish(notification.user_id, 'notification', NotificationSerializer.serialize_notification(notification))
+        if unread is not None:
+            hub.publish(notification.user_id, 'unread', {'unread': unread})
+    return len(notifications)
+
+
+async def read(user_id, ids=None):
+    """Bulk mark-as-read, returns (number marked, unread count)."""
+    changed = await run_sync(mark_read, user_id, ids)
+    unread = await get_unread_counter().add(user_id, -changed)
+    if unread is None:
+        unread = await get_unread_counter().get(user_id)
+    if changed:
+        get_notification_hub().publish(user_id, 'unread', {'unread': unread})
+    return changed, unread
+
+
+# -------------------Server-Sent Events-----------------
+def format_event(event, data, event_id=None):
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: {dumps(data).decode()}\n\n'
+
+
+async def event_stream(user_id, last_event_id=None, keepalive=15):
+    """
+    text/event-stream of a user: the unread count, the notifications after last_event_id (reconnect),
+    then live 'notification' and 'unread' events from the hub. Every `keepalive` seconds without events a
+    comment keeps proxies from closing the connection, and if the unread counter changed meanwhile
+    (a write in another worker) the unread notifications after the last one read from the database are sent.
+    """
+    hub = get_notification_hub()
+    counter = get_unread_counter()
+    queue = hub.subscribe(user_id)
+    try:
+        # last_id: database position, every notification up to it was sent or skipped. Read before the
+        # unread count, so a notification counted there is always after it and reached by the catch-up.
+        # sent: ids sent after last_id, hub events and database reads overlap and may arrive out of id order
+        sent = set()
+        last_id = await run_sync(latest_id, user_id) if last_event_id is None else last_event_id
+        unread = await counter.get(user_id)
+        yield format_event('unread', {'unread': unread})
+        if last_event_id is not None:
+            async for notification in iter_notifications_after(user_id, last_id):
+                last_id = notification.id
+                sent.add(notification.id)
+                yield format_event('notification', NotificationSerializer.serialize_notification(notification),
+                                   notification.id)
+
+        while True:
+            try:
+                event, data = await asyncio.wait_for(queue.get(), keepalive)
+            except asyncio.TimeoutError:
+                current = await counter.get(user_id)
+                if current != unread:
+                    unread = current
+                    async for notification in iter_notifications_after(user_id, last_id, True):
+                        last_id = notification.id
+                        if notification.id not in sent:
+                            sent.add(notification.id)
+                            yield format_event('notification',
+                                               NotificationSerializer.serialize_notification(notification),
+                                               notification.id)
+                    yield format_event('unread', {'unread': unread})
+                yield ': keepalive\n\n'
+                continue
+
+            if event == 'notification':
+                if data['id'] in sent:
+                    continue
+                sent.add(data['id'])
+                if len(sent) > 10_000:
+                    last_id = max(last_id, max(sent))
+                    sent.clear()
+                yield format_event(event, data, data['id'])
+            else:
+                unread = data['unread']
+                yield format_event(event, data)
+    finally:
+        hub.unsubscribe(user_id, queue)
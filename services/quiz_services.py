@@ -0,0 +1,106 @@
+import numpy as np
+from django.db.models import Q
+
+from anki_quiz.models import Card, LearningProgress, Quiz, Set
+from services.review_services import MAX_LEVEL
+
+SAMPLE_ATTEMPTS = 8
+
+
+class QuizError(Exception):
+    pass
+
+
+def sample_distractors(codes, answers, count, weights, rng):
+    """
+    Picks `count` wrong options for every question at once: returns an (len(answers), count) array of
+    card indices whose definition codes differ from each other and from the answer's.
+    Rows are drawn together and only the rejected ones are redrawn; the few rows still failing
+    after SAMPLE_ATTEMPTS (tiny or very skewed decks) are sampled without replacement one by one.
+    """
+    result = np.empty((len(answers), count), dtype=np.int64)
+    pending = np.arange(len(answers))
+    for _ in range(SAMPLE_ATTEMPTS):
+        draws = rng.choice(len(codes), size=(len(pending), count), p=weights)
+        drawn_codes = codes[draws]
+        clashes = (drawn_codes == codes[answers[pending]][:, None]).any(axis=1)
+        clashes |= (np.diff(np.sort(drawn_codes, axis=1), axis=1) == 0).any(axis=1)
+        result[pending[~clashes]] = draws[~clashes]
+        pending = pending[clashes]
+        if not len(pending):
+            return result
+
+    # One card per distinct definition, so that the options never repeat a text
+    _, first = np.unique(codes, return_index=True)
+    for row in pending:
+        candidates = first[codes[first] != codes[answers[row]]]
+        p = None
+        if weights is not None:
+            p = weights[candidates] / weights[candidates].sum()
+        result[row] = rng.choice(candidates, size=count, replace=False, p=p)
+    return result
+
+
+def build_questions(card_ids, terms, definitions, levels=None, count=20, options=4, rng=None):
+    """
+    Multiple-choice questions (term -> definition) over the cards of one set, sampled with numpy.
+    `levels` (LearningProgress.level per card) weights the distractors toward cards the user knows
+    least, None samples uniformly. Returns the list stored in Quiz.questions.
+    """
+    rng = rng or np.random.default_rng()
+    index = {}
+    codes = np.fromiter((index.setdefault(text, len(index)) for text in definitions), dtype=np.int64,
+                        count=len(definitions))
+    options = min(options, len(index))
+    if options < 2:
+        raise QuizError('The set needs at least 2 cards with different definitions')
+
+    weights = None
+    if levels is not None:
+        weights = (MAX_LEVEL + 1 - np.clip(np.asarray(levels, dtype=np.float64), 0, MAX_LEVEL))
+        weights /= weights.sum()
+
+    answers = rng.choice(len(codes), size=min(count, len(codes)), replace=False)
+    choices = np.concatenate([answers[:, None], sample_distractors(codes, answers, options - 1, weights, rng)],
+                             axis=1)
+    # Shuffle each row, the answer (column 0) ends up where order == 0
+    order = np.argsort(rng.random(choices.shape), axis=1)
+    choices = np.take_along_axis(choices, order, axis=1)
+    positions = np.argmax(order == 0, axis=1)
+
+    return [
+        {
+            'card': card_ids[row[position]],
+            'term': terms[row[position]],
+            'options': [{'card': card_ids[i], 'definition': definitions[i]} for i in row],
+            'answer': position,
+        }
+        for row, position in zip(choices.tolist(), positions.tolist())
+    ]
+
+
+def generate_quiz(user, set_id, title=None, questions=20, options=4, weighted=False, rng=None):
+    """
+    Creates a Quiz over one of the user's sets or a public set. The cards (and the user's levels
+    for weighted distractors) are loaded with one query each, whatever the size of the deck.
+    Raises Set.DoesNotExist and QuizError.
+    """
+    card_set = Set.objects.filter(Q(user=user) | Q(is_public=True)).get(id=set_id)
+    rows = list(Card.objects.filter(set=card_set).order_by('id').values_list('id', 'term', 'definition'))
+    if not rows:
+        raise QuizError('The set has no cards')
+    card_ids, terms, definitions = zip(*rows)
+
+    levels = None
+    if weighted:
+        known = dict(
+            LearningProgress.objects.filter(user=user, card__set=card_set).values_list('card_id', 'level')
+        )
+        levels = [known.get(card_id, 0) for card_id in card_ids]
+
+    return Quiz.objects.create(
+        set=card_set,
+        user=user,
+        title=title or card_set.title,
+        questions=build_questions(card_ids, terms, definitions, levels, questions, options, rng),
+    )
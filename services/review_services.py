@@ -0,0 +1,205 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from anki_quiz.models import Card, LearningProgress
+from services.sync_services import record_changes
+
+
+MIN_EASE = 1.3
+MAX_LEVEL = 5
+GRADES = range(0, 6)  # SM-2 quality: 0-2 forgotten, 3 hard, 4 good, 5 easy
+PROGRESS_FIELDS = ('level', 'ease', 'interval', 'repetitions', 'due_at', 'last_reviewed')
+
+
+def sm2(grade, ease, interval, repetitions):
+    """
+    One SM-2 step. Returns (ease, interval in days, repetitions).
+    A failed answer (grade < 3) restarts the card with a one day interval and keeps the ease.
+    """
+    if grade < 3:
+        return ease, 1.0, 0
+    repetitions += 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = round(interval * ease, 2)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - grade) * (0.08 + (5 - grade) * 0.02))
+    return ease, interval, repetitions
+
+
+def sm2_batch(grades, eases, intervals, repetitions):
+    """sm2 over whole arrays at once, returns (eases, intervals, repetitions) arrays."""
+    grades = np.asarray(grades, dtype=np.int64)
+    eases = np.asarray(eases, dtype=np.float64)
+    intervals = np.asarray(intervals, dtype=np.float64)
+    repetitions = np.asarray(repetitions, dtype=np.int64)
+
+    passed = grades >= 3
+    new_repetitions = np.where(passed, repetitions + 1, 0)
+    new_intervals = np.where(
+        passed,
+        np.select([new_repetitions == 1, new_repetitions == 2], [1.0, 6.0], np.round(intervals * eases, 2)),
+        1.0,
+    )
+    penalty = 5 - grades
+    new_eases = np.where(passed, np.maximum(MIN_EASE, eases + 0.1 - penalty * (0.08 + penalty * 0.02)), eases)
+    return new_eases, new_intervals, new_repetitions
+
+
+def apply_review(progress, grade, reviewed_at):
+    """Updates the scheduler state of a LearningProgress row (not saved)."""
+    progress.ease, progress.interval, progress.repetitions = sm2(
+        grade, progress.ease, progress.interval, progress.repetitions
+    )
+    progress.level = min(MAX_LEVEL, progress.repetitions)
+    progress.last_reviewed = reviewed_at
+    progress.due_at = reviewed_at + timedelta(days=progress.interval)
+    return progress
+
+
+def accessible_cards(user):
+    """Cards the user may study: own sets and public sets."""
+    return Card.objects.filter(Q(set__user=user) | Q(set__is_public=True))
+
+
+def due_queue(user, limit, set_id=None, now=None):
+    """
+    Next `limit` due cards as .values() rows, oldest due first.
+    A single range scan over progress_user_due_idx, no date math in Python.
+    """
+    queue = LearningProgress.objects.filter(user=user, due_at__lte=now or timezone.now())
+    if set_id is not None:
+        queue = queue.filter(card__set_id=set_id)
+    return list(
+        queue.order_by('due_at').values(
+            'level', 'ease', 'interval', 'repetitions', 'due_at', 'last_reviewed',
+            'card_id', 'card__term', 'card__definition', 'card__set_id', 'card__image_url', 'card__audio_url',
+        )[:limit]
+    )
+
+
+def review_card(user, card_id, grade, reviewed_at=None):
+    """Records one answer. Raises Card.DoesNotExist for cards the user can not study."""
+    card = accessible_cards(user).get(id=card_id)
+    progress, _ = LearningProgress.objects.get_or_create(user=user, card=card)
+    apply_review(progress, grade, reviewed_at or timezone.now())
+    progress.save()
+    return progress
+
+
+def _parse_answer(answer, now):
+    if not isinstance(answer, dict):
+        return None, 'Answer must be an object'
+    card_id, grade = answer.get('card'), answer.get('grade')
+    # bool is an int subclass, JSON true/false are not ids or grades
+    if not isinstance(card_id, int) or isinstance(card_id, bool):
+        return None, 'card is required'
+    if not isinstance(grade, int) or isinstance(grade, bool) or grade not in GRADES:
+        return None, 'grade must be an integer from 0 to 5'
+    reviewed_at = answer.get('reviewed_at')
+    if reviewed_at is None:
+        return (card_id, grade, now), None
+    try:
+        reviewed_at = datetime.fromisoformat(reviewed_at)
+    except (TypeError, ValueError):
+        return None, 'reviewed_at must be an ISO 8601 datetime'
+    if timezone.is_naive(reviewed_at):
+        reviewed_at = timezone.make_aware(reviewed_at)
+    return (card_id, grade, min(reviewed_at, now)), None
+
+
+def review_cards(user, answers):
+    """
+    Applies a batch of answers [{"card", "grade", "reviewed_at"}] (e.g. an offline session).
+    Loads and locks the current state with one query, computes the new state with sm2_batch and writes
+    all rows with one bulk upsert on the (user, card) unique constraint.
+    Several answers for one card are applied in reviewed_at order, an answer not newer than the
+    card's stored last_reviewed (e.g. an offline answer synced after a later review) is rejected.
+    Returns per-answer results in request order, each with the progress right after that answer.
+    """
+    now = timezone.now()
+    results = [None] * len(answers)
+    parsed = []  # (index, card_id, grade, reviewed_at)
+    for index, answer in enumerate(answers):
+        value, error = _parse_answer(answer, now)
+        if error:
+            results[index] = {'index': index, 'success': False, 'error': error}
+        else:
+            parsed.append((index, *value))
+
+    card_ids = {card_id for _, card_id, _, _ in parsed}
+    allowed = set(accessible_cards(user).filter(id__in=card_ids).values_list('id', flat=True))
+    for index, card_id, _, _ in parsed:
+        if card_id not in allowed:
+            results[index] = {'index': index, 'success': False, 'error': 'Card not found'}
+    parsed = sorted((item for item in parsed if item[1] in allowed), key=lambda item: item[3])
+
+    # The rows stay locked until the write, a concurrent batch for the same cards waits here and
+    # its staleness check sees this batch's last_reviewed
+    with transaction.atomic():
+        state = {
+            row['card_id']: row
+            for row in LearningProgress.objects.select_for_update().filter(
+                user=user, card_id__in=allowed).values('card_id', 'ease', 'interval', 'repetitions', 'last_reviewed')
+        }
+        for card_id in allowed - state.keys():
+            state[card_id] = {'card_id': card_id, 'ease': 2.5, 'interval': 0.0, 'repetitions': 0,
+                              'last_reviewed': None}
+
+        fresh = []
+        for item in parsed:
+            last_reviewed = state[item[1]]['last_reviewed']
+            if last_reviewed is not None and item[3] <= last_reviewed:
+                results[item[0]] = {'index': item[0], 'success': False,
+                                    'error': 'Answer is not newer than the last review'}
+            else:
+                fresh.append(item)
+        parsed = fresh
+
+        # Answers are processed in rounds: the n-th answer of every card goes into round n,
+        # so each round has at most one answer per card and can be computed as one array
+        rounds, seen = [], {}
+        for item in parsed:
+            position = seen.get(item[1], 0)
+            seen[item[1]] = position + 1
+            if position == len(rounds):
+                rounds.append([])
+            rounds[position].append(item)
+
+        for batch in rounds:
+            rows = [state[card_id] for _, card_id, _, _ in batch]
+            eases, intervals, repetitions = sm2_batch(
+                [grade for _, _, grade, _ in batch],
+                [row['ease'] for row in rows],
+                [row['interval'] for row in rows],
+                [row['repetitions'] for row in rows],
+            )
+            for (index, card_id, _, reviewed_at), ease, interval, reps in zip(
+                    batch, eases.tolist(), intervals.tolist(), repetitions.tolist()):
+                row = state[card_id]
+                row.update(ease=ease, interval=interval, repetitions=reps, last_reviewed=reviewed_at,
+                           due_at=reviewed_at + timedelta(days=interval), level=min(MAX_LEVEL, reps))
+                results[index] = {'index': index, 'success': True, 'card': card_id, 'progress': {
+                    'card': card_id, **{field: row[field] for field in PROGRESS_FIELDS},
+                }}
+
+        reviewed = {card_id for _, card_id, _, _ in parsed}
+        objs = [
+            LearningProgress(user=user, card_id=card_id, level=row['level'], ease=row['ease'],
+                             interval=row['interval'], repetitions=row['repetitions'],
+                             last_reviewed=row['last_reviewed'], due_at=row['due_at'])
+            for card_id, row in state.items() if card_id in reviewed
+        ]
+        LearningProgress.objects.bulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=['user', 'card'],
+            update_fields=['level', 'ease', 'interval', 'repetitions', 'last_reviewed', 'due_at'],
+        )
+        record_changes(user.pk, 'progress', sorted(reviewed))
+    return results
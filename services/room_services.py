@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import time
+
+from anki_quiz.models import Quiz, Room
+from services.async_services import run_sync
+from services.json_services import dumps, loads
+from services.leaderboard_services import is_room_member, record_points, save_results
+from services.notification_services import notify
+
+logger = logging.getLogger(__name__)
+
+# Close codes: policy violation (not a member, bad token) and "try again later" (client too slow)
+CLOSE_FORBIDDEN = 1008
+CLOSE_TOO_SLOW = 1013
+
+
+class RoomError(Exception):
+    pass
+
+
+class Connection:
+    """
+    One WebSocket of a room member. Messages are queued and written by the connection's own task,
+    so a slow client never blocks a broadcast; one that falls queue_size messages behind is closed.
+    """
+
+    def __init__(self, user_id, name, send, close, queue_size=100):
+        self.user_id = user_id
+        self.name = name
+        self._send = send
+        self._close = close
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._writer = asyncio.create_task(self._write())
+        self.closed = False
+
+    async def _write(self):
+        try:
+            while True:
+                await self._send(await self._queue.get())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Disconnected, the receive loop of the endpoint ends the connection
+            self.closed = True
+
+    def push(self, text):
+        if self.closed:
+            return
+        try:
+            self._queue.put_nowait(text)
+        except asyncio.QueueFull:
+            logger.warning('Room connection of user %s is too slow, closing', self.user_id)
+            asyncio.create_task(self.close(CLOSE_TOO_SLOW))
+
+    async def close(self, code=1000):
+        if self._writer.done():
+            return
+        self.closed = True
+        self._writer.cancel()
+        try:
+            await self._close(code)
+        except Exception:
+            pass
+
+
+class RoomState:
+    """Members, current question, answers and scores of one live room (lobby -> question <-> reveal -> finished)."""
+
+    def __init__(self, room_id, host_id):
+        self.room_id = room_id
+        self.host_id = host_id
+        self.connections = {}  # user_id -> Connection, one per user
+        self.phase = 'lobby'
+        self.quiz = None
+        self.index = -1
+        self.seconds = None  # per question
+        self.deadline = None  # time.monotonic() when the current question closes
+        self.players = set()  # connected when the quiz started, they get a QuizResult
+        self.answers = {}  # user_id -> chosen option of the current question
+        self.scores = {}
+        self.tasks = set()  # question timers and result flushes
+
+    def members(self):
+        return [{'id': user_id, 'name': connection.name} for user_id, connection in self.connections.items()]
+
+    def public_question(self):
+        question = self.quiz.questions[self.index]
+        return {
+            'index': self.index,
+            'total': len(self.quiz.questions),
+            'term': question['term'],
+            'options': question['options'],
+            'seconds': max(0.0, round(self.deadline - time.monotonic(), 1)),
+        }
+
+    def score_list(self):
+        return sorted(({'user': user_id, 'score': score} for user_id, score in self.scores.items()),
+                      key=lambda item: -item['score'])
+
+
+def _room_host(user, room_id):
+    """Room.creator_id if `user` may join the room, raises Room.DoesNotExist otherwise."""
+    if not is_room_member(user, room_id):
+        raise Room.DoesNotExist
+    return Room.objects.values_list('creator_id', flat=True).get(id=room_id)
+
+
+def _load_quiz(host_id, quiz_id):
+    quiz = Quiz.objects.select_related('set').get(id=quiz_id)
+    if quiz.user_id != host_id and not quiz.set.is_public:
+        raise Quiz.DoesNotExist
+    if not quiz.questions:
+        raise RoomError('The quiz has no questions')
+    return quiz
+
+
+class RoomEngine:
+    """
+    In-process engine of the live quiz rooms, all state lives on the event loop of this worker.
+    With several workers the WebSockets of a room must reach the same one (route by room id).
+    A broadcast is encoded once and the same text is queued on every connection of the room;
+    the results of a game are written with one bulk_create when it finishes.
+    """
+
+    def __init__(self, question_seconds=20, reveal_seconds=3, queue_size=100):
+        self.question_seconds = question_seconds
+        self.reveal_seconds = reveal_seconds
+        self.queue_size = queue_size
+        self.rooms = {}  # room_id -> RoomState
+
+    async def authorize(self, user, room_id):
+        """Checks membership once per connection, before the WebSocket is accepted. Raises Room.DoesNotExist."""
+        return await run_sync(_room_host, user, room_id)
+
+    def join(self, room_id, host_id, user, send, close):
+        state = self.rooms.get(room_id)
+        if state is None:
+            state = self.rooms[room_id] = RoomState(room_id, host_id)
+        previous = state.connections.pop(user.pk, None)
+        if previous is not None:  # the same user reconnecting replaces the old socket
+            asyncio.create_task(previous.close())
+        connection = Connection(user.pk, user.name, send, close, self.queue_size)
+        self.broadcast(state, {'type': 'member_joined', 'user': {'id': user.pk, 'name': user.name}})
+        state.connections[user.pk] = connection
+        self.send(connection, {
+            'type': 'state',
+            'room': room_id,
+            'host': state.host_id,
+            'phase': state.phase,
+            'members': state.members(),
+            'question': state.public_question() if state.phase == 'question' else None,
+            'scores': state.score_list(),
+        })
+        return state, connection
+
+    def leave(self, state, connection):
+        if state.connections.get(connection.user_id) is not connection:
+            return
+        del state.connections[connection.user_id]
+        self.broadcast(state, {'type': 'member_left', 'user': connection.user_id})
+        if not state.connections and state.phase in ('lobby', 'finished') and not state.tasks:
+            self.rooms.pop(state.room_id, None)
+        elif state.phase == 'question':
+            self._close_if_all_answered(state)
+
+    def send(self, connection, payload):
+        connection.push(dumps(payload).decode())
+
+    def broadcast(self, state, payload):
+        text = dumps(payload).decode()
+        for connection in state.connections.values():
+            connection.push(text)
+
+    def _spawn(self, state, coroutine):
+        task = asyncio.create_task(coroutine)
+        state.tasks.add(task)
+        task.add_done_callback(state.tasks.discard)
+        return task
+
+    # -------------------Client messages-----------------
+    async def handle(self, state, connection, text):
+        try:
+            message = loads(text)
+            if not isinstance(message, dict):
+                raise ValueError
+        except ValueError:
+            self.send(connection, {'type': 'error', 'error': 'Invalid message'})
+            return
+        kind = message.get('type')
+        try:
+            if kind == 'start':
+                await self._start(state, connection, message)
+            elif kind == 'answer':
+                self._answer(state, connection, message)
+            elif kind == 'ping':
+                self.send(connection, {'type': 'pong'})
+            else:
+                raise RoomError('type must be one of start, answer, ping')
+        except RoomError as e:
+            self.send(connection, {'type': 'error', 'error': str(e)})
+
+    async def _start(self, state, connection, message):
+        if connection.user_id != state.host_id:
+            raise RoomError('Only the host can start a quiz')
+        if state.phase not in ('lobby', 'finished'):
+            raise RoomError('A quiz is already running')
+        quiz_id = message.get('quiz')
+        seconds = message.get('seconds', self.question_seconds)
+        if not isinstance(quiz_id, int) or not isinstance(seconds, (int, float)) or not 1 <= seconds <= 600:
+            raise RoomError('quiz (id) is required, seconds must be between 1 and 600')
+        state.phase = 'starting'  # the quiz is loaded off the loop, no second start meanwhile
+        try:
+            state.quiz = await run_sync(_load_quiz, connection.user_id, quiz_id)
+        except (Quiz.DoesNotExist, RoomError) as e:
+            state.phase = 'lobby'
+            raise RoomError('Quiz not found' if isinstance(e, Quiz.DoesNotExist) else str(e))
+        except Exception:
+            state.phase = 'lobby'
+            raise
+        state.seconds = seconds
+        state.players = set(state.connections)
+        state.scores = dict.fromkeys(state.players, 0)
+        self.broadcast(state, {'type': 'started', 'quiz': quiz_id, 'title': state.quiz.title,
+                               'total': len(state.quiz.questions), 'players': sorted(state.players)})
+        self._ask(state, 0)
+
+    def _ask(self, state, index):
+        state.phase = 'question'
+        state.index = index
+        state.answers = {}
+        state.deadline = time.monotonic() + state.seconds
+        self.broadcast(state, {'type': 'question', **state.public_question()})
+        self._spawn(state, self._question_timer(state, index))
+
+    def _answer(self, state, connection, message):
+        if state.phase != 'question' or message.get('index') != state.index:
+            raise RoomError('No open question with this index')
+        if connection.user_id not in state.players:
+            raise RoomError('You joined after the start, wait for the next quiz')
+        if connection.user_id in state.answers:
+            raise RoomError('Already answered')
+        choice = message.get('choice')
+        if not isinstance(choice, int):
+            raise RoomError('choice must be an option position')
+        state.answers[connection.user_id] = choice
+        self.broadcast(state, {'type': 'answered', 'index': state.index, 'user': connection.user_id,
+                               'count': len(state.answers)})
+        self._close_if_all_answered(state)
+
+    # -------------------Game flow-----------------
+    def _close_if_all_answered(self, state):
+        waiting = (state.players & state.connections.keys()) - state.answers.keys()
+        if not waiting:
+            self._reveal(state)
+
+    async def _question_timer(self, state, index):
+        await asyncio.sleep(max(0.0, state.deadline - time.monotonic()))
+        if state.phase == 'question' and state.index == index:
+            self._reveal(state)
+
+    def _reveal(self, state):
+        question = state.quiz.questions[state.index]
+        for user_id, choice in state.answers.items():
+            if choice == question['answer']:
+                state.scores[user_id] += 1
+        state.phase = 'reveal'
+        self.broadcast(state, {'type': 'reveal', 'index': state.index, 'answer': question['answer'],
+                               'answers': state.answers, 'scores': state.score_list()})
+        self._spawn(state, self._next(state, state.index))
+
+    async def _next(self, state, index):
+        await asyncio.sleep(self.reveal_seconds)
+        if state.phase != 'reveal' or state.index != index:
+            return
+        if index + 1 < len(state.quiz.questions):
+            self._ask(state, index + 1)
+        else:
+            await self._finish(state)
+
+    async def _finish(self, state):
+        state.phase = 'finished'
+        self.broadcast(state, {'type': 'finished', 'scores': state.score_list()})
+        try:
+            results, boards = await run_sync(save_results, state.quiz, state.scores, state.room_id)
+            await record_points(boards)
+            self.broadcast(state, {'type': 'saved', 'results': len(results)})
+            # Players who left before the end learn about the results too
+            await notify(state.scores, f'Results of the quiz "{state.quiz.title}" are saved')
+        except Exception as e:
+            logger.warning('Room %s results error: %s', state.room_id, e)
+            self.broadcast(state, {'type': 'error', 'error': 'Error saving results'})
+        if not state.connections:
+            self.rooms.pop(state.room_id, None)
+
+
+
+_room_engine = None
+
+
+def get_room_engine():
+    global _room_engine
+    if _room_engine is None:
+        from django.conf import settings
+        _room_engine = RoomEngine(
+            question_seconds=getattr(settings, 'ROOM_QUESTION_SECONDS', 20),
+            reveal_seconds=getattr(settings, 'ROOM_REVEAL_SECONDS', 3),
+            queue_size=getattr(settings, 'ROOM_SEND_QUEUE_SIZE', 100),
+        )
+    return _room_engine
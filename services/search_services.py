@@ -0,0 +1,247 @@
+import math
+import re
+from collections import Counter, defaultdict
+
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from anki_quiz.models import Card, SearchDocument, SearchPosting, Set
+from anki_quiz.serializers import CardSerializer, SetSerializer
+
+INDEX_BATCH_SIZE = 1000
+
+# Set.term_lang / definition_lang are free text (code or English name) -> PostgreSQL text search configuration
+LANGUAGE_CONFIGS = {
+    'en': 'english', 'english': 'english',
+    'de': 'german', 'german': 'german', 'deutsch': 'german',
+    'fr': 'french', 'french': 'french',
+    'es': 'spanish', 'spanish': 'spanish',
+    'it': 'italian', 'italian': 'italian',
+    'pt': 'portuguese', 'portuguese': 'portuguese',
+    'nl': 'dutch', 'dutch': 'dutch',
+    'sv': 'swedish', 'swedish': 'swedish',
+    'no': 'norwegian', 'nb': 'norwegian', 'norwegian': 'norwegian',
+    'da': 'danish', 'danish': 'danish',
+    'fi': 'finnish', 'finnish': 'finnish',
+    'hu': 'hungarian', 'hungarian': 'hungarian',
+    'tr': 'turkish', 'turkish': 'turkish',
+    'ru': 'russian', 'russian': 'russian', 'русский': 'russian',
+}
+CONFIGS = sorted(set(LANGUAGE_CONFIGS.values()) | {'simple'})
+
+
+def language_config(language):
+    """'en', 'en-US', 'English' -> 'english'; unknown or empty -> 'simple' (no stemming, no stop words)."""
+    key = (language or '').strip().lower()
+    return LANGUAGE_CONFIGS.get(key) or LANGUAGE_CONFIGS.get(re.split(r'[-_]', key)[0], 'simple')
+
+
+# -------------------Tokenizer (SearchPosting fallback)-----------------
+# A small approximation of the PostgreSQL configurations: stop words of the common languages
+# and a light English suffix stemmer; other languages are matched by lowercased word.
+STOP_WORDS = {
+    'english': {'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'in', 'is', 'it', 'of', 'on',
+                'or', 'the', 'to', 'was', 'with'},
+    'german': {'der', 'die', 'das', 'und', 'ein', 'eine', 'ist', 'zu', 'den', 'dem', 'des', 'im', 'in', 'mit',
+               'von', 'auf'},
+    'french': {'le', 'la', 'les', 'un', 'une', 'des', 'et', 'est', 'de', 'du', 'en', 'au', 'aux', 'à'},
+    'spanish': {'el', 'la', 'los', 'las', 'un', 'una', 'y', 'es', 'de', 'del', 'en', 'a', 'al'},
+    'russian': {'и', 'в', 'во', 'не', 'на', 'с', 'со', 'что', 'как', 'а', 'к', 'по', 'из', 'у', 'о'},
+}
+WORD_RE = re.compile(r'\w+')
+
+
+def _stem_english(word):
+    if len(word) <= 3:
+        return word
+    for suffix, replacement in (('ies', 'y'), ('sses', 'ss'), ('ing', ''), ('ed', ''), ('es', ''), ('s', '')):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith('ss'):
+            stem = word[:-len(suffix)] + replacement
+            if suffix in ('ing', 'ed') and stem[-1] == stem[-2] and stem[-1] not in 'lsz':
+                stem = stem[:-1]  # running -> run
+            return stem
+    return word
+
+
+STEMMERS = {'english': _stem_english}
+
+
+def tokenize(text, config):
+    stop_words = STOP_WORDS.get(config, ())
+    stem = STEMMERS.get(config)
+    for word in WORD_RE.findall(text.casefold()):
+        if word in stop_words:
+            continue
+        yield (stem(word) if stem else word)[:64]
+
+
+# -------------------Indexing-----------------
+def _replace_documents(stale, documents):
+    with transaction.atomic():
+        stale.delete()
+        created = SearchDocument.objects.bulk_create(documents, batch_size=INDEX_BATCH_SIZE)
+        if connection.vendor != 'postgresql':  # PostgreSQL computes the tsvector column itself
+            SearchPosting.objects.bulk_create(
+                (
+                    SearchPosting(document_id=document.pk, term=term, count=min(count, 32767))
+                    for document in created
+                    for term, count in Counter(tokenize(document.text, document.language)).items()
+                ),
+                batch_size=INDEX_BATCH_SIZE,
+            )
+
+
+def index_set(card_set):
+    """
+    Brings the index of a saved set up to date: drops it for private sets, refreshes title/description,
+    and re-indexes all cards when the set became public or its languages changed.
+    """
+    if not card_set.is_public:
+        SearchDocument.objects.filter(set=card_set).delete()
+        return
+    term_config = language_config(card_set.term_lang)
+    definition_config = language_config(card_set.definition_lang)
+    card_documents = SearchDocument.objects.filter(set=card_set, card__isnull=False)
+    cards_stale = (
+        not SearchDocument.objects.filter(set=card_set, card=None).exists()  # was private until now
+        or card_documents.filter(field='term').exclude(language=term_config).exists()
+        or card_documents.filter(field='definition').exclude(language=definition_config).exists()
+    )
+    # Titles and descriptions are indexed without stemming, their language is not known
+    documents = [SearchDocument(set=card_set, field='title', text=card_set.title)]
+    if card_set.description:
+        documents.append(SearchDocument(set=card_set, field='description', text=card_set.description))
+    _replace_documents(SearchDocument.objects.filter(set=card_set, card=None), documents)
+    if cards_stale:
+        index_cards(card_set, Card.objects.filter(set=card_set))
+
+
+def index_cards(card_set, cards):
+    """(Re-)indexes cards of a public set, `cards` is an iterable of Card or a queryset."""
+    if not card_set.is_public:
+        return
+    term_config = language_config(card_set.term_lang)
+    definition_config = language_config(card_set.definition_lang)
+    if isinstance(cards, QuerySet):
+        cards = cards.only('id', 'term', 'definition').iterator(chunk_size=INDEX_BATCH_SIZE)
+
+    def flush(batch):
+        documents = []
+        for card in batch:
+            documents.append(SearchDocument(set=card_set, card_id=card.pk, field='term', language=term_config,
+                                            text=card.term))
+            documents.append(SearchDocument(set=card_set, card_id=card.pk, field='definition',
+                                            language=definition_config, text=card.definition))
+        _replace_documents(SearchDocument.objects.filter(card_id__in=[card.pk for card in batch]), documents)
+
+    batch = []
+    for card in cards:
+        batch.append(card)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+
+
+def rebuild_index():
+    """Drops and rebuilds the whole index, returns the number of indexed public sets."""
+    SearchDocument.objects.all().delete()
+    count = 0
+    for card_set in Set.objects.filter(is_public=True).iterator():
+        index_set(card_set)
+        count += 1
+    return count
+
+
+# -------------------Search-----------------
+def _search_postgres(query, configs, limit, after):
+    # One GIN-indexable branch per configuration: the query is parsed in the document's configuration
+    branches = ' OR '.join(['(d.language = %s AND d.vector @@ websearch_to_tsquery(%s::regconfig, %s))'] * len(configs))
+    params = [value for config in configs for value in (config, config, query)]
+    keyset = ''
+    if after:
+        keyset = 'WHERE ranked.rank < %s OR (ranked.rank = %s AND ranked.doc_id > %s)'
+        params_after = [after[0], after[0], after[1]]
+    else:
+        params_after = []
+    sql = f"""
+        SELECT ranked.rank, ranked.doc_id, ranked.set_id, ranked.card_id FROM (
+            SELECT SUM(ts_rank(d.vector, websearch_to_tsquery(d.language::regconfig, %s)))::float8 AS rank,
+                   MIN(d.id) AS doc_id, d.set_id, d.card_id
+            FROM anki_quiz_searchdocument d
+            WHERE {branches}
+            GROUP BY d.set_id, d.card_id
+        ) ranked
+        {keyset}
+        ORDER BY ranked.rank DESC, ranked.doc_id
+        LIMIT %s
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [query, *params, *params_after, limit])
+        return cursor.fetchall()
+
+
+def _search_postings(query, configs, limit, after):
+    # Every query term (in the document's configuration) must occur in the document, rank is tf-idf
+    terms_by_config = {config: set(tokenize(query, config)) for config in configs}
+    terms_by_config = {config: terms for config, terms in terms_by_config.items() if terms}
+    all_terms = set().union(*terms_by_config.values())
+    if not all_terms:
+        return []
+
+    postings = SearchPosting.objects.filter(
+        term__in=all_terms, document__language__in=list(terms_by_config)
+    ).values_list('document_id', 'document__language', 'document__set_id', 'document__card_id', 'term', 'count')
+    documents = {}
+    document_frequency = Counter()
+    for document_id, language, set_id, card_id, term, count in postings:
+        documents.setdefault(document_id, (language, set_id, card_id, {}))[3][term] = count
+        document_frequency[term] += 1
+    total = SearchDocument.objects.count()
+
+    groups = defaultdict(lambda: [0.0, None])  # (set_id, card_id) -> [rank, first document id]
+    for document_id, (language, set_id, card_id, found) in documents.items():
+        required = terms_by_config[language]
+        if not required <= found.keys():
+            continue
+        group = groups[(set_id, card_id)]
+        group[0] += sum((1 + math.log(found[term])) * math.log(1 + total / document_frequency[term])
+                        for term in required)
+        group[1] = document_id if group[1] is None else min(group[1], document_id)
+
+    ranked = sorted(
+        ((rank, document_id, set_id, card_id) for (set_id, card_id), (rank, document_id) in groups.items()),
+        key=lambda row: (-row[0], row[1]),
+    )
+    if after:
+        ranked = [row for row in ranked if row[0] < after[0] or (row[0] == after[0] and row[1] > after[1])]
+    return ranked[:limit]
+
+
+def search_public(query, language=None, limit=20, after=None):
+    """
+    Ranked search over public sets and cards. Returns (results, next_key, has_more),
+    next_key is the (rank, document id) to pass as `after` for the next page.
+    """
+    configs = sorted({language_config(language), 'simple'}) if language else CONFIGS
+    search = _search_postgres if connection.vendor == 'postgresql' else _search_postings
+    hits = search(query, configs, limit + 1, after)
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+
+    sets = {
+        row['id']: SetSerializer.serialize_public_row(row)
+        for row in Set.objects.filter(id__in={hit[2] for hit in hits}, is_public=True).values(*SetSerializer.PUBLIC_FIELDS)
+    }
+    cards = {
+        row['id']: CardSerializer.serialize_row(row)
+        for row in Card.objects.filter(id__in={hit[3] for hit in hits if hit[3]}).values(*CardSerializer.FIELDS)
+    }
+    results = [
+        {'rank': round(rank, 6), 'set': sets[set_id], 'card': cards.get(card_id)}
+        for rank, _, set_id, card_id in hits
+        if set_id in sets and (card_id is None or card_id in cards)
+    ]
+    next_key = (hits[-1][0], hits[-1][1]) if has_more else None
+    return results, next_key, has_more
@@ -0,0 +1,79 @@
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from anki_quiz.models import Card, LearningProgress, Set, SyncChange, SyncSequence
+from anki_quiz.serializers import CardSerializer, SetSerializer
+
+
+PROGRESS_FIELDS = ('card_id', 'level', 'ease', 'interval', 'repetitions', 'due_at', 'last_reviewed')
+
+
+def record_changes(user_id, kind, object_ids, deleted=False):
+    """
+    Appends changes to the sync log. Model signals cover save()/delete(),
+    bulk_create/bulk_update/update() callers have to record their changes themselves.
+    The user's SyncSequence row stays locked until the caller's transaction commits: concurrent writers
+    of one user wait, and a client never syncs past a seq that is still to be committed.
+    """
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    with transaction.atomic():
+        sequence = SyncSequence.objects.filter(user_id=user_id)
+        if not sequence.update(value=F('value') + len(object_ids)):
+            SyncSequence.objects.bulk_create([SyncSequence(user_id=user_id)], ignore_conflicts=True)
+            sequence.update(value=F('value') + len(object_ids))
+        last = sequence.values_list('value', flat=True).get()
+        first = last - len(object_ids) + 1
+        SyncChange.objects.bulk_create([
+            SyncChange(user_id=user_id, kind=kind, object_id=object_id, deleted=deleted, seq=seq)
+            for seq, object_id in enumerate(object_ids, first)
+        ])
+
+
+def changes_since(user, since_id, limit):
+    """
+    Returns the current state of everything changed after change (seq) `since_id`, at most `limit` log entries.
+    Only the latest version of each object is returned: rows that no longer exist are reported
+    as deleted (cards and progress of a deleted set are implied by the set deletion).
+    """
+    changes = list(
+        SyncChange.objects.filter(user=user, seq__gt=since_id)
+        .order_by('seq')
+        .values_list('seq', 'kind', 'object_id')[:limit + 1]
+    )
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+
+    ids = {'set': set(), 'card': set(), 'progress': set()}
+    for _, kind, object_id in changes:
+        ids[kind].add(object_id)
+
+    sets = SetSerializer.serialize_many(Set.objects.filter(user=user, id__in=ids['set'])) if ids['set'] else []
+    cards = CardSerializer.serialize_many(Card.objects.filter(set__user=user, id__in=ids['card'])) if ids['card'] else []
+    progress = list(
+        LearningProgress.objects.filter(user=user, card_id__in=ids['progress']).values(*PROGRESS_FIELDS)
+    ) if ids['progress'] else []
+    for row in progress:
+        row['card'] = row.pop('card_id')
+
+    return {
+        'sets': sets,
+        'cards': cards,
+        'progress': progress,
+        'deleted': {
+            'sets': sorted(ids['set'] - {row['id'] for row in sets}),
+            'cards': sorted(ids['card'] - {row['id'] for row in cards}),
+            'progress': sorted(ids['progress'] - {row['card'] for row in progress}),
+        },
+        'next_token': changes[-1][0] if changes else since_id,
+        'has_more': has_more,
+    }
+
+
+def compact_changes():
+    """Deletes log entries superseded by a newer change of the same object, tokens stay valid."""
+    newer = SyncChange.objects.filter(
+        user=OuterRef('user'), kind=OuterRef('kind'), object_id=OuterRef('object_id'), seq__gt=OuterRef('seq')
+    )
+    deleted, _ = SyncChange.objects.filter(Exists(newer)).delete()
+    return deleted